@@ -1,6 +1,7 @@
 import numpy as np
 import time
 from setup_control import experiment_wrapper as ew
+from setup_control.snippets import DataRecorder
 
 # Initialize setup
 ew.initialize()
@@ -30,14 +31,15 @@ freqs_sens = [(225.0, 0.005), (230.0, 0.005), (235.0, 0.002), (240.0, 0.005), (2
 # Times to sample at (in seconds)
 times = [0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 15.0, 20.0, 30.0, 40.0, 50.0, 60.0]
 
-# Create a new array to save data to (note this first empty row will be deleted later)
-data = np.empty((1, len(times) + 1), dtype=float)
+# Make room for the data, two rows (x and y) for each frequency, each holding the frequency and then a sample for each time
+recorder = DataRecorder(['frequency'] + ['t' + str(t_wait) for t_wait in times], capacity=2 * len(freqs_sens))
 
 # Loop through frequencies
 for freq, sens in freqs_sens:
     print('Frequency set ' + str(freq) + 'GHz, sensitivity set ' + str(sens) + 'mV')
-    # Create a new 2-by-1 array for the row data, x is in left col, y is in right col
-    data_row = np.array((freq, freq))
+    # Create a 2-by-n array for the row data, x samples are in the top row and y samples in the bottom row
+    data_rows = np.empty((2, len(times) + 1), dtype=float)
+    data_rows[:, 0] = freq
     # Set sensitivity
     ew.set_sensitivity(sens)
     # Set frequency
@@ -45,23 +47,19 @@ for freq, sens in freqs_sens:
     # Get start time in seconds
     t_start = time.time()
     # Wait, sample, repeat
-    for t_wait in times:
+    for i, t_wait in enumerate(times):
         # Find the time elapsed since the frequency was changed
         t_elapse = time.time() - t_start
         # Find the time remaining until the next time to sample at occurs
         t_left = t_wait - t_elapse
         # Sleep until that time
         time.sleep(t_left)
-        # Get data from the lock-in amplifier and and add it to the data array
+        # Get data from the lock-in amplifier and and add it to the data rows
         (x, y) = ew.snap_data()
-        data_entry = np.array((x, y))
-        data_row = np.vstack((data_row, data_entry))
-    # Transpose data_row so that it is actually a row and then add it to the data array
-    data_row = data_row.transpose()
-    data = np.vstack((data, data_row))
-
-# Delete the first row in the collected data, as it was created to give the array shape earlier but holds no useful data
-data = np.delete(data, 0, 0)
+        data_rows[:, i + 1] = (x, y)
+    # Add the data rows to the recorder
+    recorder.append(*data_rows[0])
+    recorder.append(*data_rows[1])
 
 # Close instruments
 ew.close()
@@ -71,4 +69,4 @@ script_name = str(__file__)
 script_name = script_name[:script_name.find('.py')]
 
 # Save array
-np.save(script_name, data)
+np.save(script_name, recorder.data)
@@ -1,4 +1,5 @@
 from setup_control import experiment_wrapper
+from setup_control.snippets import DataRecorder
 import numpy as np
 import time
 
@@ -22,8 +23,8 @@ for i in range(0, 3):
     # Sleep to allow instruments to adjust settings
     time.sleep(5)
 
-    # Create a new array to save data to
-    data = np.array([0, 0], float)  # This row will be deleted later
+    # Make room for the data, one row for each frequency
+    recorder = DataRecorder(('frequency', 'voltage'), capacity=160)
 
     # Sweep the selected parameter and record data
     for freq in np.linspace(12.5, 16.5, num=160, endpoint=True):
@@ -42,14 +43,10 @@ for i in range(0, 3):
         # Get data from the multimeter and add it to the data array
         voltage = experiment_wrapper.get_multimeter_dc_measurement()
 
-        data_row = np.array([freq, voltage])
-        data = np.vstack((data, data_row))
-
-    # Delete the first row in the collected data, as it was created to give the array shape earlier but holds no useful data
-    data = np.delete(data, 0, 0)
+        recorder.append(freq, voltage)
 
     # Close instruments
     experiment_wrapper.close()
 
     # Save collected data
-    np.savez('no_horn_no_vdi_no_waveguide_no_chopper_sweep_data_folder/sweep_num_' + str(i), data=data)
\ No newline at end of file
+    np.savez('no_horn_no_vdi_no_waveguide_no_chopper_sweep_data_folder/sweep_num_' + str(i), data=recorder.data)
\ No newline at end of file
@@ -1,11 +1,15 @@
 from setup_control import snippets, experiment_wrapper
 import numpy as np
 
-for power in np.arange(8.0, 15.0, 0.5):
-    if power >= 10.0:
-        snippets.sweep_parameter(experiment_wrapper.set_freq_synth_frequency, np.arange(12.5, 16.5, 0.1), power=power,
-                                 time_constant=100, sensitivity=1000, load_time=1.5, lock_in_time=0.1, multiplier=1,
-                                 save_path='no_horn_no_vdi_power_sweep_data_folder/power_' + str(power))
-    snippets.sweep_parameter(experiment_wrapper.set_freq_synth_frequency, np.arange(12.5, 16.5, 0.1), power=power,
-                             time_constant=100, sensitivity=500, load_time=1.5, lock_in_time=0.1, multiplier=1,
-                             save_path='no_horn_no_vdi_power_sweep_data_folder/power_' + str(power))
+freqs = np.arange(12.5, 16.5, 0.1)
+
+# Sweep frequency at each power, initializing the instruments once per sensitivity. Each sweep is checkpointed under its
+# own run id, so running the script again after a failure skips the sweeps that finished and carries on from the last
+# point measured.
+for sensitivity, powers in ((1000, np.arange(10.0, 15.0, 0.5)), (500, np.arange(8.0, 15.0, 0.5))):
+    snippets.sweep_grid([('power', experiment_wrapper.set_freq_synth_power, powers, 1.5),
+                         ('frequency', experiment_wrapper.set_freq_synth_frequency, freqs)],
+                        time_constant=100, sensitivity=sensitivity, load_time=1.5, lock_in_time=0.1, multiplier=1,
+                        save_path='no_horn_no_vdi_power_sweep_data_folder/sensitivity_' + str(sensitivity),
+                        run_id='power_sweep_sensitivity_' + str(sensitivity),
+                        checkpoint_dir='no_horn_no_vdi_power_sweep_data_folder')
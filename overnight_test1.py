@@ -1,4 +1,5 @@
 from setup_control import experiment_wrapper as ew
+from setup_control.snippets import SweepWriter, load_sweep
 import time, datetime
 import numpy as np
 
@@ -26,8 +27,8 @@ ew.set_low_pass_slope(12.0)
 # Sleep to allow instruments to adjust settings
 time.sleep(5)
 
-# Create a new array to save data to
-data = np.array([0, 0, 0], float)  # This row will be deleted later
+# Write each sample to disk as it is taken, so stopping early (or a crash) keeps everything recorded so far
+writer = SweepWriter('overnight_test1.sweep', ('time', 'x', 'y'), metadata=dict(frequency=14.0, power=15.0, chopper_amplitude=5.0, chopper_frequency=5.0, time_constant=100.0, sensitivity=500.0, slope=12.0), flush_interval=0)
 
 # Get start time
 
@@ -45,32 +46,31 @@ str_start_time = str(start_hour) + ' hours ' + str(start_min) + ' mins ' + str(s
 
 
 # Sweep the selected parameter and record data
-while True:
-    t = time.time() - start_time
+try:
+    while True:
+        t = time.time() - start_time
 
-    t_mins = (t / 60.0)
+        t_mins = (t / 60.0)
 
-    print(str(t_mins) + ' minutes since ' + str_start_time)
+        print(str(t_mins) + ' minutes since ' + str_start_time)
 
-    # Get data from the lock-in amplifier
-    (x, y) = ew.snap_data()
+        # Get data from the lock-in amplifier
+        (x, y) = ew.snap_data()
 
-    # Add data to the data array
-    data_row = np.array([t, x, y])
-    data = np.vstack((data, data_row))
+        # Write data to disk
+        writer.append(t, x, y)
 
-    # Check if the experiment has been running for 14 hours or more, if so stop
-    if t > (60.0 * 60.0 * 14.0):
-        break
+        # Check if the experiment has been running for 14 hours or more, if so stop
+        if t > (60.0 * 60.0 * 14.0):
+            break
 
-    # Sleep for 30 seconds
-    time.sleep(30)
-
-# Delete the first row in the collected data, as it was created to give the array shape earlier but holds no useful data
-data = np.delete(data, 0, 0)
+        # Sleep for 30 seconds
+        time.sleep(30)
+finally:
+    writer.close()
 
 # Close instruments
 ew.close()
 
 # Save data
-np.savez('overnight_test1', data=data)
+np.savez('overnight_test1', data=load_sweep('overnight_test1.sweep')['data'])
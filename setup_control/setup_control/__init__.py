@@ -1,4 +1,9 @@
+from . import async_io
+from . import io_trace
+from . import io_metrics
 from . import inst_io
 from . import instruments
+from . import sweep_axis
 from . import experiment_wrapper
+from . import settling
 from . import snippets
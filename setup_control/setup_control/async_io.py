@@ -0,0 +1,409 @@
+"""
+The async_io module lets a single thread talk to instruments on different buses at the same time. Python 2 has no
+asyncio, so the module provides a small event loop of its own, based on select. Coroutines are generator functions that
+yield whatever they are waiting for:
+
+* another coroutine, to run it and receive its result (i.e. ``response = yield lock_in.get_sensitivity_async()``),
+* ``sleep(seconds)``,
+* ``wait_readable(file, timeout)``, to wait for data on a serial port or device file,
+* ``gather(*coroutines)``, to run several coroutines at once and receive a list of their results,
+* ``call_in_thread(func, *args)``, to run a blocking function (i.e. a read of a device that can not be waited on with
+  select) in the worker thread and receive its result.
+
+There is one long-lived worker thread, shared by every event loop, which runs the blocking functions one at a time. The
+event loop waits for it on a pipe, as it waits on serial ports, so nothing is polled. USB commands therefore overlap
+with GPIB commands and sleeps, but not with each other. A coroutine must not call the ordinary (blocking) instrument
+functions while another coroutine may hold the Prologix hardware lock, as the blocking call would wait for the lock
+without letting the event loop run the coroutine that holds it.
+
+A coroutine returns a value by raising ``Return(value)``. Use ``run(coroutine)`` to run a coroutine from ordinary code.
+Every @write and @query decorated instrument function has a coroutine variant with an '_async' suffix, so a sweep point
+can set the frequency synthesizer (USB) and query the lock-in (GPIB) at the same time:
+
+    def set_and_snap(freq):
+        yield gather(freq_synth.set_frequency_async(freq), lock_in.set_sensitivity_async(sens))
+        yield sleep(wait)
+        x = yield lock_in.get_x_async()
+        raise Return(x)
+
+    x = async_io.run(set_and_snap(11.1))
+"""
+
+import collections
+import heapq
+import os
+import Queue
+import select
+import threading
+import time
+import types
+
+# A clock that cannot go backwards (time.monotonic does not exist before Python 3.3)
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class Return(Exception):
+    """
+    Raised by a coroutine to return a value (generators can not return values in Python 2).
+    """
+
+    def __init__(self, value=None):
+        super(Return, self).__init__(value)
+        self.value = value
+
+
+class _Sleep(object):
+    """
+    Yielded by a coroutine to sleep, see sleep().
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class _WaitReadable(object):
+    """
+    Yielded by a coroutine to wait for data on a file descriptor, see wait_readable().
+    """
+
+    def __init__(self, fd, timeout):
+        self.fd = fd
+        self.timeout = timeout
+
+
+class _Gather(object):
+    """
+    Yielded by a coroutine to run several coroutines at once, see gather().
+    """
+
+    def __init__(self, coroutines):
+        self.coroutines = coroutines
+
+
+def sleep(seconds):
+    """
+    Returns something for a coroutine to yield in order to sleep without blocking other coroutines.
+
+    :param seconds: The number of seconds to sleep
+    """
+    return _Sleep(seconds)
+
+
+def wait_readable(file_object, timeout):
+    """
+    Returns something for a coroutine to yield in order to wait until file_object has data to read (or the timeout
+    passes) without blocking other coroutines. The coroutine is sent True if there is data and False on timeout. If
+    file_object has no file descriptor, the coroutine is woken up again shortly and should check for data itself.
+
+    :param file_object: An object with a fileno() function, i.e. a serial port
+
+    :param timeout: The maximum number of seconds to wait
+    """
+    try:
+        return _WaitReadable(file_object.fileno(), timeout)
+    except (AttributeError, ValueError, IOError):
+        return _Sleep(min(timeout, 0.001))
+
+
+def gather(*coroutines):
+    """
+    Returns something for a coroutine to yield in order to run several coroutines at once. The coroutine is sent a list
+    of their results once every one of them has finished. If any of them raises an exception, the first exception is
+    raised in the coroutine.
+
+    :param coroutines: The coroutines to run
+    """
+    return _Gather(coroutines)
+
+
+def call_in_thread(func, *args):
+    """
+    A coroutine that runs a blocking function in the worker thread, so that other coroutines carry on while it runs, and
+    returns its result (or raises its exception). Used for devices that select can not wait on, such as usbtmc device
+    files, which only say they are readable once a read has been asked for. There is a single long-lived worker thread
+    for all event loops, so blocking functions run one at a time in the order they were called; only one of them
+    overlaps with the coroutines waiting on serial ports or sleeping.
+
+    :param func: The function to run
+
+    :param args: The arguments to pass to func
+
+    :return: The value returned by func
+    """
+    result = yield _CallInThread(func, args)
+    raise Return(result)
+
+
+def acquire(lock):
+    """
+    A coroutine that waits for a lock (i.e. the hw_lock of a Prologix) without blocking other coroutines. The lock must
+    be released by the caller. If the lock is taken, the worker thread waits for it (see call_in_thread), so a coroutine
+    must not wait on call_in_thread while holding a lock taken this way.
+
+    :param lock: A lock with an acquire(blocking) function
+    """
+    if not lock.acquire(False):
+        yield call_in_thread(lock.acquire)
+
+
+class _CallInThread(object):
+    """
+    Yielded by a coroutine to run a blocking function in the worker thread, see call_in_thread().
+    """
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+
+class _Worker(object):
+    """
+    The thread call_in_thread() runs blocking functions in. Each job is run in turn, and its outcome is handed back to
+    the event loop that asked for it, which is woken through its wake pipe.
+    """
+
+    def __init__(self):
+        self._jobs = Queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='async_io worker')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, loop, task, func, args):
+        """
+        Runs func(*args) in the worker thread, then passes its outcome to task through loop.
+
+        :param loop: The _EventLoop running task
+
+        :param task: The _Task waiting on the outcome
+        """
+        self._jobs.put((loop, task, func, args))
+
+    def _run(self):
+        while True:
+            loop, task, func, args = self._jobs.get()
+            try:
+                outcome = (task, func(*args), None)
+            except Exception as raised:
+                outcome = (task, None, raised)
+            loop.finish_in_thread(outcome)
+
+
+# The worker thread, started the first time call_in_thread() is used
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _get_worker():
+    """
+    Returns the worker thread, starting it if it has not been started yet.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = _Worker()
+        return _worker
+
+
+class _Task(object):
+    """
+    A coroutine being run by the event loop, along with the coroutines it is waiting on.
+    """
+
+    def __init__(self, coroutine, parent=None):
+        # The coroutine and any coroutines it has yielded, innermost last
+        self.stack = [coroutine]
+        # The gather this task belongs to, if any, and its position in that gather's results
+        self.parent = parent
+        self.done = False
+        self.result = None
+        self.exception = None
+
+
+class _Gathering(object):
+    """
+    Keeps track of the tasks started by a gather() until they have all finished.
+    """
+
+    def __init__(self, task, count):
+        self.task = task
+        self.results = [None] * count
+        self.remaining = count
+        self.exception = None
+
+
+class _EventLoop(object):
+    """
+    Runs coroutines until the first one finishes.
+    """
+
+    def __init__(self):
+        # Tasks ready to run, with the value (or exception) to send them
+        self._ready = collections.deque()
+        # A heap of (wake time, count, task) for sleeping tasks
+        self._sleeping = []
+        # A list of (fd, deadline, task) for tasks waiting for data
+        self._waiting = []
+        self._count = 0
+        # The number of tasks waiting on the worker thread, and the outcomes it has handed back, see finish_in_thread()
+        self._in_thread = 0
+        self._finished_in_thread = collections.deque()
+        # Held while an outcome is handed back, so that every outcome taken has already written its byte to the pipe
+        self._finished_lock = threading.Lock()
+        # The pipe the worker thread wakes the loop through, made the first time it is needed
+        self._wake_read = None
+        self._wake_write = None
+
+    def run(self, coroutine):
+        """
+        Runs coroutine (and anything it starts) to completion.
+
+        :return: The value returned by the coroutine
+        """
+        main = _Task(coroutine)
+        self._ready.append((main, None, None))
+        try:
+            while not main.done:
+                while self._ready:
+                    task, value, exception = self._ready.popleft()
+                    self._step(task, value, exception)
+                if main.done:
+                    break
+                self._wait()
+        finally:
+            # The worker thread may still write to the pipe if a task is waiting on it (i.e. after Ctrl-C), in which
+            # case the pipe is left open
+            if self._wake_read is not None and self._in_thread == 0:
+                os.close(self._wake_read)
+                os.close(self._wake_write)
+        if main.exception is not None:
+            raise main.exception
+        return main.result
+
+    def finish_in_thread(self, outcome):
+        """
+        Called by the worker thread to hand back the outcome of a call_in_thread() job and wake the loop.
+
+        :param outcome: A tuple of the form (task, result, exception)
+        """
+        with self._finished_lock:
+            self._finished_in_thread.append(outcome)
+            os.write(self._wake_write, b'.')
+
+    def _wait(self):
+        """
+        Blocks until a sleeping or waiting task can run, and marks it as ready.
+        """
+        now = _monotonic()
+        deadlines = [deadline for _, deadline, _ in self._waiting]
+        if self._sleeping:
+            deadlines.append(self._sleeping[0][0])
+        timeout = max(0.0, min(deadlines) - now) if deadlines else None
+        fds = list(set(fd for fd, _, _ in self._waiting))
+        if self._in_thread > 0:
+            fds.append(self._wake_read)
+        readable = []
+        if fds:
+            try:
+                readable, _, _ = select.select(fds, [], [], timeout)
+            except (select.error, OSError):
+                # Interrupted, deadlines are checked below and the wait is repeated
+                pass
+        elif timeout:
+            time.sleep(timeout)
+        now = _monotonic()
+        if self._wake_read in readable:
+            # The bytes only wake the loop, the outcomes themselves are taken below
+            os.read(self._wake_read, 4096)
+        with self._finished_lock:
+            while self._finished_in_thread:
+                self._in_thread -= 1
+                self._ready.append(self._finished_in_thread.popleft())
+        still_waiting = []
+        for fd, deadline, task in self._waiting:
+            if fd in readable:
+                self._ready.append((task, True, None))
+            elif deadline <= now:
+                self._ready.append((task, False, None))
+            else:
+                still_waiting.append((fd, deadline, task))
+        self._waiting = still_waiting
+        while self._sleeping and self._sleeping[0][0] <= now:
+            _, _, task = heapq.heappop(self._sleeping)
+            self._ready.append((task, None, None))
+
+    def _step(self, task, value, exception):
+        """
+        Runs the innermost coroutine of task until it yields, returns, or raises.
+        """
+        coroutine = task.stack[-1]
+        try:
+            if exception is not None:
+                yielded = coroutine.throw(exception)
+            else:
+                yielded = coroutine.send(value)
+        except Return as returned:
+            self._finish(task, returned.value, None)
+        except StopIteration:
+            self._finish(task, None, None)
+        except Exception as raised:
+            self._finish(task, None, raised)
+        else:
+            self._schedule(task, yielded)
+
+    def _schedule(self, task, yielded):
+        """
+        Puts task to sleep until what it yielded is ready.
+        """
+        if isinstance(yielded, types.GeneratorType):
+            task.stack.append(yielded)
+            self._ready.append((task, None, None))
+        elif isinstance(yielded, _Sleep):
+            self._count += 1
+            heapq.heappush(self._sleeping, (_monotonic() + yielded.seconds, self._count, task))
+        elif isinstance(yielded, _WaitReadable):
+            self._waiting.append((yielded.fd, _monotonic() + yielded.timeout, task))
+        elif isinstance(yielded, _CallInThread):
+            if self._wake_read is None:
+                self._wake_read, self._wake_write = os.pipe()
+            self._in_thread += 1
+            _get_worker().submit(self, task, yielded.func, yielded.args)
+        elif isinstance(yielded, _Gather):
+            if len(yielded.coroutines) == 0:
+                self._ready.append((task, [], None))
+                return
+            gathering = _Gathering(task, len(yielded.coroutines))
+            for i, coroutine in enumerate(yielded.coroutines):
+                self._ready.append((_Task(coroutine, (gathering, i)), None, None))
+        else:
+            self._ready.append((task, None, TypeError('Coroutines can not yield ' + repr(yielded))))
+
+    def _finish(self, task, result, exception):
+        """
+        Passes the result of the innermost coroutine of task to the coroutine that yielded it, or finishes the task.
+        """
+        task.stack.pop()
+        if task.stack:
+            self._ready.append((task, result, exception))
+            return
+        task.done = True
+        task.result = result
+        task.exception = exception
+        if task.parent is not None:
+            gathering, index = task.parent
+            gathering.results[index] = result
+            if exception is not None and gathering.exception is None:
+                gathering.exception = exception
+            gathering.remaining -= 1
+            if gathering.remaining == 0:
+                self._ready.append((gathering.task, gathering.results, gathering.exception))
+
+
+def run(coroutine):
+    """
+    Runs a coroutine (and anything it starts) to completion and returns its result.
+
+    :param coroutine: The coroutine to run, i.e. lock_in.get_sensitivity_async()
+
+    :return: The value returned by the coroutine
+    """
+    return _EventLoop().run(coroutine)
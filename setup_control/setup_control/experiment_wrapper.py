@@ -4,8 +4,15 @@ the entire experiment as a whole. For example, instead of initializing each inst
 settings like the lock-in reference input, the initialize_instruments() function does all of this automatically.
 """
 
+import os
+import time
+import math
+import json
 import numpy as np
-from instruments import SR830, Agilent33220A, PasternackPE11S390, Agilent34401A
+import io_trace
+import settling
+import sweep_axis
+from instruments import SR830, Agilent33220A, PasternackPE11S390, Agilent34401A, HP8350B
 from inst_io import Instrument, Prologix
 
 freq_synth = None
@@ -13,6 +20,7 @@ lock_in = None
 func_gen = None
 multimeter = None
 gpib_manager = None
+sweep_osc = None
 
 freq_multiple = None
 
@@ -167,13 +175,16 @@ def get_sensitivity():
     return _SENSITIVITY_DICT.get(lock_in.get_sensitivity())
 
 
-def set_sensitivity(sensitivity=1000.0):
+def set_sensitivity(sensitivity=1000.0, wait=0.0):
     """
     Sets the sensitivity of the lock-in in mV. The lock-in has a set of allowed sensitivities. This method will choose
     the first allowed sensitivity that is larger than the one entered.
 
     :param sensitivity: The preferred sensitivity in mV
 
+    :param wait: The time in seconds to wait for the sensitivity to set. There is no wait if the lock-in skipped the
+    write because the sensitivity was already set (see set_setting_cache_enabled).
+
     :return: The chosen sensitivity
     """
     sens_key = 26
@@ -181,10 +192,217 @@ def set_sensitivity(sensitivity=1000.0):
         if sensitivity <= value:
             sens_key = key
             break
-    lock_in.set_sensitivity(sens_key)
+    if lock_in.set_sensitivity(sens_key) and wait > 0:
+        time.sleep(wait)
     return _SENSITIVITY_DICT.get(sens_key)
 
 
+class SensitivityController(object):
+    """
+    Picks the lock-in sensitivity for each point of a sweep, replacing tables of hand tuned sensitivity bands. Each
+    point starts on the range learned for the nearest frequency measured before, or on the last good range if there is
+    none. After each snap the LIA status overload bits and |R| are checked against the full scale, and the range is
+    stepped until the reading sits between lower and upper times full scale. The range used at each frequency is learned
+    and can be saved with save() and loaded into the controller of the next sweep with load(), so that sweep mostly
+    starts on the right range and needs no calibration pass.
+
+    The controller remembers the range it set, so the sensitivity should not be changed by anything else during a
+    sweep.
+    """
+
+    # The LIA status bits that mean a reading can not be trusted
+    _OVERLOAD_BITS = (SR830.LIA_STATUS_INPUT_OVERLOAD, SR830.LIA_STATUS_FILTER_OVERLOAD,
+                      SR830.LIA_STATUS_OUTPUT_OVERLOAD)
+
+    def __init__(self, upper=0.9, lower=0.25, min_sensitivity=0.000002, max_sensitivity=1000.0, resolution=None,
+                 wait=None, max_steps=8):
+        """
+        Creates a controller with nothing learned.
+
+        :param upper: The fraction of full scale above which the range is stepped up
+
+        :param lower: The fraction of full scale below which the range is stepped down. It must be less than upper over
+        2.5 (the largest ratio between neighbouring ranges), so a range change never lands outside the band.
+
+        :param min_sensitivity: The smallest sensitivity in mV to use
+
+        :param max_sensitivity: The largest sensitivity in mV to use
+
+        :param resolution: A learned range is only used as the starting range for frequencies within resolution of the
+        frequency it was learned at. None uses the nearest learned frequency however far away it is.
+
+        :param wait: The time in seconds to wait after a range change. None waits for the low pass filter to settle, see
+        settling.lock_in_settling_time().
+
+        :param max_steps: The most range changes made for one point before giving up and using the last reading
+        """
+        if not 0 < lower < upper / 2.5 or upper > 1:
+            raise ValueError('lower (' + str(lower) + ') must be between 0 and upper / 2.5, and upper (' + str(upper) +
+                             ') at most 1')
+        self.upper = upper
+        self.lower = lower
+        self.resolution = resolution
+        self.wait = wait
+        self.max_steps = max_steps
+        self._min_key = _sensitivity_key(min_sensitivity)
+        self._max_key = _sensitivity_key(max_sensitivity)
+        # The range the controller last set, or None if it has not set one yet
+        self._key = None
+        # The last range a good reading was taken on
+        self._last_good = None
+        # The learned range of each frequency
+        self._learned = {}
+
+    def snap(self, frequency):
+        """
+        Snaps X and Y at a frequency, changing the sensitivity first if needed. The frequency should already be set and
+        the lock-in settled.
+
+        :param frequency: The frequency being measured, used to look up and learn its range
+
+        :return: A tuple of the form (x, y, sensitivity) with x and y in volts and the sensitivity used in mV
+        """
+        key = self.get_range(frequency)
+        if key is None:
+            key = self._current_key()
+        steps = 0
+        while True:
+            self._set_key(key)
+            x, y, overloaded = self._snap()
+            try:
+                r = math.hypot(float(x), float(y))
+            except (TypeError, ValueError):
+                # The snap failed, so there is nothing to learn
+                break
+            new_key = self._next_key(key, r, overloaded)
+            if new_key == key:
+                if not overloaded:
+                    self._learned[float(frequency)] = key
+                    self._last_good = key
+                break
+            if steps == self.max_steps:
+                break
+            key = new_key
+            steps += 1
+        return x, y, _SENSITIVITY_DICT[key]
+
+    def get_range(self, frequency):
+        """
+        Returns the starting range for a frequency, the range learned at the nearest frequency within resolution, or
+        else the last good range.
+
+        :param frequency: The frequency
+
+        :return: A sensitivity key of _SENSITIVITY_DICT, or None if nothing has been measured yet
+        """
+        if self._learned:
+            nearest = min(self._learned, key=lambda learned: abs(learned - frequency))
+            if self.resolution is None or abs(nearest - frequency) <= self.resolution:
+                return self._learned[nearest]
+        return self._last_good
+
+    def get_learned(self):
+        """
+        Returns the learned sensitivities.
+
+        :return: A list of tuples of the form (frequency, sensitivity in mV), sorted by frequency
+        """
+        return [(frequency, _SENSITIVITY_DICT[key]) for frequency, key in sorted(self._learned.items())]
+
+    def save(self, path):
+        """
+        Saves the learned sensitivities to a JSON file.
+
+        :param path: The path of the file
+        """
+        learned = self.get_learned()
+        with open(path, 'w') as learned_file:
+            json.dump(dict(frequencies=[frequency for frequency, _ in learned],
+                           sensitivities=[sensitivity for _, sensitivity in learned]), learned_file)
+
+    def load(self, path):
+        """
+        Adds the sensitivities saved by save() to those learned. Nothing is loaded if the file does not exist, so the
+        first sweep of a series can use the same code as the rest.
+
+        :param path: The path of the file
+
+        :return: The number of frequencies loaded
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path) as learned_file:
+            learned = json.load(learned_file)
+        for frequency, sensitivity in zip(learned['frequencies'], learned['sensitivities']):
+            self._learned[float(frequency)] = _sensitivity_key(sensitivity)
+        return len(learned['frequencies'])
+
+    def _current_key(self):
+        """
+        Returns the range the lock-in is on, clamped to the allowed ranges.
+        """
+        if self._key is None:
+            self._key = int(lock_in.get_sensitivity())
+        return min(max(self._key, self._min_key), self._max_key)
+
+    def _set_key(self, key):
+        """
+        Sets the range, waiting for the output to settle if it changed.
+        """
+        if key == self._key:
+            return
+        lock_in.set_sensitivity(key)
+        self._key = key
+        if self.wait is None:
+            settling.wait_for_settling()
+        else:
+            time.sleep(self.wait)
+
+    def _snap(self):
+        """
+        Snaps X and Y and checks for overloads, in one message. The status is read before the snap to clear any bits
+        latched while settling, and after it to see if the reading overloaded.
+
+        :return: A tuple of the form (x, y, overloaded)
+        """
+        responses = lock_in.query_many(['LIAS?', 'SNAP? 1,2', 'LIAS?'])
+        values = responses[1].split(',')
+        x, y = (values + ['', ''])[:2]
+        try:
+            x = float(x)
+            y = float(y)
+            status = int(responses[2])
+        except ValueError:
+            return x, y, False
+        return x, y, any(status & (1 << bit) for bit in self._OVERLOAD_BITS)
+
+    def _next_key(self, key, r, overloaded):
+        """
+        Returns the range to use after a reading of |R| on a range.
+        """
+        full_scale = _SENSITIVITY_DICT[key] / 1000.0
+        if overloaded:
+            # The reading is clipped, so step up a decade rather than guess from it
+            return min(key + 3, self._max_key) if r >= full_scale else min(key + 1, self._max_key)
+        if self.lower * full_scale <= r <= self.upper * full_scale:
+            return key
+        # Jump straight to the smallest range the reading fits in, which lands above lower since lower < upper / 2.5
+        for new_key in range(self._min_key, self._max_key + 1):
+            if r <= self.upper * _SENSITIVITY_DICT[new_key] / 1000.0:
+                return new_key
+        return self._max_key
+
+
+def _sensitivity_key(sensitivity):
+    """
+    Returns the key in _SENSITIVITY_DICT of the smallest sensitivity at least as large as sensitivity, in mV.
+    """
+    for key in sorted(_SENSITIVITY_DICT):
+        if sensitivity <= _SENSITIVITY_DICT[key] * (1 + 1e-9):
+            return key
+    return max(_SENSITIVITY_DICT)
+
+
 _TIME_CONSTANT_DICT = {0: 0.01,
                        1: 0.03,
                        2: 0.1,
@@ -377,6 +595,26 @@ def stop_scan():
     lock_in.pause_scan()
 
 
+def start_triggered_scan():
+    """
+    Starts data collection with one point stored for each trigger, either from trigger() or a TTL rising edge on the
+    rear panel TRIG IN, rather than at a fixed sample rate. The buffer is cleared first. The points stay in the lock-in
+    until read with get_data().
+    """
+    with lock_in.batch():
+        lock_in.pause_scan()
+        lock_in.set_sample_rate(SR830.SAMPLE_RATE_TRIGGER)
+        lock_in.reset_scan()
+        lock_in.start_scan()
+
+
+def trigger():
+    """
+    Stores one point in the lock-in buffer, after start_triggered_scan().
+    """
+    lock_in.trigger_scan()
+
+
 def get_data():
     """
     Gets the recorded data as a numpy array.
@@ -389,20 +627,376 @@ def get_data():
     return np.array([channel1_data, channel2_data])
 
 
+def stream_data(duration=None, poll_interval=0.5):
+    """
+    Starts data collection and yields the recorded data in chunks while the scan is running. Every poll_interval
+    seconds the lock-in is asked how many points it has stored, and only the points that have not been read yet are
+    downloaded. Once the scan is over the last chunk is read, so the full data set is available moments after
+    acquisition stops.
+
+    :param duration: The number of seconds to record for. If None (or longer than the time needed to fill storage), the
+    scan runs until storage is full.
+
+    :param poll_interval: The number of seconds to wait between checks for new data
+
+    :return: A generator that yields numpy arrays of the newly recorded data, each with channel 1 in the first row and
+    channel 2 in the second row. If the generator is closed early (i.e. by breaking out of a for loop over it, once the
+    generator is garbage collected), the scan is stopped and the buffer cleared.
+    """
+    storage_time = start_scan()
+    if storage_time is not None and (duration is None or duration > storage_time):
+        duration = storage_time
+    end_time = None if duration is None else time.time() + duration
+    bins_read = 0
+    stopped = False
+    try:
+        while True:
+            scanning = end_time is None or time.time() < end_time
+            if not scanning:
+                stop_scan()
+                stopped = True
+            # Download any bins that have been stored since the last check
+            length = lock_in.get_scanned_data_length()
+            if length > bins_read:
+                channel1_data = lock_in.get_channel1_scanned_data(bins_read, length - bins_read)
+                channel2_data = lock_in.get_channel2_scanned_data(bins_read, length - bins_read)
+                bins_read = length
+                yield np.array([channel1_data, channel2_data])
+            if not scanning or bins_read >= SR830.BUFFER_SIZE:
+                break
+            time.sleep(poll_interval)
+    except GeneratorExit:
+        # The caller stopped reading early and does not want the rest, so stop the scan and clear the buffer
+        stop_scan()
+        lock_in.reset_scan()
+        stopped = True
+        raise
+    finally:
+        if not stopped:
+            # Stopped by an error or an interrupt, so do not leave the scan running
+            stop_scan()
+
+
+class _LoopBufferChannel(object):
+    """
+    Keeps track of which points in one channel of the lock-in buffer have already been read while the buffer is in loop
+    mode. Until the buffer is full, new points are found by their bin numbers. Once the buffer is full, the newest point
+    is always in the last bin and older points shift down every sample, so new points are found by locating the last
+    points read (the tail) in a window at the end of the buffer.
+    """
+
+    def __init__(self, get_scanned_data, overlap):
+        """
+        :param get_scanned_data: The lock-in function that reads this channel, i.e. lock_in.get_channel1_scanned_data
+
+        :param overlap: The number of previously read points used to find where the new points begin
+        """
+        self._get_scanned_data = get_scanned_data
+        self._overlap = overlap
+        self.restart()
+
+    def restart(self):
+        """
+        Forgets every point read, including those not yet taken from the pending array, for when the buffer is reset.
+        """
+        self._bins_read = 0
+        self.tail = np.zeros(0)
+        self.pending = np.zeros(0)
+
+    def drain(self, length, expected_new):
+        """
+        Reads the points stored since the last call into the pending array.
+
+        :param length: The number of points stored in the buffer
+
+        :param expected_new: An estimate of the number of points stored since the last call
+
+        :return: True if the points were read, False if the tail had been overwritten (or the buffer wrapped before any
+        points were read) so some points were lost, in which case nothing is added to the pending array
+        """
+        if length < SR830.BUFFER_SIZE:
+            # The buffer has not wrapped, so bin numbers are fixed, unless it wraps while being read. Reading from the
+            # start of the tail finds the new points even then.
+            new = np.zeros(0)
+            if length > self._bins_read:
+                first = max(0, self._bins_read - len(self.tail))
+                read = self._get_scanned_data(first, length - first)
+                start = _find_end_of_tail(read, self.tail, self._bins_read - first)
+                if start is None:
+                    return False
+                new = read[start:]
+            self._bins_read = length
+        elif len(self.tail) == 0:
+            # The buffer wrapped before anything was read, so there is nothing to find the new points by
+            return False
+        else:
+            # Read a window at the end of the buffer large enough to contain the tail and everything after it
+            window_size = min(SR830.BUFFER_SIZE, 2 * expected_new + len(self.tail) + 64)
+            window = self._get_scanned_data(SR830.BUFFER_SIZE - window_size, window_size)
+            start = _find_end_of_tail(window, self.tail, len(window) - expected_new)
+            if start is None:
+                return False
+            new = window[start:]
+            self._bins_read = SR830.BUFFER_SIZE
+        self.tail = np.concatenate((self.tail, new))[-self._overlap:]
+        self.pending = np.concatenate((self.pending, new))
+        return True
+
+
+def _find_end_of_tail(window, tail, expected_end):
+    """
+    Finds where tail appears in window, and returns the index just past it. If tail appears more than once, the
+    occurrence ending closest to expected_end is used.
+
+    :param window: A numpy array of points to search
+
+    :param tail: A numpy array of points to search for
+
+    :param expected_end: The index at which tail is expected to end
+
+    :return: The index just past the end of tail in window, 0 if tail is empty, or None if tail is not in window
+    """
+    n = len(tail)
+    if n == 0:
+        return 0
+    # Find every point that could be the end of the tail, and then check the whole tail at each
+    ends = np.nonzero(window[n - 1:] == tail[-1])[0] + n
+    ends = [end for end in ends if np.array_equal(window[end - n:end], tail)]
+    if len(ends) == 0:
+        return None
+    return min(ends, key=lambda end: abs(end - expected_end))
+
+
+def record_data(save_path, duration, poll_interval=1.0, overlap=16):
+    """
+    Records channel 1 and channel 2 for any length of time, including longer than the time needed to fill storage. The
+    lock-in buffer is put in loop mode and new points are drained to disk every poll_interval seconds, before they can
+    be overwritten. Only the last few points read are kept in memory. Each point is appended to save_path as a pair of
+    64-bit floats (channel 1, channel 2), see load_recorded_data(). If poll_interval is too long for the sample rate,
+    points are overwritten before being read; this is counted as an overrun (and logged as a warning to the io_trace
+    logger), the points read in that poll are dropped from both channels, and the recording continues after the gap with
+    the scan restarted so the channels stay paired. However recording ends, including by an error or Ctrl-C, the scan is
+    stopped and the buffer put back in END_OF_BUFFER_SHOT mode.
+
+    :param save_path: The path of the file to append data to
+
+    :param duration: The number of seconds to record for
+
+    :param poll_interval: The number of seconds to wait between draining the buffer, should be well under the time
+    needed to fill storage
+
+    :param overlap: The number of points from the previous read used to find the new points once the buffer has wrapped
+
+    :return: A tuple of the form (points_recorded, overruns)
+    """
+    rate = get_sample_rate()
+    channels = [_LoopBufferChannel(lock_in.get_channel1_scanned_data, overlap),
+                _LoopBufferChannel(lock_in.get_channel2_scanned_data, overlap)]
+    points_recorded = 0
+    overruns = 0
+    lock_in.set_end_of_buffer_mode(SR830.END_OF_BUFFER_LOOP)
+    lock_in.reset_scan()
+    lock_in.start_scan()
+    start_time = time.time()
+    last_poll_time = start_time
+    wait = poll_interval
+    recording = True
+    try:
+        with open(save_path, 'ab') as save_file:
+            while True:
+                poll_time = time.time()
+                recording = poll_time < start_time + duration
+                if not recording:
+                    stop_scan()
+                # Estimate how many points have been stored since the last poll, used to size the window read once
+                # wrapped
+                if rate is None:
+                    expected_new = SR830.BUFFER_SIZE
+                else:
+                    expected_new = int(math.ceil((poll_time - last_poll_time) * rate))
+                last_poll_time = poll_time
+                length = lock_in.get_scanned_data_length()
+                if not all([channel.drain(length, expected_new) for channel in channels]):
+                    # Points were overwritten before they could be read. The channels are read one after the other, so
+                    # the points found in one can not be matched to the other's; drop them from both and start the
+                    # buffer again.
+                    overruns += 1
+                    io_trace.logger.warning('Lock-in buffer overrun, points were overwritten before they could be '
+                                            'read')
+                    for channel in channels:
+                        channel.restart()
+                    if recording:
+                        lock_in.reset_scan()
+                        lock_in.start_scan()
+                    # Poll again before the buffer wraps, so that there are points to find the new points by from then
+                    # on
+                    if rate is not None:
+                        wait = min(poll_interval, SR830.BUFFER_SIZE / (2.0 * rate))
+                else:
+                    wait = poll_interval
+                # Append the points that have been read from both channels
+                rows = min(len(channel.pending) for channel in channels)
+                if rows > 0:
+                    rows_read = np.column_stack([channel.pending[:rows] for channel in channels])
+                    rows_read.astype(np.float64).tofile(save_file)
+                    save_file.flush()
+                    for channel in channels:
+                        channel.pending = channel.pending[rows:]
+                    points_recorded += rows
+                if not recording:
+                    break
+                time.sleep(wait)
+    finally:
+        if recording:
+            # Stopped by an error or an interrupt, so do not leave the scan running
+            stop_scan()
+        lock_in.set_end_of_buffer_mode(SR830.END_OF_BUFFER_SHOT)
+    return points_recorded, overruns
+
+
+def load_recorded_data(save_path):
+    """
+    Loads data saved by record_data() without reading it all into memory.
+
+    :param save_path: The path of the file data was appended to
+
+    :return: A memory mapped numpy array with channel 1 in the first row and channel 2 in the second row
+    """
+    return np.memmap(save_path, dtype=np.float64, mode='r').reshape(-1, 2).T
+
+
+def initialize_sweep_oscillator(address):
+    """
+    Connects to an HP8350B sweep oscillator on the GPIB bus, for continuous_sweep(). It is not part of the standard
+    setup, so this must be called after initialize().
+
+    :param address: The GPIB address of the sweep oscillator
+    """
+    global sweep_osc
+    sweep_osc = HP8350B(address, Instrument.CONNECTION_TYPE_PROLOGIX_GPIB, gpib_manager)
+    sweep_osc.set_name('Sweep Oscillator')
+    sweep_osc.open()
+    sweep_osc.initialize_instrument()
+
+
+# The lock-in buffer channel each output of continuous_sweep() is recorded on
+_CONTINUOUS_SWEEP_CHANNELS = {'X': 1, 'R': 1, 'Y': 2, 'Theta': 2}
+
+
+def continuous_sweep(freq_start, freq_stop, sweep_time, outputs=('X', 'Y'), sweep_voltage_aux=(1, 3), sample_rate=512,
+                     margin=0.5, num=None):
+    """
+    Measures a spectrum in one analog sweep of the HP8350B (see initialize_sweep_oscillator) rather than stepping and
+    settling at each frequency. The lock-in buffers its output together with the sweep voltage from the rear panel
+    SWEEP OUT of the sweep oscillator, which ramps from 0 to 10 V as the frequency goes from start to stop. The buffer
+    has only two channels, so each output is recorded in its own sweep: X and R on channel 1 with the sweep voltage on
+    Aux3 or Aux4, and Y and Theta on channel 2 with the sweep voltage on Aux1 or Aux2. Recording both X and Y therefore
+    needs the sweep voltage teed into one Aux input of each pair.
+
+    The frequency of each sample is found from the sweep voltage, mapped linearly so that its lowest value (before the
+    sweep starts) is freq_start and its highest is freq_stop. The lock-in output lags its input by about one time
+    constant per 6 dB/oct of slope, so the sweep voltage is delayed by the same amount first. The time constant should
+    be short compared to the time the sweep takes to cross the narrowest feature of the spectrum.
+
+    :param freq_start: The frequency to start the sweep at in GHz
+
+    :param freq_stop: The frequency to stop the sweep at in GHz
+
+    :param sweep_time: The time the sweep takes in seconds
+
+    :param outputs: The lock-in outputs to record, any of 'X', 'R', 'Y', and 'Theta'
+
+    :param sweep_voltage_aux: A tuple of the form (Aux input of channel 1, Aux input of channel 2) giving the inputs the
+    sweep voltage is connected to, 1 or 2 and 3 or 4
+
+    :param sample_rate: The sample rate of the lock-in in Hz
+
+    :param margin: The time in seconds to record before and after the sweep
+
+    :param num: If given, the outputs are resampled onto num evenly spaced frequencies from freq_start to freq_stop (see
+    sweep_axis.resample)
+
+    :return: A numpy array with frequency in GHz in the first column and each output in the following columns, one row
+    for each sample of the sweep of the first output in order of frequency (or for each of the num frequencies). The
+    other outputs are interpolated onto the frequencies of the first.
+    """
+    sample_rate = set_sample_rate(sample_rate)
+    samples = int(math.ceil((sweep_time + 2 * margin) * sample_rate))
+    if samples > SR830.BUFFER_SIZE:
+        raise ValueError('A ' + str(sweep_time) + ' s sweep at ' + str(sample_rate) + ' Hz needs ' + str(samples) +
+                         ' samples, more than the ' + str(SR830.BUFFER_SIZE) + ' the lock-in can store')
+    # Set up a single sweep, which setting the trigger mode starts, so let it finish first
+    sweep_osc.start_stop_sweep(freq_start, HP8350B.UNIT_GHZ, freq_stop, HP8350B.UNIT_GHZ)
+    sweep_osc.set_sweep_time(sweep_time, HP8350B.UNIT_SECOND)
+    sweep_osc.set_trigger_mode_single()
+    time.sleep(sweep_time)
+    # The lock-in output lags the sweep voltage by one time constant for each pole of its low pass filter
+    delay = get_time_constant() / 1000.0 * get_low_pass_slope() / 6.0
+    columns = []
+    for output in outputs:
+        # Record the output on its channel and the sweep voltage on the other
+        if _CONTINUOUS_SWEEP_CHANNELS[output] == 1:
+            set_data(output, 'Aux' + str(sweep_voltage_aux[1]))
+        else:
+            set_data('Aux' + str(sweep_voltage_aux[0]), output)
+        start_scan()
+        time.sleep(margin)
+        sweep_osc.single_trigger()
+        time.sleep(sweep_time + margin)
+        stop_scan()
+        data = get_data()
+        if _CONTINUOUS_SWEEP_CHANNELS[output] == 1:
+            values, voltage = data
+        else:
+            voltage, values = data
+        frequency, values = _sweep_voltage_to_frequency(voltage, values, freq_start, freq_stop, delay * sample_rate)
+        if len(columns) == 0:
+            columns = [frequency, values]
+        else:
+            columns.append(np.interp(columns[0], frequency, values))
+    if num is not None:
+        grid, resampled = sweep_axis.resample(columns[0], np.column_stack(columns[1:]), num, start=freq_start,
+                                              stop=freq_stop)
+        return np.column_stack((grid, resampled))
+    return np.column_stack(columns)
+
+
+def _sweep_voltage_to_frequency(voltage, values, freq_start, freq_stop, delay, edge=sweep_axis.DEFAULT_EDGE):
+    """
+    Finds the frequency of each sample of a continuous sweep, see continuous_sweep().
+
+    :param voltage: The sweep voltage of each sample
+
+    :param values: The lock-in output of each sample
+
+    :param freq_start: The frequency of the lowest sweep voltage
+
+    :param freq_stop: The frequency of the highest sweep voltage
+
+    :param delay: The lag of the lock-in output behind the sweep voltage, in samples
+
+    :param edge: The fraction of the sweep at each end, where the voltage is flat with noise on it, that is dropped
+
+    :return: A tuple of the form (frequencies, values) holding the samples taken while sweeping, sorted by frequency
+    """
+    # The sweep voltage when the input that produced each output sample arrived
+    voltage = sweep_axis.delay(voltage, delay)
+    start, stop = sweep_axis.find_ramp(voltage, edge)
+    frequency = sweep_axis.ramp_to_frequency(voltage[start:stop], freq_start, freq_stop, voltage.min(), voltage.max())
+    order = np.argsort(frequency, kind='mergesort')
+    return frequency[order], np.asarray(values)[start:stop][order]
+
+
 def _convert_raw_sweep_data_to_frequency(raw_data):
     """
     Converts DC voltage data (where the voltage is proportional to the current frequency of the sweep oscillator) to
-    frequency data in Hz.
+    frequency data in Hz, see sweep_axis.voltage_to_frequency().
 
-    :param raw_data: A list of 'raw' data, in other words a list of DC voltages
+    :param raw_data: An array of 'raw' data, in other words an array of DC voltages
 
-    :return: A list of frequency data
+    :return: An array of frequency data
     """
-    frequency_data = []
-    for raw_data_point in raw_data:
-        # For each data point multiply by 1/10 * 20.40GHz (i.e. 20.40 * 10^9)
-        frequency_data.append(float(raw_data_point) * (1.0 / 10.0) * (20.40 * (10 ** 9)))
-    return frequency_data
+    return sweep_axis.voltage_to_frequency(raw_data)
 
 
 def set_data(col1='X', col2='Y'):
@@ -437,6 +1031,37 @@ def set_data(col1='X', col2='Y'):
         lock_in.set_channel2_display(SR830.DISPLAY_CHANNEL2_AUX4)
 
 
+def set_setting_cache_enabled(enable=True, skip_redundant_writes=False):
+    """
+    Turns the setting cache of the lock-in, function generator, and frequency synthesizer on or off. While it is on,
+    getting a setting that was set (or got) before answers from memory rather than querying the instrument. Only turn it
+    on while the front panels are locked, since changes made by hand are not seen.
+
+    :param enable: True to turn the setting caches on, False to turn them off
+
+    :param skip_redundant_writes: If True, setting a value an instrument already has sends nothing
+    """
+    lock_in.set_cache_enabled(enable, skip_redundant_writes)
+    func_gen.set_cache_enabled(enable, skip_redundant_writes)
+    freq_synth.set_cache_enabled(enable, skip_redundant_writes)
+
+
+def verify_settings():
+    """
+    Checks the setting caches against the instruments, with one batched query per instrument, and corrects any cached
+    settings that were wrong.
+
+    :return: A dictionary mapping each instrument name to a dictionary of the settings that did not match, as returned
+    by Instrument.verify()
+    """
+    mismatches = {}
+    for instrument in (lock_in, func_gen, freq_synth):
+        instrument_mismatches = instrument.verify()
+        if instrument_mismatches:
+            mismatches[instrument.get_name()] = instrument_mismatches
+    return mismatches
+
+
 def initialize():
     """
     Initializes the instruments and prepares the relevant settings.
@@ -448,10 +1073,19 @@ def initialize():
     global multimeter
     global gpib_manager
     global freq_multiple
+    # Find the instruments, which are simulated if the SETUP_CONTROL_SIMULATOR environment variable is set
+    prologix_port = '/dev/ttyUSB0'
+    usb_connection_type = Instrument.CONNECTION_TYPE_USB
+    usb_manager = None
+    if os.environ.get('SETUP_CONTROL_SIMULATOR'):
+        import simulator
+        usb_manager = simulator.start()
+        prologix_port = usb_manager.port
+        usb_connection_type = Instrument.CONNECTION_TYPE_NI_USB
     # Create new ConnectionManagers to deal with all of the instruments being used.
-    gpib_manager = Prologix(port='/dev/ttyUSB0')
+    gpib_manager = Prologix(port=prologix_port)
     # Instantiate each instrument
-    freq_synth = PasternackPE11S390('/dev/usbtmc0', Instrument.CONNECTION_TYPE_USB, gpib_manager)
+    freq_synth = PasternackPE11S390('/dev/usbtmc0', usb_connection_type, usb_manager)
     lock_in = SR830(8, Instrument.CONNECTION_TYPE_PROLOGIX_GPIB, gpib_manager)
     func_gen = Agilent33220A(10, Instrument.CONNECTION_TYPE_PROLOGIX_GPIB, gpib_manager)
     multimeter = Agilent34401A(28, Instrument.CONNECTION_TYPE_PROLOGIX_GPIB, gpib_manager)
@@ -469,24 +1103,26 @@ def initialize():
     multimeter.initialize_instrument()
     # Initialize the frequency synthesizer
     freq_synth.initialize_instrument()
-    # Initialize the lock-in, reset, set the reference source and trigger, set what happens when the data buffer is full, and set the display and data recording settings.
-    lock_in.initialize_instrument()
-    lock_in.reset()
-    lock_in.set_input_shield_grounding(SR830.INPUT_SHIELD_GROUNDING_GROUND)
-    lock_in.set_input_coupling(SR830.INPUT_COUPLING_AC)
-    lock_in.set_input_configuration(SR830.INPUT_CONFIGURATION_A)
-    lock_in.set_input_notch_line_filter(SR830.INPUT_NOTCH_OUT_OR_NO)
-    lock_in.set_reserve_mode(SR830.RESERVE_MODE_LOW_NOISE)
-    lock_in.set_reference_source(SR830.REFERENCE_SOURCE_EXTERNAL)
-    lock_in.set_reference_trigger_mode(SR830.REFERENCE_TRIGGER_MODE_TTL_RISING_EDGE)
-    lock_in.set_trigger_mode(SR830.TRIGGER_START_MODE_OFF)
-    lock_in.set_end_of_buffer_mode(SR830.END_OF_BUFFER_SHOT)
-    lock_in.set_channel1_output(SR830.CHANNEL1_OUTPUT_DISPLAY)
-    lock_in.set_channel2_output(SR830.CHANNEL2_OUTPUT_DISPLAY)
+    # Initialize the lock-in, reset, set the reference source and trigger, set what happens when the data buffer is full, and set the display and data recording settings. The settings are sent together in one message.
+    with lock_in.batch():
+        lock_in.initialize_instrument()
+        lock_in.reset()
+        lock_in.set_input_shield_grounding(SR830.INPUT_SHIELD_GROUNDING_GROUND)
+        lock_in.set_input_coupling(SR830.INPUT_COUPLING_AC)
+        lock_in.set_input_configuration(SR830.INPUT_CONFIGURATION_A)
+        lock_in.set_input_notch_line_filter(SR830.INPUT_NOTCH_OUT_OR_NO)
+        lock_in.set_reserve_mode(SR830.RESERVE_MODE_LOW_NOISE)
+        lock_in.set_reference_source(SR830.REFERENCE_SOURCE_EXTERNAL)
+        lock_in.set_reference_trigger_mode(SR830.REFERENCE_TRIGGER_MODE_TTL_RISING_EDGE)
+        lock_in.set_trigger_mode(SR830.TRIGGER_START_MODE_OFF)
+        lock_in.set_end_of_buffer_mode(SR830.END_OF_BUFFER_SHOT)
+        lock_in.set_channel1_output(SR830.CHANNEL1_OUTPUT_DISPLAY)
+        lock_in.set_channel2_output(SR830.CHANNEL2_OUTPUT_DISPLAY)
     # Initialize the function generator and set the trigger source to software
-    func_gen.set_wave_type(Agilent33220A.WAVE_TYPE_SQUARE)
-    func_gen.set_output_state(Agilent33220A.STATE_OFF)
-    func_gen.set_sweep_state(Agilent33220A.STATE_OFF)
+    with func_gen.batch():
+        func_gen.set_wave_type(Agilent33220A.WAVE_TYPE_SQUARE)
+        func_gen.set_output_state(Agilent33220A.STATE_OFF)
+        func_gen.set_sweep_state(Agilent33220A.STATE_OFF)
     # Set freq_multiple to 18, as is standard with this experiment
     freq_multiple = 18.0
 
@@ -495,6 +1131,8 @@ def close():
     freq_synth.close()
     lock_in.close()
     func_gen.close()
+    if sweep_osc is not None:
+        sweep_osc.close()
 
 
 def _command_line(address, connection_manager):
@@ -11,62 +11,169 @@ convenient and straight forward.
 import serial
 import sys
 import time
+import select
 import multiprocessing
+import functools
+import contextlib
+import async_io
+import io_trace
+import io_metrics
+from async_io import Return
+
+# A clock that cannot go backwards, used for read deadlines (time.monotonic does not exist before Python 3.3)
+_monotonic = getattr(time, 'monotonic', time.time)
 
 
 def write(func):
     """
-    This function is intended to be used as a decorator. It takes a function in a subclass of Instrument that returns a string and wrties to that instrument with the returned string. The function also prints any communication with the instrument to the command line.
+    This function is intended to be used as a decorator. It takes a function in a subclass of Instrument that returns a string and wrties to that instrument with the returned string. The function also records any communication with the instrument (see the io_trace module).
+    If the instrument skips redundant writes (see Instrument.set_cache_enabled), commands setting a value the instrument already has are not sent. The decorated function returns True if any command was sent, and False otherwise.
+    The decorated function also gets a coroutine variant (see the async_io module), called by adding '_async' to its name.
 
     :param func: An instance function of a subclass of Instrument that returns a string
+
+    :return: True if any command was sent to the instrument, False if every command was skipped
     """
 
     def write_wrapper(self, *args, **kwargs):
         content = func(self, *args, **kwargs)
-        if type(content) is list:
-            for command in content:
-                print("Writing to " + self.get_name() + " --> " + command)
-                self.write(command)
-        else:
-            command = content
-            print("Writing to " + self.get_name() + " --> " + command)
+        if type(content) is not list:
+            content = [content]
+        changed = False
+        for command in content:
+            if self._is_redundant_write(command):
+                io_trace.record(self, io_trace.KIND_SKIP, command)
+                continue
+            start = time.time()
             self.write(command)
+            io_trace.record(self, io_trace.KIND_WRITE, command, start=start)
+            changed = True
+        return changed
 
+    def write_coroutine(self, *args, **kwargs):
+        content = func(self, *args, **kwargs)
+        if type(content) is not list:
+            content = [content]
+        changed = False
+        for command in content:
+            if self._is_redundant_write(command):
+                io_trace.record(self, io_trace.KIND_SKIP, command)
+                continue
+            start = time.time()
+            yield self.write_async(command)
+            io_trace.record(self, io_trace.KIND_WRITE, command, start=start)
+            changed = True
+        raise Return(changed)
+
+    write_wrapper.coroutine = write_coroutine
     return write_wrapper
 
 
-def query(func):
+def query(func, use_cache=True):
     """
-    This function is intended to be used as a decorator. It takes a function in a subclass of Instrument that returns a string and queries that instrument with the returned string. The function also prints any communication with the instrument to the command line.
+    This function is intended to be used as a decorator. It takes a function in a subclass of Instrument that returns a string and queries that instrument with the returned string. The function also records any communication with the instrument (see the io_trace module).
+    The decorated function also gets a coroutine variant (see the async_io module), called by adding '_async' to its name.
 
     :param func: An instance function of a subclass of Instrument that returns a string
 
+    :param use_cache: False to always send the query to the instrument, even if the setting cache is on (see uncached_query)
+
     :return: The response of the queried command
     """
 
     def query_wrapper(self, *args, **kwargs):
         command = func(self, *args, **kwargs)
-        print("Querying to " + self.get_name() + " --> " + command)
-        response = str(self.query(command))
-        if type(response) is bytearray: # Check to see if the response is a byte array. If it is, decode to string.
-            response = response.decode('utf-8')
-        if response.rfind('\n') != -1:
-            response = response[:response.rfind('\n')]
-        print("Received from " + self.get_name() + " <-- " + response)
-        # Try to cast the response as a float and then an int
-        if response.rfind(';') != -1:
-            response = response[:response.rfind(';')]
-        try:
-            response = float(response)
-            if response.is_integer():
-                response = int(response)
-        except ValueError:
-            pass
-        return response
+        start = time.time()
+        response = _decode_response(self.query(command, use_cache=use_cache))
+        io_trace.record(self, io_trace.KIND_QUERY, command, response, start)
+        return _to_number(response)
 
+    def query_coroutine(self, *args, **kwargs):
+        command = func(self, *args, **kwargs)
+        start = time.time()
+        response = _decode_response((yield self.query_async(command, use_cache=use_cache)))
+        io_trace.record(self, io_trace.KIND_QUERY, command, response, start)
+        raise Return(_to_number(response))
+
+    query_wrapper.coroutine = query_coroutine
     return query_wrapper
 
 
+def uncached_query(func):
+    """
+    This function is intended to be used as a decorator in the same way as query, for queries of values that change
+    without being set, such as the number of points in a buffer. The query is always sent to the instrument and its
+    response is never cached, whatever the setting cache holds.
+
+    :param func: An instance function of a subclass of Instrument that returns a string
+
+    :return: The response of the queried command
+    """
+    return query(func, use_cache=False)
+
+
+def _decode_response(response):
+    """
+    Turns the response to a query into a string without the end of line character.
+
+    :param response: The response of the instrument
+
+    :return: The response as a string
+    """
+    if type(response) is bytearray: # Check to see if the response is a byte array. If it is, decode to string.
+        response = response.decode('utf-8')
+    response = str(response)
+    if response.rfind('\n') != -1:
+        response = response[:response.rfind('\n')]
+    return response
+
+
+def _to_number(response):
+    """
+    Turns a response string into an int or float if it represents a number.
+
+    :param response: The response string, without an end of line character
+
+    :return: The response as an int or float if it represents a number, otherwise as a string
+    """
+    # Try to cast the response as a float and then an int
+    if response.rfind(';') != -1:
+        response = response[:response.rfind(';')]
+    try:
+        response = float(response)
+        if response.is_integer():
+            response = int(response)
+    except ValueError:
+        pass
+    return response
+
+
+def _split_command(command):
+    """
+    Splits a command into its header and its arguments, i.e. 'SENS 5' into ('SENS', '5') and 'POWE:SET?;' into
+    ('POWE:SET?', '').
+
+    :param command: The command to split
+
+    :return: A tuple of (header, arguments)
+    """
+    command = command.strip().rstrip(';').strip()
+    header, _, arguments = command.partition(' ')
+    return header.upper(), arguments.strip()
+
+
+def _split_responses(response):
+    """
+    Splits the response to several queries sent in one message into the response to each query.
+
+    :param response: The response of the instrument
+
+    :return: A list of response strings
+    """
+    response = str(response).replace('\r', '').replace(';', '\n')
+    return [part.strip() for part in response.split('\n') if part.strip() != '']
+
+
 # noinspection SpellCheckingInspection
 class Prologix(object):
     """
@@ -86,6 +193,12 @@ class Prologix(object):
         """
         # Create a hardware lock, used to ensure multiple GpibDeviceInterface objects don't try to access their Prologix controller at once
         self.hw_lock = multiprocessing.Lock()
+        # Create a read buffer, holds bytes that have been read from the serial port but not yet returned by read_next
+        self._read_buffer = bytearray()
+        # The name the controller's bus time is recorded under (see the io_metrics module)
+        self.name = 'Prologix ' + str(port)
+        # The number of reads that have timed out, used to count timeouts for each instrument
+        self.timeouts = 0
         # Attempt to open a serial connection to the device
         try:
             self.ser = serial.Serial(port=port, baudrate=19200, timeout=read_timeout)
@@ -167,6 +280,56 @@ class Prologix(object):
         """
         NOT SAFE IN MULTIPROCESSING ENVIORNMENTS!!!
         Doesn't query the currently selected GPIB bus address for a response, but simply returns any response already in the buffer (up to the eol char, the max number of bytes, or the timeout)
+        Everything waiting in the serial buffer is read at once, and any bytes past the end of the message are kept in the read buffer for the next call. While no data is waiting the function sleeps on the serial port rather than polling it.
+
+        :param eol: A character indicating the end of the message from the device
+
+        :param size: The maximum number of bytes to read, or None for no limit.
+
+        :param timeout: The maximum amount of time to allow this function to run
+
+        :return: The response of the device.
+        """
+        # Find the time at which the read gives up, will be used to detect if operation has timed out
+        deadline = _monotonic() + timeout
+        # Index in the read buffer from which to search for the end of line character (bytes before it were already searched)
+        search_from = 0
+        while True:
+            msg = self._split_message(eol, size, search_from)
+            if msg is not None:
+                return msg
+            # Everything buffered so far has been searched
+            search_from = len(self._read_buffer)
+            # Read everything that is waiting in the serial buffer at once
+            if self._read_waiting():
+                continue
+            # Check for timeout. If timeout, return what has been read so far.
+            remaining = deadline - _monotonic()
+            if remaining <= 0:
+                return self._read_timed_out()
+            # Sleep until the serial port has data or the deadline passes
+            self._wait_for_data(remaining)
+
+    def read_async(self, eol='\n', size=None):
+        """
+        A coroutine version of read(), which waits for the response without blocking other coroutines.
+
+        :param eol: A character indicating the end of the message from the device
+
+        :param size: The maximum number of bytes to read, or None for no limit.
+
+        :return: The response of the device.
+        """
+        # Ask the controller to send us everything until the EOI,
+        self.write("++read eoi\n")
+        # Return what is read up until the end of line.
+        response = yield self.read_next_async(eol, size)
+        raise Return(response)
+
+    def read_next_async(self, eol='\n', size=None, timeout=1):
+        """
+        NOT SAFE IN MULTIPROCESSING ENVIORNMENTS!!!
+        A coroutine version of read_next(), which waits for data without blocking other coroutines.
 
         :param eol: A character indicating the end of the message from the device
 
@@ -176,31 +339,154 @@ class Prologix(object):
 
         :return: The response of the device.
         """
-        # Create a bytearray to read data into
-        msg = bytearray()
-        # Find the ASCII value of the end of line character
-        eolAscii = ord(eol)
-        # Get the current time, will be used to detect if operation has timed out
-        startTime = time.clock()
+        deadline = _monotonic() + timeout
+        search_from = 0
         while True:
-            # If nothing is waiting in the serial buffer, break
-            if self.ser.inWaiting() > 0:
-                # Read the next byte into the msg bytearray
-                msg.append(self.ser.read(1))
-                # See if the last byte in the msg bytearray (i.e. the byte read on the previous line) is the end of line character. If so, break.
-                if int(msg[-1]) == eolAscii:
-                    break
-                # If read_next was called with a size constraint and the msg bytearray is larger than that size, break.
-                if (size > 0) and (len(msg) >= size):
-                    break
-            # Check for timeout. If timeout, break.
-            if time.clock() > (startTime + timeout):
-                print("Read timed out when attempting to receive data from the GPIB device with address " + str(self.cur_addr.value) + ".  Is the device connected and powered on?")
-                # If a message has been read, print the last character read and suggest that it might be the end of line character
-                if len(msg) > 0:
-                    print("Perhaps the end of line character should be ASCII " + msg[-1])
+            msg = self._split_message(eol, size, search_from)
+            if msg is not None:
+                raise Return(msg)
+            search_from = len(self._read_buffer)
+            if self._read_waiting():
+                continue
+            remaining = deadline - _monotonic()
+            if remaining <= 0:
+                raise Return(self._read_timed_out())
+            yield async_io.wait_readable(self.ser, remaining)
+
+    def _split_message(self, eol, size, search_from=0):
+        """
+        Splits the next message off of the read buffer, leaving any remaining bytes for the next call.
+
+        :param eol: A character indicating the end of the message from the device
+
+        :param size: The maximum number of bytes in the message, or None for no limit.
+
+        :param search_from: The index in the read buffer from which to search for the end of line character
+
+        :return: The message, or None if the read buffer does not hold a whole message yet
+        """
+        # Find the end of the message in the read buffer, just past the end of line character (0 if it is not there yet)
+        end = self._read_buffer.find(eol, search_from) + 1
+        # If there is a size constraint that is reached before the end of line character, stop there
+        if size and (len(self._read_buffer) >= size) and (end == 0 or end > size):
+            end = size
+        if end == 0:
+            return None
+        msg = self._read_buffer[:end]
+        del self._read_buffer[:end]
+        return msg
+
+    def _read_waiting(self):
+        """
+        Reads everything that is waiting in the serial buffer into the read buffer.
+
+        :return: True if anything was read
+        """
+        waiting = self.ser.inWaiting()
+        if waiting > 0:
+            self._read_buffer.extend(self.ser.read(waiting))
+            return True
+        return False
+
+    def _read_timed_out(self):
+        """
+        Reports a read timeout and returns (and empties) whatever is in the read buffer.
+        """
+        self.timeouts += 1
+        print("Read timed out when attempting to receive data from the GPIB device with address " + str(self.cur_addr.value) + ".  Is the device connected and powered on?")
+        # If a message has been read, print the last character read and suggest that it might be the end of line character
+        if len(self._read_buffer) > 0:
+            print("Perhaps the end of line character should be ASCII " + str(self._read_buffer[-1]))
+        msg = self._read_buffer[:]
+        del self._read_buffer[:]
+        return msg
+
+    def _wait_for_data(self, timeout):
+        """
+        Blocks without using the CPU until data arrives on the serial port or the timeout passes. This function may
+        return early (i.e. if interrupted by a signal), so callers should check for data and their deadline again.
+
+        :param timeout: The maximum number of seconds to wait
+        """
+        try:
+            fd = self.ser.fileno()
+        except (AttributeError, serial.SerialException):
+            fd = None
+        if fd is None:
+            # There is no file descriptor to wait on (i.e. on Windows), so block on reading a single byte instead
+            read_timeout = self.ser.timeout
+            self.ser.timeout = timeout
+            try:
+                self._read_buffer.extend(self.ser.read(1))
+            finally:
+                self.ser.timeout = read_timeout
+            return
+        try:
+            select.select([fd], [], [], timeout)
+        except (select.error, OSError):
+            # Interrupted, the caller will check its deadline and wait again
+            pass
+
+    def read_binary(self, nbytes, timeout=1):
+        """
+        Queries the currently selected GPIB bus address for a binary response and returns exactly nbytes bytes of it
+        (or fewer if the timeout passes). The response is not searched for an end of line character, so it may contain
+        any byte values.
+
+        :param nbytes: The number of bytes to read
+
+        :param timeout: The maximum amount of time to wait for more data to arrive
+
+        :return: A bytearray containing the response of the device.
+        """
+        # Ask the controller to send us everything until the EOI
+        self.write("++read eoi\n")
+        # Return exactly nbytes bytes of what is read
+        return self.read_next_binary(nbytes, timeout)
+
+    def read_next_binary(self, nbytes, timeout=1):
+        """
+        NOT SAFE IN MULTIPROCESSING ENVIORNMENTS!!!
+        Doesn't query the currently selected GPIB bus address for a response, but simply returns exactly nbytes bytes
+        already in the buffer (or fewer if the timeout passes). The bytes are read into a preallocated buffer without
+        searching for an end of line character.
+
+        :param nbytes: The number of bytes to read
+
+        :param timeout: The maximum amount of time to wait for more data to arrive
+
+        :return: A bytearray containing the response of the device.
+        """
+        # Preallocate the message, then fill it with anything left over in the read buffer from the last read
+        msg = bytearray(nbytes)
+        filled = min(nbytes, len(self._read_buffer))
+        msg[:filled] = self._read_buffer[:filled]
+        del self._read_buffer[:filled]
+        # Find the time at which the read gives up, pushed back every time data arrives
+        deadline = _monotonic() + timeout
+        while filled < nbytes:
+            # Read everything that is waiting in the serial buffer that belongs to this message
+            waiting = min(self.ser.inWaiting(), nbytes - filled)
+            if waiting > 0:
+                chunk = self.ser.read(waiting)
+                msg[filled:filled + len(chunk)] = chunk
+                filled += len(chunk)
+                deadline = _monotonic() + timeout
+                continue
+            # Check for timeout. If timeout, return what has been read so far.
+            remaining = deadline - _monotonic()
+            if remaining <= 0:
+                self.timeouts += 1
+                print("Read timed out after receiving " + str(filled) + " of " + str(nbytes) + " bytes from the GPIB device with address " + str(self.cur_addr.value) + ".")
+                del msg[filled:]
                 break
-        # Return the read message
+            # Sleep until the serial port has data or the deadline passes
+            self._wait_for_data(remaining)
+            # Waiting may have read a byte into the read buffer, move it into the message
+            if len(self._read_buffer) > 0:
+                msg[filled:filled + 1] = self._read_buffer[:1]
+                del self._read_buffer[:1]
+                filled += 1
         return msg
 
     def flush(self):
@@ -209,6 +495,14 @@ class Prologix(object):
         """
         self.ser.flush()
 
+    def discard_input(self):
+        """
+        Throws away everything that has been received from the Prologix but not yet read, i.e. the rest of a binary
+        stream that was interrupted.
+        """
+        self.ser.flushInput()
+        del self._read_buffer[:]
+
 
 class GPIBDeviceInterface(object):
     """
@@ -225,6 +519,10 @@ class GPIBDeviceInterface(object):
         """
         self.gpibAddr = gpibAddr
         self.controller = controller
+        # The name the instrument's communication is recorded under (see the io_metrics module)
+        self.metrics_name = 'GPIB ' + str(gpibAddr)
+        # The last command sent, which responses read later are recorded under
+        self._last_command = ''
 
     def write(self, msg):
         """
@@ -232,9 +530,12 @@ class GPIBDeviceInterface(object):
 
         :param msg: A string containing the message to send
         """
+        start = _monotonic()
         # Wait until a hardware lock is acquired
         with self.controller.hw_lock:
+            locked = _monotonic()
             self._write(msg)
+        self._record(msg, start, locked, bytes_out=len(msg))
 
     def _write(self, msg):
         """
@@ -265,9 +566,14 @@ class GPIBDeviceInterface(object):
 
         :return: The response of the device.
         """
+        start = _monotonic()
+        timeouts = self.controller.timeouts
         # Wait until a hardware lock is acquired
         with self.controller.hw_lock:
-            self._read(eol, size)
+            locked = _monotonic()
+            response = self._read(eol, size)
+        self._record(None, start, locked, bytes_in=len(response), timed_out=self.controller.timeouts != timeouts)
+        return response
 
     def _read(self, eol='\n', size=None):
         """
@@ -286,6 +592,36 @@ class GPIBDeviceInterface(object):
         # Finally read and return
         return self.controller.read(eol, size)
 
+    def read_binary(self, nbytes):
+        """
+        Queries the instrument for a binary response and returns exactly nbytes bytes of it (or fewer on timeout)
+
+        :param nbytes: The number of bytes to read
+
+        :return: A bytearray containing the response of the device.
+        """
+        start = _monotonic()
+        timeouts = self.controller.timeouts
+        # Wait until a hardware lock is acquired
+        with self.controller.hw_lock:
+            locked = _monotonic()
+            response = self._read_binary(nbytes)
+        self._record(None, start, locked, bytes_in=len(response), timed_out=self.controller.timeouts != timeouts)
+        return response
+
+    def _read_binary(self, nbytes):
+        """
+        Reads a binary response from a GPIB device at the current GPIB address. This function does not wait for a hardware lock.
+
+        :param nbytes: The number of bytes to read
+
+        :return: A bytearray containing the response of the device.
+        """
+        # Set the gpib address
+        self.controller.set_gpib_address(self.gpibAddr)
+        # Finally read and return
+        return self.controller.read_binary(nbytes)
+
     def readNext(self, eol='\n', size=None):
         """
         NOT SAFE IN MULTIPROCESSING ENVIRONMENTS!!!
@@ -297,10 +633,40 @@ class GPIBDeviceInterface(object):
 
         :return: The response of the device.
         """
+        start = _monotonic()
+        timeouts = self.controller.timeouts
         # Set the gpib address
         self.controller.set_gpib_address(self.gpibAddr)
         # Returns read next
-        return self.controller.read_next(eol, size)
+        response = self.controller.read_next(eol, size)
+        self._record(None, start, start, bytes_in=len(response), timed_out=self.controller.timeouts != timeouts)
+        return response
+
+    def readNextBinary(self, nbytes):
+        """
+        NOT SAFE IN MULTIPROCESSING ENVIRONMENTS!!!
+        Doesn't query the instrument for a response, but simply returns exactly nbytes bytes already in the buffer (or fewer on timeout).
+
+        :param nbytes: The number of bytes to read
+
+        :return: A bytearray containing the response of the device.
+        """
+        start = _monotonic()
+        timeouts = self.controller.timeouts
+        # Set the gpib address
+        self.controller.set_gpib_address(self.gpibAddr)
+        # Returns read next binary
+        response = self.controller.read_next_binary(nbytes)
+        self._record(None, start, start, bytes_in=len(response), timed_out=self.controller.timeouts != timeouts)
+        return response
+
+    def discard_input(self):
+        """
+        Throws away everything that has been received from the controller but not yet read
+        """
+        # Wait until a hardware lock is acquired
+        with self.controller.hw_lock:
+            self.controller.discard_input()
 
     def query(self, cmd, eol='\n', size=None):
         """
@@ -314,12 +680,79 @@ class GPIBDeviceInterface(object):
 
         :return: The response of the device.
         """
+        start = _monotonic()
         # Wait until a hardware lock is acquired
         with self.controller.hw_lock:
+            locked = _monotonic()
+            timeouts = self.controller.timeouts
+            # Write command
+            self._write(cmd)
+            # Read the response
+            response = self._read(eol, size)
+            timed_out = self.controller.timeouts != timeouts
+        self._record(cmd, start, locked, len(cmd), len(response), timed_out)
+        return response
+
+    def write_async(self, msg):
+        """
+        A coroutine version of write(), which waits for the hardware lock without blocking other coroutines.
+
+        :param msg: A string containing the message to send
+        """
+        start = _monotonic()
+        # Wait until a hardware lock is acquired
+        yield async_io.acquire(self.controller.hw_lock)
+        locked = _monotonic()
+        try:
+            self._write(msg)
+        finally:
+            self.controller.hw_lock.release()
+        self._record(msg, start, locked, bytes_out=len(msg))
+
+    def query_async(self, cmd, eol='\n', size=None):
+        """
+        A coroutine version of query(), which waits for the hardware lock and the response without blocking other coroutines.
+
+        :param cmd: A string containing the message to send
+
+        :param eol: A character indicating the end of the message from the device
+
+        :param size: The maximum number of bytes to read, or None for no limit.
+
+        :return: The response of the device.
+        """
+        start = _monotonic()
+        # Wait until a hardware lock is acquired
+        yield async_io.acquire(self.controller.hw_lock)
+        locked = _monotonic()
+        try:
+            timeouts = self.controller.timeouts
             # Write command
             self._write(cmd)
-            # Return what is read
-            return self._read(eol, size)
+            # Set the gpib address, clear any gunk out, and wait for what is read
+            self.controller.set_gpib_address(self.gpibAddr)
+            self.controller.flush()
+            response = yield self.controller.read_async(eol, size)
+            timed_out = self.controller.timeouts != timeouts
+        finally:
+            self.controller.hw_lock.release()
+        self._record(cmd, start, locked, len(cmd), len(response), timed_out)
+        raise Return(response)
+
+    def _record(self, command, start, locked, bytes_out=0, bytes_in=0, timed_out=False):
+        """
+        Records a command or read in the io_metrics module.
+
+        :param command: The command sent, or None for a read of the response to the last command
+
+        :param start: The _monotonic() time the hardware lock was asked for
+
+        :param locked: The _monotonic() time the hardware lock was acquired
+        """
+        if command is not None:
+            self._last_command = command
+        io_metrics.record(self.metrics_name, self._last_command, _monotonic() - locked, bytes_out, bytes_in,
+                          locked - start, timed_out, command is None, self.controller.name)
 
     def flush(self):
         """
@@ -341,6 +774,13 @@ class USBDevice(object):
         :param address: The address of the USB device
         """
         self._address = address
+        # The name the instrument's communication is recorded under (see the io_metrics module)
+        self.metrics_name = str(address)
+        # The last command sent, which responses read later are recorded under
+        self._last_command = ''
+        # A lock held for each command and its response, since the coroutine versions send them from the async_io worker
+        # thread
+        self._lock = multiprocessing.Lock()
         # Open a device at the specified address, set to read/write mode
         self._device = open(self._address, 'w+')
         if self.query('*IDN?') != '':
@@ -356,8 +796,25 @@ class USBDevice(object):
 
         :return: Returns the string that is read from the USB device
         """
+        start = _monotonic()
+        # Read from the device
+        response = self._device.read()
+        self._record(None, start, bytes_in=len(response))
+        return response
+
+    def read_binary(self, nbytes):
+        """
+        Reads exactly nbytes bytes from the USB device
+
+        :param nbytes: The number of bytes to read
+
+        :return: A bytearray containing the bytes read from the USB device
+        """
+        start = _monotonic()
         # Read from the device
-        return self._device.read()
+        response = bytearray(self._device.read(nbytes))
+        self._record(None, start, bytes_in=len(response), timed_out=len(response) < nbytes)
+        return response
 
     def write(self, command):
         """
@@ -365,10 +822,13 @@ class USBDevice(object):
 
         :param command: The command to write
         """
-        # Write to the device
-        self._device.write(command)
-        # Flush the connection
-        self._device.flush()
+        with self._lock:
+            start = _monotonic()
+            # Write to the device
+            self._device.write(command)
+            # Flush the connection
+            self._device.flush()
+            self._record(command, start, bytes_out=len(command))
 
     def query(self, command):
         """
@@ -378,12 +838,50 @@ class USBDevice(object):
 
         :return: The response.
         """
-        # Write to the device
-        self._device.write(command)
-        # Flush the connection
-        self._device.flush()
-        # Return what is read and strip any whitespace away
-        return self._device.read().strip()
+        with self._lock:
+            start = _monotonic()
+            # Write to the device
+            self._device.write(command)
+            # Flush the connection
+            self._device.flush()
+            # Return what is read and strip any whitespace away
+            response = self._device.read()
+            self._record(command, start, len(command), len(response), response == '')
+        return response.strip()
+
+    def write_async(self, command):
+        """
+        A coroutine version of write(), which writes in the async_io worker thread (see async_io.call_in_thread) so
+        other coroutines carry on while the device driver blocks.
+
+        :param command: The command to write
+        """
+        return async_io.call_in_thread(self.write, command)
+
+    def query_async(self, command):
+        """
+        A coroutine version of query(), which queries in the async_io worker thread (see async_io.call_in_thread) so
+        other coroutines carry on while waiting for the response. A usbtmc device file can not be waited on with select,
+        as it has nothing to read until a read is asked for, so the blocking query is run in the thread instead.
+
+        :param command: The command to write.
+
+        :return: The response.
+        """
+        return async_io.call_in_thread(self.query, command)
+
+    def _record(self, command, start, bytes_out=0, bytes_in=0, timed_out=False):
+        """
+        Records a command or read in the io_metrics module.
+
+        :param command: The command sent, or None for a read of the response to the last command
+
+        :param start: The _monotonic() time the command or read started
+        """
+        if command is not None:
+            self._last_command = command
+        io_metrics.record(self.metrics_name, self._last_command, _monotonic() - start, bytes_out, bytes_in, 0.0,
+                          timed_out, command is None)
 
     def close(self):
         """
@@ -411,6 +909,22 @@ class Instrument(object):
     CONNECTION_TYPE_NI_GPIB = 2
     CONNECTION_TYPE_NI_USB = 3
 
+    # The string used to join commands sent together by batch(), or None if the instrument can not take several commands
+    # in one message
+    BATCH_SEPARATOR = None
+
+    # The maximum length of a message sent by batch(), or None for no limit
+    MAX_COMMAND_LENGTH = None
+
+    # Commands (either a header, i.e. '*RST', or a whole command, i.e. 'OVRM 1') that can change settings without
+    # saying so, and so clear the setting cache
+    CACHE_INVALIDATING_COMMANDS = ('*RST', '*RCL')
+
+    # The headers of the settings the setting cache may hold, those that a setter writes and a getter reads back with
+    # the same header (i.e. 'SENS' for 'SENS 5' and 'SENS?'). Anything else, such as a measurement or a status, is
+    # always sent to the instrument.
+    CACHED_SETTINGS = ()
+
     def __init__(self, address, connection_type, connection_manager=None):
         """
         Initializes the instrument object.
@@ -426,6 +940,15 @@ class Instrument(object):
         self._connection_type = connection_type
         self._connection_manager = connection_manager
         self._instrument = None
+        # Commands waiting to be sent at the end of a batch, or None if no batch is open
+        self._batch = None
+        # The last value of each setting written to or read from the instrument, keyed by command header, or None if
+        # the setting cache is off
+        self._cache = None
+        # The command used to query each header in the setting cache, learnt from queries made to the instrument
+        self._cache_queries = {}
+        # Whether @write decorated functions skip commands that set a cached setting to the value it already has
+        self._skip_redundant_writes = False
 
     def get_name(self):
         """
@@ -442,6 +965,7 @@ class Instrument(object):
         :param name: The name to set the device name to
         """
         self._name = name
+        self._name_connection()
 
     def read(self):
         """
@@ -449,6 +973,7 @@ class Instrument(object):
 
         :return: The string read from the instrument
         """
+        self._send_batch()
         return self._instrument.read()
 
     def read_raw(self):
@@ -457,25 +982,315 @@ class Instrument(object):
 
         :return: The raw data read from the instrument
         """
+        self._send_batch()
         return self._instrument.read()
 
+    def read_binary(self, nbytes):
+        """
+        Reads exactly nbytes bytes of binary data from the instrument, without looking for an end of line character.
+
+        :param nbytes: The number of bytes to read
+
+        :return: A bytearray containing the data read from the instrument
+        """
+        self._send_batch()
+        return self._instrument.read_binary(nbytes)
+
+    def read_next_binary(self, nbytes):
+        """
+        Reads exactly nbytes more bytes of a binary response that the instrument is already sending, without asking the
+        instrument for a new response. Only supported by GPIB instruments.
+
+        :param nbytes: The number of bytes to read
+
+        :return: A bytearray containing the data read from the instrument
+        """
+        return self._instrument.readNextBinary(nbytes)
+
+    def discard_input(self):
+        """
+        Throws away any data received from the instrument that has not been read. Only supported by GPIB instruments.
+        """
+        self._instrument.discard_input()
+
     def write(self, command):
         """
-        Writes a string to the instrument.
+        Writes a string to the instrument. Inside a batch() block the string is saved and sent when the block exits.
 
         :return: The number of bytes written
         """
+        self._cache_write(command)
+        if self._batch is not None and self.BATCH_SEPARATOR is not None:
+            self._batch.append(command)
+            return 0
         return self._instrument.write(command + '\n')
 
-    def query(self, command):
+    def query(self, command, use_cache=True):
+        """
+        Queries a string from the instrument. If the setting cache is on and holds the queried setting, the cached value
+        is returned without talking to the instrument.
+
+        :param command: The command to use to query the instrument
+
+        :param use_cache: False to always send the query to the instrument and leave the setting cache as it is
+
+        :return: The string read from the instrument
+        """
+        cached = self._cache_lookup(command) if use_cache else None
+        if cached is not None:
+            return cached
+        self._send_batch()
+        response = self._instrument.query(command + '\n')
+        if use_cache:
+            self._cache_response(command, response)
+        return response
+
+    def write_async(self, command):
+        """
+        A coroutine that writes a string to the instrument without blocking other coroutines (see the async_io module).
+
+        :param command: The command to write
         """
-        Queries a string from the instrument.
+        self._cache_write(command)
+        if self._batch is not None and self.BATCH_SEPARATOR is not None:
+            self._batch.append(command)
+            # Return something the event loop can wait on that is ready straight away
+            return async_io.sleep(0)
+        return self._instrument.write_async(command + '\n')
+
+    def query_async(self, command, use_cache=True):
+        """
+        A coroutine that queries a string from the instrument without blocking other coroutines (see the async_io
+        module).
 
         :param command: The command to use to query the instrument
 
+        :param use_cache: False to always send the query to the instrument and leave the setting cache as it is
+
         :return: The string read from the instrument
         """
-        return self._instrument.query(command + '\n')
+        cached = self._cache_lookup(command) if use_cache else None
+        if cached is not None:
+            raise Return(cached)
+        self._send_batch()
+        response = yield self._instrument.query_async(command + '\n')
+        if use_cache:
+            self._cache_response(command, response)
+        raise Return(response)
+
+    def query_many(self, commands):
+        """
+        Queries several strings from the instrument, sent joined by BATCH_SEPARATOR into as few messages as possible.
+        Instruments that do not set BATCH_SEPARATOR are queried once for each command. The setting cache is not used.
+
+        :param commands: A list of the commands to use to query the instrument
+
+        :return: A list of the strings read from the instrument, one for each command
+        """
+        if self.BATCH_SEPARATOR is None:
+            return [str(self._instrument.query(command + '\n')).strip() for command in commands]
+        self._send_batch()
+        responses = []
+        for message, count in self._join_commands(commands):
+            # Instruments either separate the responses with ';' or send each one on its own line
+            parts = _split_responses(self._instrument.query(message + '\n'))
+            while len(parts) < count:
+                more = _split_responses(self._instrument.read())
+                if len(more) == 0:
+                    raise IOError('Expected ' + str(count) + ' responses from ' + str(self.get_name()) + ' but got ' + str(len(parts)))
+                parts += more
+            responses += parts[:count]
+        return responses
+
+    def set_cache_enabled(self, enabled=True, skip_redundant_writes=False):
+        """
+        Turns the setting cache on or off. While it is on, the value of each setting in CACHED_SETTINGS written to or
+        read from the instrument is remembered, and queries for that setting are answered without talking to the
+        instrument. Measurements and status queries are never cached. The cache is cleared by any command in CACHE_INVALIDATING_COMMANDS (i.e. a reset), or by invalidate_cache(). It should
+        only be turned on while nothing else (i.e. the front panel) can change the instrument settings.
+
+        :param enabled: True to turn the cache on, False to turn it off and forget its contents
+
+        :param skip_redundant_writes: If True, @write decorated functions do not send commands that set a cached setting
+        to the value it already has
+        """
+        if enabled and self._cache is None:
+            self._cache = {}
+        elif not enabled:
+            self._cache = None
+        self._skip_redundant_writes = enabled and skip_redundant_writes
+
+    def is_cache_enabled(self):
+        """
+        Returns whether the setting cache is on.
+
+        :return: True if the setting cache is on, False otherwise
+        """
+        return self._cache is not None
+
+    def invalidate_cache(self):
+        """
+        Forgets every setting in the setting cache, so the next query of each setting goes to the instrument.
+        """
+        if self._cache is not None:
+            self._cache.clear()
+
+    def verify(self):
+        """
+        Queries the instrument for every setting in the setting cache in one batched pass, and updates the cache with the
+        values the instrument actually has.
+
+        :return: A dictionary of the settings that did not match, mapping each header to a tuple of (cached value,
+        instrument value)
+        """
+        if not self._cache:
+            return {}
+        headers = sorted(header for header in self._cache if header in self._cache_queries)
+        self._send_batch()
+        responses = self.query_many([self._cache_queries[header] for header in headers])
+        mismatches = {}
+        for header, response in zip(headers, responses):
+            cached = _to_number(self._cache[header])
+            actual = _to_number(response)
+            if cached != actual:
+                mismatches[header] = (cached, actual)
+            self._cache[header] = response
+        return mismatches
+
+    def _is_redundant_write(self, command):
+        """
+        Checks whether a command would set a cached setting to the value it already has.
+
+        :param command: The command to be written
+
+        :return: True if redundant writes are skipped and the command would not change anything, False otherwise
+        """
+        if not self._skip_redundant_writes or not self._cache:
+            return False
+        header, arguments = _split_command(command)
+        if header not in self.CACHED_SETTINGS or arguments == '' or header not in self._cache:
+            return False
+        # Compare as numbers where possible, since the cached value may be the instrument's own formatting of it
+        return _to_number(self._cache[header]) == _to_number(arguments)
+
+    def _cache_write(self, command):
+        """
+        Updates the setting cache with a command written to the instrument.
+
+        :param command: The command written
+        """
+        if self._cache is None:
+            return
+        header, arguments = _split_command(command)
+        if header in self.CACHE_INVALIDATING_COMMANDS or (header + ' ' + arguments) in self.CACHE_INVALIDATING_COMMANDS:
+            self._cache.clear()
+        elif header not in self.CACHED_SETTINGS or arguments == '':
+            # Not a setting, i.e. a query or an action such as 'TRIG'
+            return
+        else:
+            self._cache[header] = arguments
+
+    def _cache_lookup(self, command):
+        """
+        Finds the answer to a query in the setting cache.
+
+        :param command: The command used to query the instrument
+
+        :return: The cached response, or None if the query can not be answered from the cache
+        """
+        if self._cache is None:
+            return None
+        header, arguments = _split_command(command)
+        # Only queries of a whole cached setting (i.e. 'SENS?', not 'OUTP? 1' or 'SPTS?') can be answered from the cache
+        if not header.endswith('?') or arguments != '' or header[:-1] not in self.CACHED_SETTINGS:
+            return None
+        header = header[:-1]
+        self._cache_queries[header] = command
+        return self._cache.get(header)
+
+    def _cache_response(self, command, response):
+        """
+        Adds the response to a query of a setting to the setting cache.
+
+        :param command: The command used to query the instrument
+
+        :param response: The response of the instrument
+        """
+        if self._cache is None:
+            return
+        header, arguments = _split_command(command)
+        if header.endswith('?') and arguments == '' and header[:-1] in self.CACHED_SETTINGS:
+            self._cache[header[:-1]] = str(response).strip()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Used as 'with instrument.batch():'. Commands written inside the with block (i.e. by @write decorated functions)
+        are saved, and sent when the block exits joined by BATCH_SEPARATOR into as few messages as MAX_COMMAND_LENGTH
+        allows. Saved commands are sent early if the instrument is queried or read inside the block, so commands are
+        always sent in order. Instruments that do not set BATCH_SEPARATOR send every command on its own as usual.
+        """
+        if self._batch is not None:
+            # Already in a batch, which will send these commands too
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+        finally:
+            self._send_batch()
+            self._batch = None
+
+    def _send_batch(self):
+        """
+        Sends any commands saved by an open batch, joined into as few messages as possible.
+        """
+        if not self._batch:
+            return
+        commands = list(self._batch)
+        del self._batch[:]
+        for message, count in self._join_commands(commands):
+            self._instrument.write(message + '\n')
+
+    def _join_commands(self, commands):
+        """
+        Joins commands by BATCH_SEPARATOR into as few messages as MAX_COMMAND_LENGTH allows.
+
+        :param commands: A list of commands
+
+        :return: A list of tuples of (message, number of commands in the message)
+        """
+        messages = []
+        message = ''
+        count = 0
+        for command in commands:
+            if command == '':
+                continue
+            if message == '':
+                message = command
+                count = 1
+            elif self.MAX_COMMAND_LENGTH is not None and len(message) + len(self.BATCH_SEPARATOR) + len(command) > self.MAX_COMMAND_LENGTH:
+                # Adding this command would make the message too long, so finish this message and start a new one
+                messages.append((message, count))
+                message = command
+                count = 1
+            else:
+                message += self.BATCH_SEPARATOR + command
+                count += 1
+        if message != '':
+            messages.append((message, count))
+        return messages
+
+    def __getattr__(self, name):
+        """
+        Finds the coroutine variant of a @write or @query decorated function, i.e. set_sensitivity_async for
+        set_sensitivity.
+        """
+        if name.endswith('_async'):
+            coroutine = getattr(getattr(type(self), name[:-len('_async')], None), 'coroutine', None)
+            if coroutine is not None:
+                return functools.partial(coroutine, self)
+        raise AttributeError("'" + type(self).__name__ + "' object has no attribute '" + name + "'")
 
     def open(self):
         """
@@ -494,8 +1309,16 @@ class Instrument(object):
                 self._instrument = self._connection_manager.open_resource(self._address)
             if self._instrument is None:
                 return False
+            self._name_connection()
         return True
 
+    def _name_connection(self):
+        """
+        Records the connection's communication under the name of the device (see the io_metrics module).
+        """
+        if isinstance(self._instrument, (GPIBDeviceInterface, USBDevice)):
+            self._instrument.metrics_name = str(self._name)
+
     def close(self):
         """
         Closes a connection to the instrument at the specified address.
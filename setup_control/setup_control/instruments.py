@@ -1,4 +1,8 @@
-from inst_io import Instrument, write, query
+import threading
+import time
+import numpy as np
+import io_trace
+from inst_io import Instrument, write, query, uncached_query
 
 
 class HP8350B(Instrument):
@@ -181,6 +185,15 @@ class SR830(Instrument):
     The SR830 class is used to setup_control a Stanford Research Systems SR830 Lock-In Amplifier via GPIB.
     """
 
+    # Commands are separated by semicolons, and the SR830 input queue holds 256 characters
+    BATCH_SEPARATOR = ';'
+    MAX_COMMAND_LENGTH = 255
+    # Recalling settings, the auto functions, and giving the front panel back to the user can all change settings
+    CACHE_INVALIDATING_COMMANDS = ('*RST', 'RSET', 'AGAN', 'ARSV', 'APHS', 'OVRM 1')
+    # The reference frequency is left out since with an external reference it is measured rather than set
+    CACHED_SETTINGS = ('PHAS', 'FMOD', 'RSLP', 'HARM', 'SLVL', 'ISRC', 'IGND', 'ICPL', 'ILIN', 'SENS', 'RMOD', 'OFLT',
+                       'OFSL', 'SYNC', 'OUTX', 'SRAT', 'SEND', 'TSTR', 'FAST')
+
     UNIT_GHZ = 'GZ'
     UNIT_MHZ = 'MZ'
     UNIT_KHZ = 'KZ'
@@ -341,9 +354,27 @@ class SR830(Instrument):
     END_OF_BUFFER_SHOT = 0
     END_OF_BUFFER_LOOP = 1
 
+    BUFFER_SIZE = 16383
+
     TRIGGER_START_MODE_OFF = 0
     TRIGGER_START_MODE_ON = 1
 
+    FAST_MODE_OFF = 0
+    FAST_MODE_ON_DOS = 1
+    FAST_MODE_ON = 2
+
+    # Bits of the LIA status byte, see get_lia_status()
+    LIA_STATUS_INPUT_OVERLOAD = 0
+    LIA_STATUS_FILTER_OVERLOAD = 1
+    LIA_STATUS_OUTPUT_OVERLOAD = 2
+    LIA_STATUS_UNLOCK = 3
+    LIA_STATUS_RANGE_CHANGE = 4
+    LIA_STATUS_TIME_CONSTANT_CHANGE = 5
+    LIA_STATUS_TRIGGER = 6
+
+    # The full scale sensitivity (in nV) of SENSITIVITY_? constants repeat as 2, 5, 10 times a power of 10
+    _SENSITIVITY_MANTISSAS = (2, 5, 10)
+
     _SNAP_VALUES_MAP = dict(X=1, Y=2, R=3, THETA=4, AUX1=5, AUX2=6, AUX3=7, AUX4=8, REF_FREQ=9, CH1=10, CH2=11)
 
     _CHANNEL1 = 1
@@ -638,11 +669,11 @@ class SR830(Instrument):
         Returns a tuple of the channel 1 display and ratio, see the DISPLAY_CHANNEL1 and DISPLAY_CHANNEL1_RATIO
         constants.
         """
-        print("Querying to " + self.get_name() + " --> DDEF? 1")
+        start = time.time()
         response = self.query('DDEF? 1')
         if response.rfind('\n') != -1:
             response = response[:response.rfind('\n')]
-        print("Received from " + self.get_name() + " <-- " + response)
+        io_trace.record(self, io_trace.KIND_QUERY, 'DDEF? 1', response, start)
         parameter = int(response[:1])
         ratio = int(response[2:])
         return parameter, ratio
@@ -664,11 +695,11 @@ class SR830(Instrument):
         Returns a tuple of the channel 2 display and ratio, see the DISPLAY_CHANNEL2 and DISPLAY_CHANNEL2_RATIO
         constants.
         """
-        print("Querying to " + self.get_name() + " --> DDEF? 2")
+        start = time.time()
         response = self.query('DDEF? 2')
         if response.rfind('\n') != -1:
             response = response[:response.rfind('\n')]
-        print("Received from " + self.get_name() + " <-- " + response)
+        io_trace.record(self, io_trace.KIND_QUERY, 'DDEF? 2', response, start)
         parameter = int(response[:1])
         ratio = int(response[2:])
         return parameter, ratio
@@ -720,11 +751,11 @@ class SR830(Instrument):
 
         :param parameter: The parameter to set the offset of (see _PARAMETER_? constants)
         """
-        print("Querying to " + self.get_name() + " --> OEXP? " + str(parameter))
+        start = time.time()
         response = self.query('OEXP? ' + str(parameter))
         if response.rfind('\n') != -1:
             response = response[:response.rfind('\n')]
-        print("Received from " + self.get_name() + " <-- " + response)
+        io_trace.record(self, io_trace.KIND_QUERY, 'OEXP? ' + str(parameter), response, start)
         offset = float(response[:1])
         expand = int(response[2:])
         return offset, expand
@@ -897,7 +928,7 @@ class SR830(Instrument):
         index = int(index)
         if 1 <= index <= 9:
             # noinspection SpellCheckingInspection
-            return 'SSET ' + str(index)
+            return 'RSET ' + str(index)
         return ''
 
     @write
@@ -932,6 +963,19 @@ class SR830(Instrument):
         # noinspection SpellCheckingInspection
         return 'APHS'
 
+    @query
+    def get_lia_status(self, bit=None):
+        """
+        Returns the LIA status byte, or one bit of it if bit is given. The bits are latched, they stay set from the
+        moment their condition occurs until the status is read. See the LIA_STATUS_?* constants.
+
+        :param bit: The bit to return, a LIA_STATUS_?* constant, or None to return the whole byte
+        """
+        # noinspection SpellCheckingInspection
+        if bit is None:
+            return 'LIAS?'
+        return 'LIAS? ' + str(bit)
+
     @query
     def get_sample_rate(self):
         """
@@ -1047,6 +1091,59 @@ class SR830(Instrument):
         """
         return 'REST'
 
+    @query
+    def get_fast_mode(self):
+        """
+        Returns the fast data transfer mode, either FAST_MODE_OFF, FAST_MODE_ON_DOS, or FAST_MODE_ON. While fast mode is
+        on and a scan is running, the values of X and Y (or channel 1 and channel 2 if they do not display X and Y) are
+        sent over GPIB every sample period.
+        """
+        return 'FAST?'
+
+    @write
+    def set_fast_mode(self, mode=FAST_MODE_OFF):
+        """
+        Sets the fast data transfer mode using FAST_MODE_OFF, FAST_MODE_ON_DOS, or FAST_MODE_ON. FAST_MODE_ON_DOS is for
+        programs that can not use GPIB DMA transfers, FAST_MODE_ON should be used otherwise.
+
+        :param mode: Either FAST_MODE_OFF, FAST_MODE_ON_DOS, or FAST_MODE_ON
+        """
+        return 'FAST ' + str(mode)
+
+    @write
+    def start_scan_delayed(self):
+        """
+        Starts a scan after a delay of 0.5 seconds, giving the controller time to start listening for fast mode data.
+        """
+        # noinspection SpellCheckingInspection
+        return 'STRD'
+
+    def stream(self, capacity=65536, chunk_size=None):
+        """
+        Streams X and Y continuously using fast data transfer mode at the current sample rate. Samples are read into a
+        ring buffer in the background, and can be consumed by iterating over the returned SR830FastStream. No other
+        instrument on the same GPIB controller may be used until the stream is closed.
+
+        :param capacity: The number of samples the ring buffer can hold before unread samples are dropped
+
+        :param chunk_size: The number of samples to read from the controller at once. Defaults to about a tenth of a
+        second of samples.
+
+        :return: An SR830FastStream
+        """
+        sensitivity = self.get_sensitivity()
+        full_scale = self._SENSITIVITY_MANTISSAS[sensitivity % 3] * (10 ** (sensitivity // 3)) * 1e-9
+        rate = self.get_sample_rate()
+        sample_rate = None
+        if rate != self.SAMPLE_RATE_TRIGGER:
+            sample_rate = 0.0625 * (2 ** rate)
+        if chunk_size is None:
+            chunk_size = max(1, int((sample_rate or 10) / 10))
+        self.reset_scan()
+        self.set_fast_mode(self.FAST_MODE_ON)
+        self.start_scan_delayed()
+        return SR830FastStream(self, full_scale, sample_rate, capacity, chunk_size)
+
     @query
     def _get_output(self, parameter):
         """
@@ -1107,11 +1204,11 @@ class SR830(Instrument):
         for val in values:  # Add the integer associated with each value to the snaps string using the _SNAP_VALUES_MAP
             snaps += str(self._SNAP_VALUES_MAP.get(val)) + ','
         snaps = snaps[:len(snaps) - 1]  # Remove the trailing comma from the snaps string
-        print("Querying to " + self.get_name() + " --> SNAP? " + snaps)
+        start = time.time()
         response = str(self.query('SNAP? ' + snaps))  # Query the command and save the response as string response
         if response.rfind('\n') != -1:
             response = response[:response.rfind('\n')]  # Remove any newline f
-        print("Received from " + self.get_name() + " <-- " + response)
+        io_trace.record(self, io_trace.KIND_QUERY, 'SNAP? ' + snaps, response, start)
         measurements = response.split(',')  # Split the string response into a list using ',' as delimiters
         to_return = {}
         for i in range(len(measurements)):
@@ -1125,60 +1222,81 @@ class SR830(Instrument):
             to_return[values[i]] = measurement
         return to_return
 
-    @query
+    @uncached_query
     def get_scanned_data_length(self):
         """
-        Returns the number of data points in the buffer.
+        Returns the number of data points in the buffer. This is always queried from the lock-in, even with the setting
+        cache on, since the buffer fills without anything being set.
         """
         # noinspection SpellCheckingInspection
         return 'SPTS?'
 
     def get_channel1_scanned_data(self, start_bin=0, bins_to_return=0):
         """
-        Returns a list of data stored in the channel1 data buffer. This data is whatever has been selected by the
+        Returns a numpy array of data stored in the channel1 data buffer. This data is whatever has been selected by the
         set_channel1_output() function (see also the set_channel1_display() function).
 
         :param start_bin: The bin in the data buffer to start returning.
 
         :param bins_to_return: The number of bins to return. If start_bin + bins_to_return is greater than the total
-        number of bins than an error occurs.
+        number of bins than an error occurs. If it is 0 an empty array is returned without querying the lock-in.
         """
         return self._get_scanned_data(self._CHANNEL1, start_bin, bins_to_return)
 
     def get_channel2_scanned_data(self, start_bin=0, bins_to_return=0):
         """
-        Returns a list of data stored in the channel2 data buffer. This data is whatever has been selected by the
+        Returns a numpy array of data stored in the channel2 data buffer. This data is whatever has been selected by the
         set_channel2_output() function (see also the set_channel2_display() function).
 
         :param start_bin: The bin in the data buffer to start returning.
 
         :param bins_to_return: The number of bins to return. If start_bin + bins_to_return is greater than the total
-        number of bins than an error occurs.
+        number of bins than an error occurs. If it is 0 an empty array is returned without querying the lock-in.
         """
         return self._get_scanned_data(self._CHANNEL2, start_bin, bins_to_return)
 
     def _get_scanned_data(self, channel, start_bin=0, bins_to_return=0):
         """
-        Returns a list of data stored in a channel data buffer.
+        Returns a numpy array of data stored in a channel data buffer.
 
         :param start_bin: The bin in the data buffer to start returning.
 
         :param bins_to_return: The number of bins to return. If start_bin + bins_to_return is greater than the total
-        number of bins than an error occurs.
+        number of bins than an error occurs. If it is 0 an empty array is returned without querying the lock-in, as the
+        lock-in would still send a response that read_binary(0) leaves unread. A ValueError is raised if it is negative.
         """
-        # noinspection SpellCheckingInspection
-        print('Querying to ' + self.get_name() + ' --> TRCL? ' + str(channel) + ',' + str(start_bin) + ',' + str(
-            bins_to_return))
+        if bins_to_return < 0:
+            raise ValueError('The number of bins to return must not be negative, not ' + str(bins_to_return))
+        if bins_to_return == 0:
+            return np.zeros(0)
         # Write the command
         # noinspection SpellCheckingInspection
-        self.write('TRCL? ' + str(channel) + ',' + str(start_bin) + ',' + str(bins_to_return))
-        # Read the raw response to the command
-        raw_response = self.read_raw()
-        print("Received from " + self.get_name() + " <-- " + raw_response)
-        # Convert the raw_response into a string of 0s and 1s
-        bit_string = self._raw_to_bit_string(raw_response)
-        # Convert the string of 0s and 1s into a list of numbers and return
-        return self._bit_string_to_num_list(bit_string)
+        command = 'TRCL? ' + str(channel) + ',' + str(start_bin) + ',' + str(bins_to_return)
+        start = time.time()
+        self.write(command)
+        # Read the raw response to the command, each bin is encoded using 4 bytes. Only its length is recorded.
+        raw_response = self.read_binary(4 * bins_to_return)
+        io_trace.record(self, io_trace.KIND_QUERY, command, str(len(raw_response)) + ' bytes', start)
+        # Convert the raw_response into an array of numbers and return
+        return self._raw_to_num_array(raw_response)
+
+    # The encoding of each bin in a TRCL? response, see page 5-17 of the SR830 Lock-In Amplifier manual
+    _TRCL_BIN_DTYPE = np.dtype([('mantissa', '<i2'), ('exponent', 'u1'), ('pad', 'u1')])
+
+    def _raw_to_num_array(self, raw):
+        """
+        This function takes the raw bytes of a TRCL? response and converts every 4 byte bin at once into the number it
+        represents, using the encoding specified on page 5-17 of the SR830 Lock-In Amplifier manual. Each bin is a 16-bit
+        little endian two's compliment mantissa, an 8-bit exponent, and an unused byte, and represents the value
+        mantissa * 2^(exponent - 124).
+
+        :param raw: The raw bytes to convert. Any trailing bytes that do not make up a full bin are ignored.
+
+        :return: A numpy array of floats containing the number represented by each bin.
+        """
+        raw = bytearray(raw)
+        bins = np.frombuffer(raw, dtype=self._TRCL_BIN_DTYPE, count=len(raw) // self._TRCL_BIN_DTYPE.itemsize)
+        return np.ldexp(bins['mantissa'].astype(np.float64), bins['exponent'].astype(np.int32) - 124)
 
     def _raw_to_bit_string(self, raw):
         """
@@ -1316,12 +1434,153 @@ class SR830(Instrument):
             return reference_frequency
 
 
+class SR830FastStream(object):
+    """
+    A stream of X and Y samples sent by an SR830 in fast data transfer mode, see SR830.stream(). A background thread
+    reads samples into a ring buffer. Iterating over the stream yields numpy arrays of the samples that have arrived
+    since the last iteration, with fields 'time' (in seconds since the epoch), 'x' and 'y' (in volts). Iteration ends
+    once the stream is closed and every buffered sample has been yielded.
+    """
+
+    # Each sample is X and Y as 16-bit signed integers, where +/-30000 is +/- full scale
+    _SAMPLE_DTYPE = np.dtype([('x', '<i2'), ('y', '<i2')])
+    _FULL_SCALE_COUNTS = 30000.0
+
+    def __init__(self, lock_in, full_scale, sample_rate, capacity, chunk_size):
+        """
+        Starts reading samples. The scan should already have been started with a delayed start.
+
+        :param lock_in: The SR830 sending samples
+
+        :param full_scale: The full scale sensitivity in volts
+
+        :param sample_rate: The sample rate in Hz, or None if samples are triggered (in which case samples are
+        timestamped when they arrive)
+
+        :param capacity: The number of samples the ring buffer can hold
+
+        :param chunk_size: The number of samples to read from the controller at once
+        """
+        self._lock_in = lock_in
+        self._scale = full_scale / self._FULL_SCALE_COUNTS
+        self._sample_rate = sample_rate
+        self._chunk_size = chunk_size
+        self._ring = np.zeros(capacity, dtype=[('time', np.float64), ('x', np.float64), ('y', np.float64)])
+        # The number of samples written to and read from the ring buffer since the stream started
+        self._written = 0
+        self._read = 0
+        # The number of samples overwritten in the ring buffer before they were read
+        self.dropped = 0
+        # The time of the first sample, a scan started by STRD starts after 0.5 seconds
+        self.start_time = time.time() + 0.5
+        self._data_ready = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._read_samples)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def received(self):
+        """
+        The number of samples received from the lock-in.
+        """
+        return self._written
+
+    @property
+    def behind(self):
+        """
+        The number of samples the lock-in should have sent by now (based on the sample rate) that have not been received.
+        A value that keeps growing means the controller can not keep up and the lock-in is dropping samples.
+        """
+        if self._sample_rate is None:
+            return 0
+        return max(0, int((time.time() - self.start_time) * self._sample_rate) - self._written)
+
+    def _read_samples(self):
+        """
+        Reads samples from the lock-in into the ring buffer until the stream is closed.
+        """
+        leftover = bytearray()
+        chunk_bytes = self._chunk_size * self._SAMPLE_DTYPE.itemsize
+        # The first read asks the controller to start listening, later reads continue the same transfer
+        restart = True
+        while not self._closed:
+            if restart:
+                raw = self._lock_in.read_binary(chunk_bytes)
+            else:
+                raw = self._lock_in.read_next_binary(chunk_bytes)
+            # If the read timed out the controller stopped listening and has to be asked again
+            restart = len(raw) < chunk_bytes
+            raw = leftover + raw
+            usable = len(raw) - len(raw) % self._SAMPLE_DTYPE.itemsize
+            leftover = raw[usable:]
+            if usable > 0:
+                self._store(np.frombuffer(raw[:usable], dtype=self._SAMPLE_DTYPE))
+
+    def _store(self, samples):
+        """
+        Scales and timestamps samples and writes them into the ring buffer.
+
+        :param samples: A numpy array of raw samples
+        """
+        n = len(samples)
+        if self._sample_rate is None:
+            times = np.repeat(time.time(), n)
+        else:
+            times = self.start_time + (self._written + np.arange(n)) / self._sample_rate
+        capacity = len(self._ring)
+        with self._data_ready:
+            indices = (self._written + np.arange(n)) % capacity
+            self._ring['time'][indices] = times
+            self._ring['x'][indices] = samples['x'] * self._scale
+            self._ring['y'][indices] = samples['y'] * self._scale
+            self._written += n
+            # Move the read position past any samples that were overwritten before being read
+            if self._written - self._read > capacity:
+                self.dropped += self._written - self._read - capacity
+                self._read = self._written - capacity
+            self._data_ready.notify_all()
+
+    def __iter__(self):
+        while True:
+            with self._data_ready:
+                while self._read == self._written and not self._closed:
+                    self._data_ready.wait(0.5)
+                if self._read == self._written:
+                    return
+                indices = np.arange(self._read, self._written) % len(self._ring)
+                samples = self._ring[indices]
+                self._read = self._written
+            yield samples
+
+    def close(self):
+        """
+        Stops the stream, turns fast mode off, and pauses the scan. Samples that have already been received can still be
+        iterated over.
+        """
+        with self._data_ready:
+            if self._closed:
+                return
+            self._closed = True
+            self._data_ready.notify_all()
+        self._thread.join()
+        self._lock_in.set_fast_mode(SR830.FAST_MODE_OFF)
+        self._lock_in.pause_scan()
+        self._lock_in.discard_input()
+
+
 class Agilent33220A(Instrument):
     # noinspection SpellCheckingInspection
     """
     The Agilent33220A class is used to setup_control a Agilent 33220A function generator via GPIB.
     """
 
+    # SCPI commands are separated by semicolons, and the colon returns each command to the root of the command tree
+    BATCH_SEPARATOR = ';:'
+    # The amplitude is left out since it is set through VOLT:HIGH and VOLT:LOW, so a cached VOLT would go stale
+    CACHED_SETTINGS = ('FUNC', 'FREQ', 'UNIT', 'OUTP', 'FREQ:STAR', 'FREQ:STOP', 'SWE:TIME', 'SWE:SPAC', 'SWE:STAT',
+                       'TRIG:SOUR')
+
     WAVE_TYPE_SINE = 'SIN'
     WAVE_TYPE_SQUARE = 'SQU'
     WAVE_TYPE_RAMP = 'RAMP'
@@ -1532,6 +1791,9 @@ class AgilentE3631A(Instrument):
     The AgilentE3631A class is used to setup_control a Agilent E3631A DC power source via GPIB.
     """
 
+    BATCH_SEPARATOR = ';:'
+    CACHED_SETTINGS = ('OUTP:STAT',)
+
     STATE_OFF = 0
     STATE_ON = 1
 
@@ -1575,6 +1837,8 @@ class AgilentE3633A(Instrument):
     The AgilentE3633A class is used to setup_control a Agilent E3633A DC power source via GPIB.
     """
 
+    BATCH_SEPARATOR = ';:'
+
     @write
     def set_voltage(self, voltage=8):
         """
@@ -1602,6 +1866,9 @@ class PasternackPE11S390(Instrument):
     The PasternackPE11S390 class is used to setup_control a Pasternack PE11S390 series frequency synthesizers via USB.
     """
 
+    # The frequency is read back with FREQ:RETACT, the frequency the synthesizer actually reached, which is never cached
+    CACHED_SETTINGS = ('POWE:RF', 'FREQ:REF:EXT', 'POWE:SET')
+
     OUTPUT_STATE_OFF = 0
     OUTPUT_STATE_ON = 1
 
@@ -1680,6 +1947,8 @@ class Agilent34401A(Instrument):
     The Agilent34401A class is used to setup_control a Agilent 34401A series multimeter via GPIB.
     """
 
+    BATCH_SEPARATOR = ';:'
+
     @query
     def get_dc_voltage_measurement(self):
         """
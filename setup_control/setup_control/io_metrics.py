@@ -0,0 +1,214 @@
+"""
+The io_metrics module counts what the connections to the instruments spend their time on. The GPIBDeviceInterface and
+USBDevice classes in the inst_io module record every command they send, keyed by instrument and by command mnemonic
+(the command header, i.e. 'SENS?' for 'SENS?' and 'TRCL?' for 'TRCL? 1,0,100'): how many commands were sent and
+responses read, bytes in and out, a histogram of latencies, timeouts, and time spent waiting for the Prologix hardware
+lock. The time each controller (i.e. a Prologix) spends busy is also kept, giving its bus utilization. Use snapshot() to
+see the numbers, or start_dump() to append them to a JSON-lines file every few seconds during a run.
+"""
+
+import json
+import threading
+import time
+
+# The upper edge of each latency histogram bucket in seconds, there is one more bucket for anything slower
+LATENCY_BUCKETS = (0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0, 3.0)
+
+
+class _CommandStats(object):
+    """
+    The counts for one command mnemonic sent to one instrument.
+    """
+
+    __slots__ = ('count', 'reads', 'bytes_out', 'bytes_in', 'timeouts', 'total_time', 'max_time', 'lock_wait',
+                 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.reads = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.timeouts = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.lock_wait = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self):
+        """
+        Returns the counts as a dictionary that can be saved as JSON.
+        """
+        observations = sum(self.histogram)
+        return dict(count=self.count, reads=self.reads, bytes_out=self.bytes_out, bytes_in=self.bytes_in,
+                    timeouts=self.timeouts, total_time=self.total_time, max_time=self.max_time,
+                    mean_time=self.total_time / observations if observations else 0.0, lock_wait=self.lock_wait,
+                    histogram=list(self.histogram))
+
+
+# Guards the counts below, which are updated from any thread talking to an instrument
+_lock = threading.Lock()
+# The counts for each (instrument, mnemonic) pair
+_stats = {}
+# The time each controller has spent busy, keyed by controller name
+_bus_busy = {}
+# The time the counts were last reset
+_since = time.time()
+# Whether anything is recorded
+_enabled = True
+
+# The thread started by start_dump(), and the event used to stop it
+_dump_thread = None
+_dump_stop = None
+
+
+def mnemonic(command):
+    """
+    Returns the mnemonic of a command, its header without arguments, i.e. 'TRCL?' for 'TRCL? 1,0,100'. The mnemonic of
+    several commands sent in one message is that of the first.
+
+    :param command: The command
+
+    :return: The mnemonic as an upper case string
+    """
+    command = command.strip()
+    end = len(command)
+    for separator in (' ', ';'):
+        index = command.find(separator)
+        if index != -1 and index < end:
+            end = index
+    return command[:end].upper()
+
+
+def record(instrument, command, duration, bytes_out=0, bytes_in=0, lock_wait=0.0, timed_out=False, is_read=False,
+           bus=None):
+    """
+    Records one command sent to, or one response read from, an instrument.
+
+    :param instrument: The name of the instrument
+
+    :param command: The command sent, or for a read the command the response belongs to
+
+    :param duration: The number of seconds the command or read took, not counting waiting for the hardware lock
+
+    :param bytes_out: The number of bytes sent
+
+    :param bytes_in: The number of bytes read
+
+    :param lock_wait: The number of seconds spent waiting for the hardware lock
+
+    :param timed_out: True if a read timed out
+
+    :param is_read: True if this is a read of a response to an earlier command rather than a new command
+
+    :param bus: The name of the controller the instrument is connected through, or None if it has its own connection
+    """
+    if not _enabled:
+        return
+    # Find the histogram bucket before taking the lock
+    bucket = 0
+    while bucket < len(LATENCY_BUCKETS) and duration > LATENCY_BUCKETS[bucket]:
+        bucket += 1
+    key = (str(instrument), mnemonic(command) if command else '')
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = _CommandStats()
+        if is_read:
+            stats.reads += 1
+        else:
+            stats.count += 1
+        stats.bytes_out += bytes_out
+        stats.bytes_in += bytes_in
+        stats.total_time += duration
+        if duration > stats.max_time:
+            stats.max_time = duration
+        stats.lock_wait += lock_wait
+        stats.histogram[bucket] += 1
+        if timed_out:
+            stats.timeouts += 1
+        if bus is not None:
+            _bus_busy[bus] = _bus_busy.get(bus, 0.0) + duration
+
+
+def snapshot():
+    """
+    Returns the counts recorded since the last reset.
+
+    :return: A dictionary with 'time' (the time.time() of the snapshot), 'elapsed' (the seconds since the last reset),
+    'latency_buckets' (the upper edges of the histogram buckets), 'instruments' (a dictionary mapping each instrument
+    name to a dictionary mapping each mnemonic to its counts), and 'buses' (a dictionary mapping each controller name to
+    its busy time and utilization, the fraction of the elapsed time it was busy)
+    """
+    with _lock:
+        now = time.time()
+        elapsed = now - _since
+        instruments = {}
+        for (instrument, command), stats in _stats.items():
+            instruments.setdefault(instrument, {})[command] = stats.as_dict()
+        buses = {}
+        for bus, busy in _bus_busy.items():
+            buses[bus] = dict(busy=busy, utilization=busy / elapsed if elapsed > 0 else 0.0)
+    return dict(time=now, elapsed=elapsed, latency_buckets=list(LATENCY_BUCKETS), instruments=instruments, buses=buses)
+
+
+def reset():
+    """
+    Forgets all counts.
+    """
+    global _since
+    with _lock:
+        _stats.clear()
+        _bus_busy.clear()
+        _since = time.time()
+
+
+def set_enabled(enabled=True):
+    """
+    Turns recording on or off. Recording is on by default, and costs a few microseconds per command (a fraction of a
+    microsecond when off), small next to the millisecond or more each GPIB transaction takes.
+
+    :param enabled: True to record, False to not
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def start_dump(path, interval=10.0):
+    """
+    Starts appending a snapshot() to a JSON-lines file (one JSON object per line) every interval seconds, from a
+    background thread, until stop_dump() is called. A final snapshot is written when the dump stops.
+
+    :param path: The path of the file to append to
+
+    :param interval: The number of seconds between snapshots
+    """
+    global _dump_thread, _dump_stop
+    stop_dump()
+    _dump_stop = threading.Event()
+    _dump_thread = threading.Thread(target=_dump, args=(path, interval, _dump_stop))
+    _dump_thread.daemon = True
+    _dump_thread.start()
+
+
+def stop_dump():
+    """
+    Stops the dump started by start_dump(), after writing one last snapshot.
+    """
+    global _dump_thread, _dump_stop
+    if _dump_thread is not None:
+        _dump_stop.set()
+        _dump_thread.join()
+        _dump_thread = None
+        _dump_stop = None
+
+
+def _dump(path, interval, stop):
+    """
+    Appends a snapshot to the file every interval seconds until stop is set, run by the thread from start_dump().
+    """
+    while True:
+        stop.wait(interval)
+        with open(path, 'a') as dump_file:
+            dump_file.write(json.dumps(snapshot(), sort_keys=True) + '\n')
+        if stop.is_set():
+            return
@@ -0,0 +1,179 @@
+"""
+The settling module works out how long to wait after changing something before the lock-in output can be trusted. The
+SR830 low pass filter is a chain of identical RC stages, one for every 6 dB/oct of slope, so after a step its output
+reaches the new value following the step response of that chain. The fraction of the step still to come after a time t
+is
+
+    exp(-t/tau) * sum(k = 0 .. n-1) (t/tau)^k / k!
+
+for n stages with time constant tau. Steeper slopes reject more noise but take more time constants to settle, i.e. to
+settle within 1% takes about 4.6 time constants at 6 dB/oct but 10 at 24 dB/oct. The functions here find the shortest
+wait that reaches a given accuracy, and wait_until_converged() can stop even earlier by watching the output settle.
+The functions that read the lock-in settings go through experiment_wrapper, which is imported when they are first called
+rather than with this module, as experiment_wrapper imports this module.
+"""
+
+import math
+import time
+
+# The default fraction of a step that may remain when the output is considered settled
+DEFAULT_ACCURACY = 0.01
+
+
+def remaining_fraction(time_constants, slope):
+    """
+    Returns the fraction of a step still to come through the low pass filter after a time.
+
+    :param time_constants: The time since the step in units of the time constant
+
+    :param slope: The low pass filter slope in dB per octave (6, 12, 18, or 24)
+
+    :return: The fraction of the step remaining, from 1 at the step to 0 when settled
+    """
+    x = float(time_constants)
+    if x <= 0:
+        return 1.0
+    term = 1.0
+    total = 1.0
+    for k in range(1, _stages(slope)):
+        term *= x / k
+        total += term
+    return math.exp(-x) * total
+
+
+def settling_time_constants(slope, accuracy=DEFAULT_ACCURACY):
+    """
+    Returns the number of time constants the low pass filter takes to settle after a step.
+
+    :param slope: The low pass filter slope in dB per octave (6, 12, 18, or 24)
+
+    :param accuracy: The fraction of the step that may remain, i.e. 0.01 to settle within 1%
+
+    :return: The number of time constants to wait
+    """
+    if not 0 < accuracy < 1:
+        raise ValueError('The accuracy must be between 0 and 1, not ' + str(accuracy))
+    # The remaining fraction falls monotonically, so bisect between a wait that is too short and one that is long enough
+    low = 0.0
+    high = 1.0
+    while remaining_fraction(high, slope) > accuracy:
+        low = high
+        high *= 2
+    while high - low > 1e-4:
+        middle = (low + high) / 2
+        if remaining_fraction(middle, slope) > accuracy:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+def settling_time(time_constant, slope, accuracy=DEFAULT_ACCURACY):
+    """
+    Returns the time the low pass filter takes to settle after a step.
+
+    :param time_constant: The time constant in ms
+
+    :param slope: The low pass filter slope in dB per octave (6, 12, 18, or 24)
+
+    :param accuracy: The fraction of the step that may remain, i.e. 0.01 to settle within 1%
+
+    :return: The time to wait in seconds
+    """
+    return settling_time_constants(slope, accuracy) * time_constant / 1000.0
+
+
+def lock_in_settling_time(accuracy=DEFAULT_ACCURACY):
+    """
+    Returns the time the lock-in takes to settle after a step with its current time constant and slope. These are
+    queried through experiment_wrapper, so turn on its setting cache (see experiment_wrapper.set_setting_cache_enabled)
+    to avoid querying the lock-in every point.
+
+    :param accuracy: The fraction of the step that may remain, i.e. 0.01 to settle within 1%
+
+    :return: The time to wait in seconds
+    """
+    wrapper = _experiment_wrapper()
+    return settling_time(wrapper.get_time_constant(), wrapper.get_low_pass_slope(), accuracy)
+
+
+def wait_for_settling(accuracy=DEFAULT_ACCURACY, extra_time=0.0):
+    """
+    Sleeps until the lock-in has settled after a step, see lock_in_settling_time().
+
+    :param accuracy: The fraction of the step that may remain, i.e. 0.01 to settle within 1%
+
+    :param extra_time: Time in seconds to wait on top of the settling time, i.e. for the lock-in to lock onto the
+    reference again
+
+    :return: The time waited in seconds
+    """
+    wait = lock_in_settling_time(accuracy) + extra_time
+    time.sleep(wait)
+    return wait
+
+
+def wait_until_converged(tolerance=None, accuracy=DEFAULT_ACCURACY, extra_time=0.0, agreements=2):
+    """
+    Waits for the lock-in to settle after a step by watching its output, stopping early once successive readings of X
+    and Y (taken one time constant apart) agree within tolerance. This is never longer than wait_for_settling() with the
+    same accuracy. Readings are only compared once the filter has had time to start responding (one time constant per
+    6 dB/oct of slope), since the output of a steep filter barely moves at first.
+
+    :param tolerance: The largest change in X or Y between readings, in volts, that counts as agreeing. By default this
+    is accuracy times the full scale of the current sensitivity.
+
+    :param accuracy: The accuracy used for the longest wait and the default tolerance, see settling_time_constants()
+
+    :param extra_time: Time in seconds to wait before starting, i.e. for the lock-in to lock onto the reference again
+
+    :param agreements: The number of agreeing readings in a row needed to stop
+
+    :return: A tuple of the form (time waited in seconds, (x, y)) holding the last reading
+    """
+    wrapper = _experiment_wrapper()
+    start = time.time()
+    time.sleep(extra_time)
+    time_constant = wrapper.get_time_constant() / 1000.0
+    slope = wrapper.get_low_pass_slope()
+    if tolerance is None:
+        tolerance = accuracy * wrapper.get_sensitivity() / 1000.0
+    deadline = start + extra_time + settling_time_constants(slope, accuracy) * time_constant
+    # Let the filter start responding before comparing readings
+    time.sleep(min(_stages(slope) * time_constant, max(deadline - time.time(), 0.0)))
+    last = wrapper.snap_data()
+    agreed = 0
+    while agreed < agreements and time.time() < deadline:
+        time.sleep(min(time_constant, max(deadline - time.time(), 0.0)))
+        reading = wrapper.snap_data()
+        if _agree(reading, last, tolerance):
+            agreed += 1
+        else:
+            agreed = 0
+        last = reading
+    return time.time() - start, last
+
+
+def _experiment_wrapper():
+    """
+    Returns the experiment_wrapper module, importing it the first time it is needed.
+    """
+    import experiment_wrapper
+    return experiment_wrapper
+
+
+def _stages(slope):
+    """
+    Returns the number of RC stages in a low pass filter with the given slope in dB per octave.
+    """
+    return max(1, int(round(slope / 6.0)))
+
+
+def _agree(reading, last, tolerance):
+    """
+    Checks whether two (x, y) readings agree within tolerance. Readings that failed (i.e. are '') never agree.
+    """
+    try:
+        return all(abs(float(a) - float(b)) <= tolerance for a, b in zip(reading, last))
+    except (TypeError, ValueError):
+        return False
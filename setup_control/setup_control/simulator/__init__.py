@@ -0,0 +1,119 @@
+"""
+The simulator package simulates the setup, so that scripts can be run (and timed) without any instruments connected. It
+has two parts. The prologix module serves a simulated Prologix GPIB-USB controller on a pseudo-terminal, and the models
+module contains simulated versions of the instruments in the instruments module.
+
+Setting the environment variable SETUP_CONTROL_SIMULATOR (i.e. running 'SETUP_CONTROL_SIMULATOR=1 python script.py')
+makes experiment_wrapper.initialize() connect to the simulated setup instead of the real one, so experiment scripts can
+be run without any changes. To change the latency or noise of the simulated instruments, call start() with the wanted
+settings before initialize() is called.
+"""
+
+import cmath
+import math
+
+from .models import SimulatedSR830, SimulatedAgilent33220A, SimulatedAgilent34401A, SimulatedPasternackPE11S390, \
+    SimulatedHP8350B, SimulatedUSBDevice
+from .prologix import SimulatedPrologix
+
+
+class SimulatedSetup(object):
+    """
+    The simulated setup. The lock-in (at GPIB address 8), function generator (10), sweep oscillator (19) and multimeter
+    (28) are on the bus of a simulated Prologix, and the frequency synthesizer is a simulated USB device. By default the
+    lock-in sees a signal whenever both the synthesizer and the chopper are on, with a transmission that varies with the
+    synthesizer frequency. The SWEEP OUT voltage of the sweep oscillator is connected to the lock-in's Aux inputs 1 and 3
+    (see experiment_wrapper.continuous_sweep).
+    """
+
+    FREQ_SYNTH_ADDRESS = '/dev/usbtmc0'
+
+    SWEEP_OSC_ADDRESS = 19
+
+    def __init__(self, latency=0.0, noise=0.0, bytes_per_second=None, seed=None):
+        """
+        Creates the simulated instruments and starts the simulated Prologix.
+
+        :param latency: The number of seconds each instrument takes to respond to a read
+
+        :param noise: The standard deviation of the noise added to lock-in measurements in volts
+
+        :param bytes_per_second: The speed of GPIB transfers to the computer, or None for no limit
+
+        :param seed: The seed of the random number generators used to make noise, or None for random seeds
+        """
+        self.lock_in = SimulatedSR830(signal=self.signal, latency=latency, noise=noise, seed=seed)
+        self.func_gen = SimulatedAgilent33220A(latency=latency, seed=seed)
+        self.multimeter = SimulatedAgilent34401A(latency=latency, noise=noise, seed=seed)
+        self.freq_synth = SimulatedPasternackPE11S390(latency=latency, seed=seed)
+        self.sweep_osc = SimulatedHP8350B(latency=latency, seed=seed)
+        self.lock_in.aux_inputs[0] = self.lock_in.aux_inputs[2] = self.sweep_osc.sweep_voltage
+        self.prologix = SimulatedPrologix({8: self.lock_in, 10: self.func_gen, self.SWEEP_OSC_ADDRESS: self.sweep_osc,
+                                           28: self.multimeter}, bytes_per_second)
+        self.port = self.prologix.port
+
+    def signal(self, t):
+        """
+        Returns the complex signal at the lock-in input in volts.
+
+        :param t: The time in seconds since the epoch
+        """
+        if not (self.freq_synth.output_on() and self.func_gen.output_on()):
+            return 0j
+        freq = self.freq_synth.get_float('FREQ:SET')
+        power = self.freq_synth.get_float('POWE:SET')
+        # A standing wave pattern across frequency, scaled with the synthesizer power
+        amplitude = 1e-3 * 10 ** ((power - 15.0) / 20.0) * (0.6 + 0.4 * math.cos(2 * math.pi * freq / 0.7))
+        return cmath.rect(amplitude, freq)
+
+    def open_resource(self, address):
+        """
+        Opens a simulated USB device, used as the connection manager of the frequency synthesizer.
+
+        :param address: The address of the device
+
+        :return: A SimulatedUSBDevice
+        """
+        if address != self.FREQ_SYNTH_ADDRESS:
+            return None
+        return SimulatedUSBDevice(self.freq_synth)
+
+    def close(self):
+        """
+        Stops the simulated Prologix.
+        """
+        self.prologix.close()
+
+
+_setup = None
+
+
+def start(latency=0.0, noise=0.0, bytes_per_second=None, seed=None):
+    """
+    Starts the simulated setup if it is not already running, and returns it. The settings are ignored if the setup is
+    already running.
+
+    :param latency: The number of seconds each instrument takes to respond to a read
+
+    :param noise: The standard deviation of the noise added to lock-in measurements in volts
+
+    :param bytes_per_second: The speed of GPIB transfers to the computer, or None for no limit
+
+    :param seed: The seed of the random number generators used to make noise, or None for random seeds
+
+    :return: The SimulatedSetup
+    """
+    global _setup
+    if _setup is None:
+        _setup = SimulatedSetup(latency, noise, bytes_per_second, seed)
+    return _setup
+
+
+def stop():
+    """
+    Stops the simulated setup if it is running.
+    """
+    global _setup
+    if _setup is not None:
+        _setup.close()
+        _setup = None
@@ -0,0 +1,710 @@
+"""
+The models module contains simulated versions of the instruments in the instruments module. Each model answers the
+commands its instruments class sends, keeps track of the settings it has been sent, and produces made up (but
+plausible) measurements. Every model has a configurable latency (the time it takes to respond to a read) and noise.
+"""
+
+import math
+import time
+import numpy as np
+from .. import async_io
+
+
+class SimulatedInstrument(object):
+    """
+    The base class for simulated instruments. Messages written to the instrument are split into commands at ';'. A
+    command of the form 'HEADER value' stores value as the setting HEADER, and 'HEADER?' returns the stored setting.
+    Subclasses add defaults for their settings and handle any commands that do more than that.
+    """
+
+    # The identification string returned by *IDN?
+    IDENTITY = 'Simulated Instrument'
+
+    # The value of each setting after a reset
+    _DEFAULTS = {}
+
+    # Headers of settings that are stored separately for each value of their first argument, i.e. 'AUXV 1,0.5'
+    _INDEXED = ()
+
+    def __init__(self, latency=0.0, noise=0.0, seed=None):
+        """
+        Initializes the simulated instrument.
+
+        :param latency: The number of seconds the instrument takes to respond to a read
+
+        :param noise: The standard deviation of the noise added to measurements, in the units of the measurement
+
+        :param seed: The seed of the random number generator used to make noise, or None for a random seed
+        """
+        self.latency = latency
+        self.noise = noise
+        self._rng = np.random.RandomState(seed)
+        self._settings = {}
+        self._output = bytearray()
+        self.reset()
+
+    def reset(self):
+        """
+        Returns every setting to its default value and throws away any unread output.
+        """
+        self._settings = dict(self._DEFAULTS)
+        del self._output[:]
+
+    def get_setting(self, header, index=None):
+        """
+        Returns the stored value of a setting as a string.
+
+        :param header: The header of the setting, i.e. 'FREQ'
+
+        :param index: The first argument of an indexed setting, or None
+
+        :return: The value of the setting, or '0' if it has never been set and has no default
+        """
+        key = header if index is None else (header, index)
+        return self._settings.get(key, '0')
+
+    def get_float(self, header, index=None):
+        """
+        Returns the stored value of a setting as a float.
+
+        :param header: The header of the setting, i.e. 'FREQ'
+
+        :param index: The first argument of an indexed setting, or None
+        """
+        return float(self.get_setting(header, index))
+
+    def write(self, message):
+        """
+        Handles a message sent to the instrument, saving any responses to be read later.
+
+        :param message: The message, made up of commands separated by ';'
+        """
+        for command in message.split(';'):
+            # A leading colon (as in 'FUNC SQU;:OUTP 1') only returns to the root of the command tree
+            command = command.strip().lstrip(':')
+            if command == '':
+                continue
+            response = self.handle(command)
+            if response is not None:
+                self._output.extend(response)
+
+    def read(self):
+        """
+        Returns (and removes) everything the instrument has to send.
+
+        :return: A bytearray of the instrument's responses
+        """
+        output = self._output[:]
+        del self._output[:]
+        return output
+
+    def has_output(self):
+        """
+        Returns True if the instrument has responses waiting to be read.
+        """
+        return len(self._output) > 0
+
+    def handle(self, command):
+        """
+        Handles a single command.
+
+        :param command: The command, i.e. 'FREQ 1000' or 'FREQ?'
+
+        :return: The response as a string terminated by a new line, or None if the command has no response
+        """
+        header, _, args = command.partition(' ')
+        header = header.upper()
+        args = args.strip()
+        if header == '*RST':
+            self.reset()
+        elif header == '*IDN?':
+            return self.IDENTITY + '\n'
+        elif header == '*TRG':
+            self.trigger()
+        elif header.endswith('?'):
+            index = args.split(',')[0] if header[:-1] in self._INDEXED else None
+            return self.get_setting(header[:-1], index) + '\n'
+        elif header in self._INDEXED:
+            index, _, value = args.partition(',')
+            self._settings[(header, index)] = value
+        else:
+            self._settings[header] = args
+        return None
+
+    def trigger(self):
+        """
+        Called when the instrument is sent a trigger, does nothing by default.
+        """
+        pass
+
+    def _noise(self, size=None):
+        """
+        Returns normally distributed noise with a standard deviation of self.noise.
+
+        :param size: The number of noise values to return, or None for a single float
+        """
+        if self.noise == 0:
+            return 0.0 if size is None else np.zeros(size)
+        return self._rng.normal(0.0, self.noise, size)
+
+
+class SimulatedSR830(SimulatedInstrument):
+    """
+    A simulated SRS SR830 lock-in amplifier. The measured X and Y follow the signal function through a low pass filter
+    with the set time constant and slope. The model has a data buffer that fills at the set sample rate (in shot or
+    loop mode, or one point per TRIG), which can be read with TRCL?, and supports fast data transfer mode.
+    """
+
+    IDENTITY = 'Stanford_Research_Systems,SR830,s/n00000,ver1.07 (simulated)'
+
+    _DEFAULTS = {'PHAS': '0', 'FMOD': '1', 'FREQ': '1000', 'RSLP': '0', 'HARM': '1', 'SLVL': '1', 'ISRC': '0',
+                 'IGND': '0', 'ICPL': '0', 'ILIN': '3', 'SENS': '26', 'RMOD': '1', 'OFLT': '10', 'OFSL': '1',
+                 'SYNC': '0', 'OUTX': '1', 'OVRM': '1', 'KCLK': '1', 'ALRM': '1', 'SRAT': '13', 'SEND': '1',
+                 'TSTR': '0', 'FAST': '0',
+                 ('DDEF', '1'): '0,0', ('DDEF', '2'): '0,0', ('FPOP', '1'): '1', ('FPOP', '2'): '1'}
+
+    _INDEXED = ('DDEF', 'FPOP', 'OEXP', 'AUXV', 'OAUX')
+
+    BUFFER_SIZE = 16383
+
+    SAMPLE_RATE_TRIGGER = 14
+
+    # The values that can be snapped, in the order of their SNAP? parameter numbers
+    _SNAP_VALUES = ('X', 'Y', 'R', 'THETA', 'AUX1', 'AUX2', 'AUX3', 'AUX4', 'REF_FREQ', 'CH1', 'CH2')
+
+    # Channel 1 and channel 2 display values, in the order of their DDEF settings
+    _CHANNEL1_DISPLAYS = ('X', 'R', 'X', 'AUX1', 'AUX2')
+    _CHANNEL2_DISPLAYS = ('Y', 'THETA', 'Y', 'AUX3', 'AUX4')
+
+    def __init__(self, signal=None, latency=0.0, noise=0.0, seed=None):
+        """
+        Initializes the simulated lock-in.
+
+        :param signal: A function of time (in seconds since the epoch) returning the complex signal at the input in
+        volts, where the real part is X and the imaginary part is Y. Defaults to no signal.
+
+        :param latency: The number of seconds the lock-in takes to respond to a read
+
+        :param noise: The standard deviation of the noise added to X and Y in volts
+
+        :param seed: The seed of the random number generator used to make noise, or None for a random seed
+        """
+        self.signal = signal or (lambda t: 0j)
+        # The voltages at the four Aux inputs, as functions of time
+        self.aux_inputs = [lambda t: 0.0] * 4
+        # The state of each pole of the low pass filter, and the last time they were updated
+        self._filter = None
+        self._filter_time = None
+        super(SimulatedSR830, self).__init__(latency, noise, seed)
+
+    def reset(self):
+        super(SimulatedSR830, self).reset()
+        self._filter = None
+        self._filter_time = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        """
+        Empties the data buffer and stops storage.
+        """
+        # The buffer holds the most recent points; _stored counts every point stored since the last reset
+        self._buffer = np.zeros((0, 2))
+        self._stored = 0
+        # The time storage (re)started, or None if paused, and the number of points stored before then
+        self._scan_start = None
+        self._stored_at_start = 0
+        self._streamed = 0
+
+    # Settings as physical quantities
+
+    def full_scale(self):
+        """
+        Returns the full scale sensitivity in volts.
+        """
+        sensitivity = int(self.get_float('SENS'))
+        return (2, 5, 10)[sensitivity % 3] * (10 ** (sensitivity // 3)) * 1e-9
+
+    def time_constant(self):
+        """
+        Returns the time constant in seconds.
+        """
+        time_constant = int(self.get_float('OFLT'))
+        return (1, 3)[time_constant % 2] * (10 ** (time_constant // 2)) * 1e-5
+
+    def filter_poles(self):
+        """
+        Returns the number of poles of the low pass filter (i.e. 1 for 6dB/oct, 4 for 24dB/oct).
+        """
+        return int(self.get_float('OFSL')) + 1
+
+    def sample_rate(self):
+        """
+        Returns the sample rate in Hz, or None if points are stored on triggers.
+        """
+        rate = int(self.get_float('SRAT'))
+        if rate == self.SAMPLE_RATE_TRIGGER:
+            return None
+        return 0.0625 * (2 ** rate)
+
+    # Measurements
+
+    def _filtered_signal(self, now):
+        """
+        Returns the complex output of the low pass filter at time now, advancing the filter state.
+
+        :param now: The time in seconds since the epoch
+        """
+        target = complex(self.signal(now))
+        poles = self.filter_poles()
+        if self._filter is None or len(self._filter) != poles:
+            self._filter = [target] * poles
+            self._filter_time = now
+        dt = now - self._filter_time
+        tau = self.time_constant()
+        if dt > 50 * tau * poles:
+            self._filter = [target] * poles
+        elif dt > 0:
+            # Advance each pole in steps short compared to the time constant
+            steps = int(min(1000, math.ceil(dt / (tau / 4.0))))
+            decay = math.exp(-dt / steps / tau)
+            for _ in range(steps):
+                value = target
+                for i in range(poles):
+                    self._filter[i] = value + (self._filter[i] - value) * decay
+                    value = self._filter[i]
+        # A measurement earlier than the last (i.e. of a buffered point after a SNAP?) does not wind the filter back
+        self._filter_time = max(self._filter_time, now)
+        return self._filter[-1]
+
+    def measure(self, now=None):
+        """
+        Returns a dictionary of every value that can be snapped at time now.
+
+        :param now: The time in seconds since the epoch, or None for the current time
+        """
+        if now is None:
+            now = time.time()
+        value = self._filtered_signal(now) + complex(self._noise(), self._noise())
+        phase = math.radians(self.get_float('PHAS'))
+        value *= complex(math.cos(phase), -math.sin(phase))
+        values = dict(X=value.real, Y=value.imag, R=abs(value), THETA=math.degrees(math.atan2(value.imag, value.real)),
+                      REF_FREQ=self.get_float('FREQ'))
+        for i in range(4):
+            values['AUX' + str(i + 1)] = float(self.aux_inputs[i](now))
+        values['CH1'] = values[self._CHANNEL1_DISPLAYS[int(self.get_setting('DDEF', '1').split(',')[0])]]
+        values['CH2'] = values[self._CHANNEL2_DISPLAYS[int(self.get_setting('DDEF', '2').split(',')[0])]]
+        return values
+
+    def status(self):
+        """
+        Returns the LIA status byte. Bit 2 is set if the output is overloaded (|R| larger than full scale).
+        """
+        if self.measure()['R'] > self.full_scale():
+            return 4
+        return 0
+
+    # Data buffer
+
+    def points_stored(self, now=None):
+        """
+        Returns the number of points stored since the buffer was reset, including points that have been overwritten.
+
+        :param now: The time in seconds since the epoch, or None for the current time
+        """
+        if now is None:
+            now = time.time()
+        stored = self._stored_at_start
+        rate = self.sample_rate()
+        if self._scan_start is not None and rate is not None and now >= self._scan_start:
+            stored += int((now - self._scan_start) * rate)
+        if self.get_setting('SEND') == '0':
+            stored = min(stored, self.BUFFER_SIZE)
+        return stored
+
+    def _fill_buffer(self, now=None):
+        """
+        Stores every point due by time now in the buffer. Each point is measured at the time it was due, so the buffer
+        follows the signal (and the Aux inputs) through changes between reads.
+
+        :param now: The time in seconds since the epoch, or None for the current time
+        """
+        if now is None:
+            now = time.time()
+        new = self.points_stored(now) - self._stored
+        if new <= 0:
+            return
+        # Only the most recent points fit in the buffer, so only they are measured
+        kept = min(new, self.BUFFER_SIZE)
+        rate = self.sample_rate()
+        if self._scan_start is None or rate is None:
+            times = [now] * kept
+        else:
+            # Point n since the scan started is due 1 + n samples after the start
+            first = self._stored + new - kept - self._stored_at_start
+            times = self._scan_start + np.arange(first + 1, first + kept + 1) / rate
+        points = np.empty((kept, 2))
+        for i, t in enumerate(times):
+            values = self.measure(min(t, now))
+            points[i] = values['CH1'], values['CH2']
+        self._buffer = np.concatenate((self._buffer, points))[-self.BUFFER_SIZE:]
+        self._stored += new
+
+    def _start_scan(self, delay=0.0):
+        """
+        Starts or resumes storage after delay seconds.
+        """
+        if self._scan_start is None:
+            self._fill_buffer()
+            self._stored_at_start = self._stored
+            self._scan_start = time.time() + delay
+
+    def _pause_scan(self):
+        """
+        Pauses storage.
+        """
+        if self._scan_start is not None:
+            self._fill_buffer()
+            self._stored_at_start = self._stored
+            self._scan_start = None
+
+    def trigger(self):
+        """
+        Stores a point if the sample rate is set to trigger and storage is running.
+        """
+        if self.sample_rate() is None and self._scan_start is not None:
+            if self.get_setting('SEND') == '0' and self._stored >= self.BUFFER_SIZE:
+                return
+            values = self.measure()
+            self._buffer = np.concatenate((self._buffer, [[values['CH1'], values['CH2']]]))[-self.BUFFER_SIZE:]
+            self._stored += 1
+            self._stored_at_start = self._stored
+
+    @staticmethod
+    def encode(values):
+        """
+        Encodes values in the TRCL? binary format (a 16-bit little endian mantissa, an 8-bit exponent, and an unused
+        byte, representing mantissa * 2^(exponent - 124)).
+
+        :param values: A numpy array of floats
+
+        :return: A bytearray of the encoded values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        magnitude = np.maximum(np.abs(values), 1e-300)
+        exponent = np.clip(np.ceil(np.log2(magnitude / 32767.0)) + 124, 0, 255).astype(np.int32)
+        mantissa = np.clip(np.round(np.ldexp(values, 124 - exponent)), -32768, 32767)
+        encoded = np.zeros(len(values), dtype=[('mantissa', '<i2'), ('exponent', 'u1'), ('pad', 'u1')])
+        encoded['mantissa'] = mantissa
+        encoded['exponent'] = exponent
+        return bytearray(encoded.tobytes())
+
+    def stream(self, now=None):
+        """
+        Returns the fast data transfer mode bytes for every point stored since the last call, or an empty bytearray if
+        fast mode is off. Each point is X and Y (or channel 1 and channel 2) as 16-bit integers where 30000 is full scale.
+
+        :param now: The time in seconds since the epoch, or None for the current time
+        """
+        if self.get_setting('FAST') == '0':
+            return bytearray()
+        self._fill_buffer(now)
+        new = min(self._stored - self._streamed, len(self._buffer))
+        self._streamed = self._stored
+        if new <= 0:
+            return bytearray()
+        counts = np.clip(np.round(self._buffer[-new:] * 30000.0 / self.full_scale()), -32768, 32767)
+        return bytearray(counts.astype('<i2').tobytes())
+
+    def handle(self, command):
+        header, _, args = command.partition(' ')
+        header = header.upper()
+        args = [arg.strip() for arg in args.split(',')] if args.strip() else []
+        if header == 'OUTP?':
+            return self._format(self.measure()[self._SNAP_VALUES[int(args[0]) - 1]])
+        elif header == 'OUTR?':
+            return self._format(self.measure()['CH' + args[0]])
+        elif header == 'SNAP?':
+            values = self.measure()
+            return ','.join(self._format(values[self._SNAP_VALUES[int(arg) - 1]]).strip() for arg in args) + '\n'
+        elif header == 'OAUX?':
+            return self._format(self.measure()['AUX' + args[0]])
+        elif header == 'LIAS?':
+            status = self.status()
+            if len(args) > 0:
+                status = (status >> int(args[0])) & 1
+            return str(status) + '\n'
+        elif header == 'SPTS?':
+            self._fill_buffer()
+            return str(min(self._stored, self.BUFFER_SIZE)) + '\n'
+        elif header == 'TRCL?':
+            self._fill_buffer()
+            channel, start, count = int(args[0]), int(args[1]), int(args[2])
+            return self.encode(self._buffer[start:start + count, channel - 1])
+        elif header == 'STRT':
+            self._start_scan()
+        elif header == 'STRD':
+            self._start_scan(0.5)
+        elif header == 'PAUS':
+            self._pause_scan()
+        elif header == 'REST':
+            self._reset_buffer()
+        elif header == 'TRIG':
+            self.trigger()
+        elif header in ('AGAN', 'ARSV', 'APHS', 'SSET', 'RSET'):
+            pass
+        elif header in ('SRAT', 'SEND'):
+            # Store the points due at the old setting, then carry on from now at the new setting
+            self._fill_buffer()
+            super(SimulatedSR830, self).handle(command)
+            if self._scan_start is not None:
+                self._stored_at_start = self._stored
+                self._scan_start = max(self._scan_start, time.time())
+        else:
+            return super(SimulatedSR830, self).handle(command)
+        return None
+
+    @staticmethod
+    def _format(value):
+        """
+        Formats a measurement the way the SR830 sends it.
+        """
+        return '%.6g\n' % value
+
+
+class SimulatedAgilent33220A(SimulatedInstrument):
+    """
+    A simulated Agilent 33220A function generator.
+    """
+
+    IDENTITY = 'Agilent Technologies,33220A,MY00000000,2.02-2.02-22-2 (simulated)'
+
+    _DEFAULTS = {'FUNC': 'SIN', 'FREQ': '1000', 'VOLT': '0.1', 'VOLT:HIGH': '0.05', 'VOLT:LOW': '-0.05', 'UNIT': 'VPP',
+                 'OUTP': '0', 'FREQ:STAR': '100', 'FREQ:STOP': '1000', 'SWE:TIME': '1', 'SWE:SPAC': 'LIN',
+                 'SWE:STAT': '0', 'TRIG:SOUR': 'IMM'}
+
+    def handle(self, command):
+        response = super(SimulatedAgilent33220A, self).handle(command)
+        # The amplitude follows the high and low levels
+        if command.upper().startswith('VOLT:'):
+            self._settings['VOLT'] = str(self.get_float('VOLT:HIGH') - self.get_float('VOLT:LOW'))
+        return response
+
+    def output_on(self):
+        """
+        Returns True if the output is on.
+        """
+        return self.get_setting('OUTP') in ('1', 'ON')
+
+
+class SimulatedAgilent34401A(SimulatedInstrument):
+    """
+    A simulated Agilent 34401A multimeter.
+    """
+
+    IDENTITY = 'HEWLETT-PACKARD,34401A,0,11-5-2 (simulated)'
+
+    def __init__(self, dc_voltage=None, latency=0.0, noise=0.0, seed=None):
+        """
+        Initializes the simulated multimeter.
+
+        :param dc_voltage: A function of time (in seconds since the epoch) returning the DC voltage at the input.
+        Defaults to 0V.
+
+        :param latency: The number of seconds the multimeter takes to respond to a read
+
+        :param noise: The standard deviation of the noise added to measurements in volts
+
+        :param seed: The seed of the random number generator used to make noise, or None for a random seed
+        """
+        self.dc_voltage = dc_voltage or (lambda t: 0.0)
+        super(SimulatedAgilent34401A, self).__init__(latency, noise, seed)
+
+    def handle(self, command):
+        if command.upper().startswith('MEAS:VOLT:DC?'):
+            return '%+.8E\n' % (self.dc_voltage(time.time()) + self._noise())
+        return super(SimulatedAgilent34401A, self).handle(command)
+
+
+class SimulatedPasternackPE11S390(SimulatedInstrument):
+    """
+    A simulated Pasternack PE11S390 frequency synthesizer.
+    """
+
+    IDENTITY = 'Pasternack,PE11S390,0,1.0 (simulated)'
+
+    _DEFAULTS = {'POWE:RF': '0', 'FREQ:REF:EXT': '0', 'FREQ:SET': '10', 'POWE:SET': '10'}
+
+    def handle(self, command):
+        if command.upper() == 'FREQ:RETACT?':
+            return self.get_setting('FREQ:SET') + '\n'
+        return super(SimulatedPasternackPE11S390, self).handle(command)
+
+    def output_on(self):
+        """
+        Returns True if the RF output is on.
+        """
+        return self.get_setting('POWE:RF') == '1'
+
+
+class SimulatedHP8350B(SimulatedInstrument):
+    """
+    A simulated HP8350B sweep oscillator. Frequencies (FA, FB, CF, DF, CW) and the sweep time (ST) are stored in Hz and
+    seconds, and read back with OP. Each T4 starts a single sweep from the start to the stop frequency, during which the
+    rear panel SWEEP OUT voltage ramps from 0 to 10 V; before and after the sweep the output sits at the start frequency
+    and the voltage at 0 V. The internal and external trigger modes (which sweep repeatedly) are not simulated.
+    """
+
+    IDENTITY = 'HP8350B (simulated)'
+
+    _DEFAULTS = {'FA': '2e9', 'FB': '8.4e9', 'CW': '5.2e9', 'ST': '0.01', 'PL': '0'}
+
+    # The multiplier of each unit suffix, to Hz or seconds
+    _UNITS = {'GZ': 1e9, 'MZ': 1e6, 'KZ': 1e3, 'HZ': 1.0, 'SC': 1.0, 'MS': 1e-3}
+
+    # The SWEEP OUT voltage at the stop frequency
+    SWEEP_VOLTAGE = 10.0
+
+    def reset(self):
+        super(SimulatedHP8350B, self).reset()
+        # The time the last single sweep started, or None if no sweep has been triggered
+        self._sweep_start = None
+
+    def handle(self, command):
+        header, _, args = command.partition(' ')
+        header = header.upper()
+        args = args.strip().upper()
+        if header == 'T4':
+            self._sweep_start = time.time()
+        elif header == 'OP':
+            if args == 'CF':
+                return '%.10g\n' % ((self.get_float('FA') + self.get_float('FB')) / 2)
+            if args == 'DF':
+                return '%.10g\n' % (self.get_float('FB') - self.get_float('FA'))
+            return '%.10g\n' % self.get_float(args)
+        elif header in ('FA', 'FB', 'CW', 'ST', 'CF', 'DF'):
+            value = float(args[:-2]) * self._UNITS[args[-2:]] if args[-2:] in self._UNITS else float(args)
+            if header in ('CF', 'DF'):
+                # The center and width are kept as the start and stop frequencies they set
+                start, stop = self.get_float('FA'), self.get_float('FB')
+                center = value if header == 'CF' else (start + stop) / 2
+                width = value if header == 'DF' else stop - start
+                self._settings['FA'], self._settings['FB'] = repr(center - width / 2), repr(center + width / 2)
+            else:
+                self._settings[header] = repr(value)
+        else:
+            return super(SimulatedHP8350B, self).handle(command)
+        return None
+
+    def _progress(self, t):
+        """
+        Returns the fraction of the single sweep done at time t, or None if no sweep is running then.
+
+        :param t: The time in seconds since the epoch
+        """
+        if self._sweep_start is None:
+            return None
+        progress = (t - self._sweep_start) / self.get_float('ST')
+        if not 0 <= progress <= 1:
+            return None
+        return progress
+
+    def frequency(self, t):
+        """
+        Returns the output frequency in Hz at time t.
+
+        :param t: The time in seconds since the epoch
+        """
+        progress = self._progress(t)
+        start = self.get_float('FA')
+        if progress is None:
+            return start
+        return start + (self.get_float('FB') - start) * progress
+
+    def sweep_voltage(self, t):
+        """
+        Returns the SWEEP OUT voltage at time t.
+
+        :param t: The time in seconds since the epoch
+        """
+        progress = self._progress(t)
+        if progress is None:
+            return 0.0
+        return self.SWEEP_VOLTAGE * progress
+
+
+class SimulatedUSBDevice(object):
+    """
+    Connects a simulated instrument to an Instrument the same way a USBDevice connects a real one, with read, write,
+    query, and close functions.
+    """
+
+    def __init__(self, model):
+        """
+        :param model: The simulated instrument
+        """
+        self._model = model
+
+    def read(self):
+        """
+        Reads from the simulated instrument
+
+        :return: Returns the string that is read
+        """
+        time.sleep(self._model.latency)
+        return str(self._model.read())
+
+    def read_binary(self, nbytes):
+        """
+        Reads nbytes bytes from the simulated instrument
+
+        :return: A bytearray containing the bytes read
+        """
+        time.sleep(self._model.latency)
+        return self._model.read()[:nbytes]
+
+    def write(self, command):
+        """
+        Writes a command to the simulated instrument
+
+        :param command: The command to write
+        """
+        self._model.write(command)
+
+    def query(self, command):
+        """
+        Writes a command to the simulated instrument and then reads the response.
+
+        :param command: The command to write.
+
+        :return: The response with whitespace stripped away.
+        """
+        self.write(command)
+        return self.read().strip()
+
+    def write_async(self, command):
+        """
+        A coroutine version of write().
+
+        :param command: The command to write
+        """
+        self.write(command)
+        yield async_io.sleep(0)
+
+    def query_async(self, command):
+        """
+        A coroutine version of query(), which waits out the latency of the simulated instrument without blocking other
+        coroutines.
+
+        :param command: The command to write.
+
+        :return: The response with whitespace stripped away.
+        """
+        self.write(command)
+        yield async_io.sleep(self._model.latency)
+        raise async_io.Return(str(self._model.read()).strip())
+
+    def close(self):
+        """
+        Does nothing, there is no connection to close.
+        """
+        pass
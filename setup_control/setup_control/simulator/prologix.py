@@ -0,0 +1,149 @@
+"""
+The prologix module contains a simulated Prologix GPIB-USB controller. The controller is served on a pseudo-terminal, so
+the Prologix class in the inst_io module can open it like the serial port of a real controller. Commands starting with
+'++' are handled by the controller, and anything else is passed on to the simulated instrument at the current address.
+"""
+
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+
+class SimulatedPrologix(object):
+    """
+    A simulated Prologix GPIB-USB controller with simulated instruments on its GPIB bus. A background thread answers
+    everything written to the pseudo-terminal at self.port.
+    """
+
+    VERSION = 'Prologix GPIB-USB Controller version 6.107 (simulated)'
+
+    def __init__(self, instruments=None, bytes_per_second=None):
+        """
+        Opens the pseudo-terminal and starts answering commands.
+
+        :param instruments: A dictionary of simulated instruments on the bus, keyed by GPIB address
+
+        :param bytes_per_second: The speed of transfers from instruments to the computer, or None for no limit
+        """
+        self.instruments = dict(instruments or {})
+        self.bytes_per_second = bytes_per_second
+        self._address = None
+        self._auto = False
+        # The address of the instrument being read in fast data transfer mode, if any
+        self._streaming = None
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """
+        Stops answering commands and closes the pseudo-terminal.
+        """
+        self._running = False
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _serve(self):
+        """
+        Reads lines from the pseudo-terminal and handles them until closed.
+        """
+        line = bytearray()
+        while self._running:
+            timeout = 0.01 if self._streaming is not None else 0.1
+            readable, _, _ = select.select([self._master], [], [], timeout)
+            if not readable:
+                self._send_stream()
+                continue
+            # Any input ends a read in progress
+            self._streaming = None
+            line.extend(os.read(self._master, 4096))
+            while b'\n' in line:
+                end = line.index(b'\n')
+                self._handle(str(line[:end]).rstrip('\r'))
+                del line[:end + 1]
+
+    def _handle(self, line):
+        """
+        Handles a single line sent to the controller.
+
+        :param line: The line, without its terminating new line
+        """
+        if not line.startswith('++'):
+            instrument = self.instruments.get(self._address)
+            if instrument is not None:
+                instrument.write(line)
+                if self._auto:
+                    self._send_output(instrument)
+            return
+        command, _, args = line[2:].partition(' ')
+        args = args.strip()
+        if command == 'addr':
+            if args == '':
+                self._respond(str(self._address) + '\n')
+            else:
+                self._address = int(args.split()[0])
+        elif command == 'auto':
+            if args == '':
+                self._respond(('1' if self._auto else '0') + '\n')
+            else:
+                self._auto = args == '1'
+        elif command == 'ver':
+            self._respond(self.VERSION + '\n')
+        elif command == 'read':
+            instrument = self.instruments.get(self._address)
+            if instrument is None:
+                return
+            if instrument.has_output():
+                self._send_output(instrument)
+            elif instrument.get_setting('FAST') != '0':
+                # The instrument sends data continuously until the read is interrupted
+                self._streaming = self._address
+        elif command == 'clr' or command == 'rst':
+            instrument = self.instruments.get(self._address)
+            if instrument is not None:
+                instrument.read()
+        elif command == 'trg':
+            instrument = self.instruments.get(self._address)
+            if instrument is not None:
+                instrument.trigger()
+        # Other commands (mode, eoi, eos, eot_enable, read_tmo_ms, ifc, loc, llo, ...) only change how a real
+        # controller talks to the bus, so they are accepted and ignored
+
+    def _send_output(self, instrument):
+        """
+        Sends everything the instrument has to send to the computer, after the instrument's latency.
+
+        :param instrument: The simulated instrument
+        """
+        time.sleep(instrument.latency)
+        self._respond(instrument.read())
+
+    def _send_stream(self):
+        """
+        Sends any fast data transfer mode points from the instrument being streamed.
+        """
+        if self._streaming is not None:
+            data = self.instruments[self._streaming].stream()
+            if len(data) > 0:
+                self._respond(data)
+
+    def _respond(self, data):
+        """
+        Writes data to the pseudo-terminal, limited to bytes_per_second.
+
+        :param data: A string or bytearray to send
+        """
+        if self.bytes_per_second:
+            time.sleep(len(data) / float(self.bytes_per_second))
+        data = bytes(data)
+        while len(data) > 0:
+            written = os.write(self._master, data)
+            data = data[written:]
@@ -4,9 +4,314 @@ in the module are completely unrelated to data acquisition, and are purely analy
 that would otherwise be repeated lots of times in experiment runs.
 """
 
+import os
+import json
 import time
 import experiment_wrapper as experiment_wrapper
+import settling
 import numpy as np
+from instruments import SR830
+
+# The phases of each sweep point timed by sweep_parameter, in the order they happen
+SWEEP_PHASES = ('log', 'set', 'settle', 'acquire', 'store')
+
+
+class DataRecorder(object):
+    """
+    Collects rows of data with named columns into a preallocated array. Appending a row copies only that row, and the
+    array doubles in size when it fills up, so recording n rows takes O(n) time rather than the O(n^2) of growing an
+    array with np.vstack. Use it as
+
+        recorder = DataRecorder(('frequency', 'x', 'y'))
+        recorder.append(freq, x, y)
+        np.save(save_path, recorder.data)
+    """
+
+    def __init__(self, columns, capacity=1024, dtype=float):
+        """
+        Creates an empty recorder.
+
+        :param columns: The names of the columns, in order
+
+        :param capacity: The number of rows to make room for at first. If the number of rows is known, passing it means
+        the array is never copied.
+
+        :param dtype: The numpy data type of the array
+        """
+        self.columns = tuple(columns)
+        self._array = np.empty((max(int(capacity), 1), len(self.columns)), dtype)
+        self._length = 0
+
+    def append(self, *values):
+        """
+        Adds a row to the end of the data. Values that are None or '' (i.e. from a read that timed out) are stored as
+        nan.
+
+        :param values: One value for each column, in the order of the columns
+        """
+        if len(values) != len(self.columns):
+            raise ValueError('Expected ' + str(len(self.columns)) + ' values but got ' + str(len(values)))
+        if self._length == self._array.shape[0]:
+            # Full, so double the capacity
+            array = np.empty((2 * self._array.shape[0], self._array.shape[1]), self._array.dtype)
+            array[:self._length] = self._array
+            self._array = array
+        self._array[self._length] = [np.nan if value is None or (isinstance(value, str) and value == '') else value
+                                     for value in values]
+        self._length += 1
+
+    def __len__(self):
+        """
+        Returns the number of rows recorded.
+        """
+        return self._length
+
+    @property
+    def data(self):
+        """
+        The rows recorded so far, as a view (not a copy) of the array, with one column for each name in columns. The view
+        stops following the recorder once the array grows, so take a new one after appending.
+        """
+        return self._array[:self._length]
+
+    def column(self, name):
+        """
+        Returns a view (not a copy) of one column of the rows recorded so far.
+
+        :param name: The name of the column
+
+        :return: A one dimensional numpy array
+        """
+        return self._array[:self._length, self.columns.index(name)]
+
+
+class SweepWriter(object):
+    """
+    Appends rows of data to a file as they are acquired, so a crash or Ctrl-C loses at most the rows written since the
+    last flush. The file starts with a text header holding the column names and any metadata (i.e. the sweep settings)
+    as JSON, padded to SWEEP_HEADER_BLOCK bytes, followed by one fixed-size record of 64-bit floats per row. Use
+    load_sweep() to read the file back. Use it as
+
+        with SweepWriter(save_path, ('frequency', 'x', 'y'), metadata=dict(time_constant=100)) as writer:
+            writer.append(freq, x, y)
+    """
+
+    def __init__(self, path, columns, metadata=None, flush_interval=1.0, append=False):
+        """
+        Creates the file and writes its header.
+
+        :param path: The path of the file to write
+
+        :param columns: The names of the columns, in order
+
+        :param metadata: A dictionary of settings to save in the header, its values must be numbers, strings, lists, or
+        dictionaries
+
+        :param flush_interval: The number of seconds between flushing the rows written to disk (with os.fsync). 0 flushes
+        every row.
+
+        :param append: If True and the file exists, rows are added to the end of it and its header is kept
+        """
+        self.path = path
+        self.columns = tuple(columns)
+        self.flush_interval = flush_interval
+        if append and os.path.exists(path):
+            # Keep the header, but drop any partly written row at the end of the file
+            header, header_size = _read_sweep_header(path)
+            if tuple(header['columns']) != self.columns:
+                raise ValueError('The columns of ' + path + ' are ' + str(header['columns']) + ', not ' + str(self.columns))
+            row_size = 8 * len(self.columns)
+            self._file = open(path, 'r+b')
+            self._file.truncate(header_size + (os.path.getsize(path) - header_size) // row_size * row_size)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(_make_sweep_header(self.columns, metadata))
+            self._sync()
+        self._last_flush = time.time()
+
+    def append(self, *values):
+        """
+        Writes a row to the end of the file. Values that are None or '' (i.e. from a read that timed out) are stored as
+        nan.
+
+        :param values: One value for each column, in the order of the columns
+        """
+        if len(values) != len(self.columns):
+            raise ValueError('Expected ' + str(len(self.columns)) + ' values but got ' + str(len(values)))
+        row = [np.nan if value is None or (isinstance(value, str) and value == '') else value for value in values]
+        self._file.write(np.asarray(row, '<f8').tostring())
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Makes sure every row written so far is on disk.
+        """
+        self._sync()
+        self._last_flush = time.time()
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        """
+        if not self._file.closed:
+            self._sync()
+            self._file.close()
+
+    def _sync(self):
+        """
+        Flushes Python's and the operating system's buffers to disk.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RunningStats(object):
+    """
+    Keeps the running mean and standard error of a stream of readings (each a list of values, i.e. (x, y)) using
+    Welford's algorithm, which is numerically stable and needs no memory of past readings.
+    """
+
+    def __init__(self, size):
+        """
+        Creates empty statistics.
+
+        :param size: The number of values in each reading
+        """
+        self.count = 0
+        self.mean = np.zeros(size)
+        self._m2 = np.zeros(size)
+
+    def add(self, values):
+        """
+        Adds a reading.
+
+        :param values: The values of the reading
+        """
+        values = np.asarray(values, float)
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (values - self.mean)
+
+    @property
+    def variance(self):
+        """
+        The sample variance of each value, or infinity with fewer than two readings.
+        """
+        if self.count < 2:
+            return np.full(self._m2.shape, np.inf)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def stderr(self):
+        """
+        The standard error of the mean of each value, or infinity with fewer than two readings.
+        """
+        if self.count < 2:
+            return np.full(self._m2.shape, np.inf)
+        return np.sqrt(self.variance / self.count)
+
+
+def acquire_adaptive(target_stderr, max_dwell, min_samples=3, sample_interval=None):
+    """
+    Keeps reading X and Y from the lock-in until the standard error of their means is below target_stderr, or
+    max_dwell seconds have passed. Strong signals stop after a few readings while weak ones are averaged for longer.
+    Readings closer together than about one time constant are correlated, which makes the standard error look smaller
+    than it is, so by default they are one time constant apart.
+
+    :param target_stderr: The standard error in volts that X and Y must both be below to stop
+
+    :param max_dwell: The longest time in seconds to keep reading
+
+    :param min_samples: The fewest readings to take
+
+    :param sample_interval: The time in seconds between readings, or None for the lock-in time constant
+
+    :return: A RunningStats of the (x, y) readings in volts
+    """
+    if sample_interval is None:
+        sample_interval = experiment_wrapper.get_time_constant() / 1000.0
+    stats = RunningStats(2)
+    start = time.time()
+    while True:
+        (x, y) = experiment_wrapper.snap_data()
+        try:
+            stats.add((float(x), float(y)))
+        except (TypeError, ValueError):
+            # A read that failed (i.e. a blank string) is left out
+            pass
+        if stats.count >= min_samples and np.all(stats.stderr <= target_stderr):
+            break
+        if time.time() - start + sample_interval > max_dwell:
+            break
+        time.sleep(sample_interval)
+    return stats
+
+
+# Every sweep file header is padded to a multiple of this many bytes
+SWEEP_HEADER_BLOCK = 512
+
+# The first line of every sweep file
+_SWEEP_MAGIC = '# setup_control sweep\n'
+
+
+def _make_sweep_header(columns, metadata):
+    """
+    Makes the header of a sweep file, see SweepWriter.
+
+    :return: The header as a string
+    """
+    # Numpy numbers and arrays are saved as the Python numbers and lists they hold, anything else as its string
+    header = json.dumps(dict(columns=list(columns), dtype='<f8', metadata=metadata or {}),
+                        default=lambda value: value.tolist() if hasattr(value, 'tolist') else str(value))
+    header = _SWEEP_MAGIC + header + '\n'
+    padding = -(len(header) + 1) % SWEEP_HEADER_BLOCK
+    return header + ' ' * padding + '\n'
+
+
+def _read_sweep_header(path):
+    """
+    Reads the header of a sweep file, see SweepWriter.
+
+    :return: A tuple of the form (header dictionary, header size in bytes)
+    """
+    with open(path, 'rb') as sweep_file:
+        if sweep_file.readline() != _SWEEP_MAGIC:
+            raise IOError(path + ' is not a sweep file')
+        header = json.loads(sweep_file.readline())
+        # The padding ends with a new line at the end of the block
+        sweep_file.readline()
+        return header, sweep_file.tell()
+
+
+def load_sweep(path):
+    """
+    Loads a file written by SweepWriter without reading its data into memory. A row that was only partly written when
+    the writing stopped is left out.
+
+    :param path: The path of the sweep file
+
+    :return: A dictionary holding the sweep metadata, plus 'columns' (the column names) and 'data' (a memory mapped
+    numpy array with a row for each row written and a column for each column name)
+    """
+    header, header_size = _read_sweep_header(path)
+    columns = header['columns']
+    rows = (os.path.getsize(path) - header_size) // (8 * len(columns))
+    sweep = dict(header['metadata'])
+    sweep['columns'] = columns
+    if rows == 0:
+        sweep['data'] = np.empty((0, len(columns)), header['dtype'])
+    else:
+        sweep['data'] = np.memmap(path, dtype=header['dtype'], mode='r', offset=header_size, shape=(rows, len(columns)))
+    return sweep
 
 
 def print_attributes(sweep):
@@ -17,9 +322,11 @@ def print_attributes(sweep):
     """
     to_print = ''
     for key in sweep.keys():
-        # If this is not the data key, add the key and the key's value to to_print
-        if key != 'data':
-            to_print += key + ': ' + str(sweep[key])
+        # The data and timing arrays are not attributes
+        if key in ('data', 'timing', 'timing_phases'):
+            continue
+        # Add the key and the key's value to to_print
+        to_print += key + ': ' + str(sweep[key])
         # Append units
         if key == 'slope':
             to_print += 'dB/oct'
@@ -39,13 +346,36 @@ def print_attributes(sweep):
             to_print += 'ms'
         elif key == 'freq_synth_frequency':
             to_print += 'GHz'
-        # If this is not the data key, add a new line
-        if key != 'data':
-            to_print += '\n'
+        # Add a new line
+        to_print += '\n'
+    print(to_print)
+
+
+def print_sweep_timing(timing, phases=SWEEP_PHASES):
+    """
+    Prints a table of where the time of a sweep went, with the total, mean, and max time of each phase of a sweep point
+    and its share of the total time.
+
+    :param timing: An array with a row for each sweep point and a column for each phase holding the seconds it took, as
+    saved under 'timing' by sweep_parameter
+
+    :param phases: The names of the phases, as saved under 'timing_phases' by sweep_parameter
+    """
+    timing = np.asarray(timing, float).reshape(-1, len(phases))
+    if timing.shape[0] == 0:
+        print('No sweep points were timed')
+        return
+    total = timing.sum()
+    to_print = '%-10s %12s %10s %10s %8s\n' % ('phase', 'total (s)', 'mean (s)', 'max (s)', 'share')
+    for i, phase in enumerate(phases):
+        column = timing[:, i]
+        share = column.sum() / total * 100 if total > 0 else 0.0
+        to_print += '%-10s %12.3f %10.4f %10.4f %7.1f%%\n' % (phase, column.sum(), column.mean(), column.max(), share)
+    to_print += '%-10s %12.3f over %i points' % ('all', total, timing.shape[0])
     print(to_print)
 
 
-def sweep_parameter(parameter_set_func, values_to_sweep, time_constant=100, sensitivity=0.2, slope=12, load_time=4, lock_in_time=0, chopper_amplitude=5, chopper_frequency=1, power=15, freq_synth_frequency=250, multiplier=18, save_path=''):
+def sweep_parameter(parameter_set_func, values_to_sweep, time_constant=100, sensitivity=0.2, slope=12, load_time=4, lock_in_time=0, chopper_amplitude=5, chopper_frequency=1, power=15, freq_synth_frequency=250, multiplier=18, save_path='', run_id=None, checkpoint_dir='', settle_accuracy=settling.DEFAULT_ACCURACY, converge=False, target_stderr=None, max_dwell=10.0):
     """
     This method sweeps a parameter through a set of values. Any parameter can be chosen. If the chosen parameter is represented in one of this functions arguments, whatever is entered for that argument will be ignored,
 
@@ -61,7 +391,141 @@ def sweep_parameter(parameter_set_func, values_to_sweep, time_constant=100, sens
 
     :param load_time: The amount of time to give the instruments to finish setting up before data collection begins.
 
-    :param lock_in_time: The amount of time to give the lock in amplifier to lock back onto the reference signal after a parameter is changed.
+    :param lock_in_time: The amount of time to give the lock in amplifier to lock back onto the reference signal after a parameter is changed, on top of the time its filter takes to settle.
+
+    :param chopper_amplitude: The amplitude of the chopper signal in V.
+
+    :param chopper_frequency: The frequency of the chopper signal in kHz.
+
+    :param power: The power of the sweeper in dBm.
+
+    :param freq_synth_frequency: The frequency of the sweeper in GHz.
+
+    :param multiplier: The multiplier (i.e. product of all frequency multipliers in the setup).
+
+    :param save_path: If a non-empty string variable save_path is passed the the sweep will be saved as a .npy file with the sweep settings saved in metadata. Each point is also written to a .sweep file next to it as soon as it is acquired (see SweepWriter and load_sweep), so a sweep that stops early is not lost.
+
+    :param run_id: If given, the sweep can be resumed. Each point is checkpointed to the file <run_id>.sweep in checkpoint_dir as soon as it is acquired (instead of the .sweep file next to save_path), along with the values to sweep and the settings. If a checkpoint for run_id already exists, the instruments are set up with the settings stored in it (rather than the ones passed in), and the sweep carries on from the value after the last one checkpointed. A finished run is not measured again.
+
+    :param checkpoint_dir: The directory to keep checkpoints in, the current directory by default.
+
+    :param settle_accuracy: After each change the lock-in filter is given time to settle to within this fraction of the change, which depends on both the time constant and the slope (see the settling module).
+
+    :param converge: If True, rather than waiting the full settling time, wait only until successive readings agree to within settle_accuracy of full scale (see settling.wait_until_converged).
+
+    :param target_stderr: If given, each point keeps reading X and Y until the standard error of their means is below target_stderr volts, or max_dwell seconds have passed (see acquire_adaptive). X and Y are then the means, followed by their standard errors and the number of readings.
+
+    :param max_dwell: The longest time in seconds to spend reading each point when target_stderr is given.
+
+    :return: The data collected, where the first column is frequency, the second column is X, and the third column is Y. X and Y are in volts. If target_stderr is given there are three more columns, the standard errors of X and Y and the number of readings.
+
+    The time each sweep point spends in each of the SWEEP_PHASES is printed as a table at the end (see print_sweep_timing) and saved under 'timing', with the phase names under 'timing_phases'.
+    """
+    # The sweep settings, saved with the data
+    settings = dict(parameter_set_func=str(parameter_set_func), time_constant=time_constant, sensitivity=sensitivity, slope=slope, load_time=load_time, lock_in_time=lock_in_time, chopper_amplitude=chopper_amplitude, chopper_frequency=chopper_frequency, power=power, freq_synth_frequency=freq_synth_frequency, multiplier=multiplier, settle_accuracy=settle_accuracy, converge=converge, target_stderr=target_stderr, max_dwell=max_dwell)
+
+    # Find out where to stream points to, and if this is a run being resumed, the points already measured
+    checkpoint = None
+    stream_path = None
+    if run_id is not None:
+        values_to_sweep = list(values_to_sweep)
+        stream_path = os.path.join(checkpoint_dir, str(run_id) + '.sweep')
+        checkpoint = _load_checkpoint(stream_path, run_id, settings)
+    elif save_path != '':
+        stream_path = _sweep_file_path(save_path)
+
+    # The columns depend on the settings the run was started with, which a checkpoint may have changed
+    columns = ('value', 'x', 'y')
+    if settings['target_stderr'] is not None:
+        columns += ('x_stderr', 'y_stderr', 'count')
+    done = np.empty((0, len(columns)))
+    if checkpoint is not None:
+        done = np.array(checkpoint['data'])
+        # Carry on with the values the run was started with
+        values_to_sweep = checkpoint['values']
+        print('Resuming run ' + str(run_id) + ' after ' + str(len(done)) + ' of ' + str(len(values_to_sweep)) + ' points')
+
+    _set_up_sweep(settings)
+
+    # Wait for the lock-in to settle after each change, either for as long as its filter needs or until its output stops
+    # changing
+    if settings['converge']:
+        settle = lambda: settling.wait_until_converged(accuracy=settings['settle_accuracy'], extra_time=settings['lock_in_time'])
+    else:
+        settle_time = settling.lock_in_settling_time(settings['settle_accuracy']) + settings['lock_in_time']
+        settle = lambda: time.sleep(settle_time)
+
+    # Read the lock-in once for each point, or until the mean is known well enough
+    if settings['target_stderr'] is None:
+        acquire = experiment_wrapper.snap_data
+    else:
+        acquire = lambda: _acquire_adaptive_row(settings['target_stderr'], settings['max_dwell'])
+
+    # Make room for the data, one row for each sweep value if the number of values is known
+    capacity = len(values_to_sweep) if hasattr(values_to_sweep, '__len__') else 1024
+    recorder = DataRecorder(columns, capacity)
+    for row in done:
+        recorder.append(*row)
+
+    # The seconds spent in each phase of each sweep point, one row per point
+    timing = DataRecorder(SWEEP_PHASES, capacity)
+
+    # Write each point to disk as it is acquired. Points are at least five time constants apart, so every point is
+    # flushed to disk.
+    writer = None
+    if stream_path is not None:
+        metadata = dict(settings)
+        if run_id is not None:
+            metadata.update(run_id=str(run_id), values=values_to_sweep)
+        writer = SweepWriter(stream_path, columns, metadata, flush_interval=0, append=run_id is not None)
+
+    # Only the values not already measured by an earlier attempt at this run are swept
+    if len(done) > 0:
+        values_to_sweep = values_to_sweep[len(done):]
+
+    try:
+        _sweep_points(parameter_set_func, values_to_sweep, settle, acquire, recorder, timing, writer)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    data = recorder.data
+
+    # Close instruments
+    experiment_wrapper.close()
+
+    # Show where the time went
+    timing = timing.data
+    print_sweep_timing(timing)
+
+    if save_path != '':
+        np.savez(save_path, data=data, timing=timing, timing_phases=np.array(SWEEP_PHASES), **_npz_settings(settings))
+
+    # Return data
+    return data
+
+
+def sweep_parameter_triggered(parameter_set_func, values_to_sweep, time_constant=100, sensitivity=0.2, slope=12, load_time=4, lock_in_time=0, chopper_amplitude=5, chopper_frequency=1, power=15, freq_synth_frequency=250, multiplier=18, save_path='', settle_accuracy=settling.DEFAULT_ACCURACY):
+    """
+    Sweeps a parameter like sweep_parameter, but rather than snapping X and Y over the bus at each point the lock-in is
+    triggered to store the point in its own buffer (see experiment_wrapper.start_triggered_scan). The buffer is read
+    back at the end with one binary transfer per channel, so each point costs a single short write. Points are only
+    read when the buffer (SR830.BUFFER_SIZE points) is full or the sweep ends, so points still in the lock-in are lost if
+    the sweep stops early.
+
+    :param parameter_set_func: The function that sets the parameter the user wishes to sweep through, i.e. wrapper.set_continuous_wave_freq.
+
+    :param values_to_sweep: The values to sweep the parameter through, i.e. range(200, 301, 2),
+
+    :param time_constant: The lock-in amplifier time constant in ms.
+
+    :param sensitivity: The lock-in amplifier sensitivity in mV.
+
+    :param slope: The lock-in amplifier roll off slope in dB/octave.
+
+    :param load_time: The amount of time to give the instruments to finish setting up before data collection begins.
+
+    :param lock_in_time: The amount of time to give the lock in amplifier to lock back onto the reference signal after a parameter is changed, on top of the time its filter takes to settle.
 
     :param chopper_amplitude: The amplitude of the chopper signal in V.
 
@@ -73,69 +537,393 @@ def sweep_parameter(parameter_set_func, values_to_sweep, time_constant=100, sens
 
     :param multiplier: The multiplier (i.e. product of all frequency multipliers in the setup).
 
-    :param save_path: If a non-empty string variable save_path is passed the the sweep will be saved as a .npy file with the sweep settings saved in metadata.
+    :param save_path: If a non-empty string variable save_path is passed the the sweep will be saved as a .npz file with the sweep settings.
+
+    :param settle_accuracy: After each change the lock-in filter is given time to settle to within this fraction of the change (see the settling module).
+
+    :return: The data collected, where the first column is the sweep value, the second column is X, and the third column is Y. X and Y are in volts.
+    """
+    # The sweep settings, saved with the data
+    settings = dict(parameter_set_func=str(parameter_set_func), time_constant=time_constant, sensitivity=sensitivity, slope=slope, load_time=load_time, lock_in_time=lock_in_time, chopper_amplitude=chopper_amplitude, chopper_frequency=chopper_frequency, power=power, freq_synth_frequency=freq_synth_frequency, multiplier=multiplier, settle_accuracy=settle_accuracy, triggered=True)
+
+    _set_up_sweep(settings)
+
+    # Store X and Y, one point for each trigger
+    experiment_wrapper.set_data('X', 'Y')
+    experiment_wrapper.start_triggered_scan()
+
+    settle_time = settling.lock_in_settling_time(settle_accuracy) + lock_in_time
+    settle = lambda: time.sleep(settle_time)
+
+    # The (x, y) blocks read out of the lock-in so far, and the number of points triggered since the last read
+    blocks = []
+    triggered = [0]
+
+    def acquire():
+        # Read the buffer out before it overflows
+        if triggered[0] == SR830.BUFFER_SIZE:
+            experiment_wrapper.stop_scan()
+            blocks.append(_read_triggered_points(triggered[0]))
+            experiment_wrapper.start_triggered_scan()
+            triggered[0] = 0
+        experiment_wrapper.trigger()
+        triggered[0] += 1
+        return ()
+
+    # Only the sweep values are recorded as the sweep goes, the data stays in the lock-in
+    capacity = len(values_to_sweep) if hasattr(values_to_sweep, '__len__') else 1024
+    recorder = DataRecorder(('value',), capacity)
+    timing = DataRecorder(SWEEP_PHASES, capacity)
+
+    _sweep_points(parameter_set_func, values_to_sweep, settle, acquire, recorder, timing, None)
+
+    # Read the rest of the points
+    experiment_wrapper.stop_scan()
+    blocks.append(_read_triggered_points(triggered[0]))
+    data = np.column_stack((recorder.data[:, 0], np.concatenate(blocks)))
+
+    # Close instruments
+    experiment_wrapper.close()
+
+    # Show where the time went
+    timing = timing.data
+    print_sweep_timing(timing)
+
+    if save_path != '':
+        np.savez(save_path, data=data, timing=timing, timing_phases=np.array(SWEEP_PHASES), **_npz_settings(settings))
+
+    # Return data
+    return data
+
+
+def sweep_grid(axes, time_constant=100, sensitivity=0.2, slope=12, load_time=4, lock_in_time=0, chopper_amplitude=5, chopper_frequency=1, power=15, freq_synth_frequency=250, multiplier=18, save_path='', run_id=None, checkpoint_dir='', settle_accuracy=settling.DEFAULT_ACCURACY, converge=False, serpentine=True):
+    """
+    Sweeps several parameters over every combination of their values, initializing the instruments only once. Axes are
+    given slowest first: the first axis is changed the least (once for each of its values) and the last the most. Each
+    parameter is only set when its value changes. With serpentine on, each axis runs alternately forwards and backwards
+    (see grid_order), so every step changes a single parameter to a neighbouring value rather than jumping back to the
+    start of the faster axes, i.e. the frequency does not jump from the top of its range to the bottom at each power.
+
+    :param axes: A list of axes, slowest first, each a tuple of the form (name, set_func, values) or (name, set_func, values, wait), where set_func sets the parameter (i.e. experiment_wrapper.set_freq_synth_power), values are the values to sweep it through, and wait is an extra time in seconds to wait whenever it changes.
+
+    :param time_constant: The lock-in amplifier time constant in ms.
+
+    :param sensitivity: The lock-in amplifier sensitivity in mV.
+
+    :param slope: The lock-in amplifier roll off slope in dB/octave.
+
+    :param load_time: The amount of time to give the instruments to finish setting up before data collection begins.
+
+    :param lock_in_time: The amount of time to give the lock in amplifier to lock back onto the reference signal after a parameter is changed, on top of the time its filter takes to settle.
+
+    :param chopper_amplitude: The amplitude of the chopper signal in V.
+
+    :param chopper_frequency: The frequency of the chopper signal in kHz.
+
+    :param power: The power of the sweeper in dBm, unless it is one of the axes.
+
+    :param freq_synth_frequency: The frequency of the sweeper in GHz, unless it is one of the axes.
+
+    :param multiplier: The multiplier (i.e. product of all frequency multipliers in the setup).
+
+    :param save_path: If a non-empty string variable save_path is passed the the sweep will be saved as a .npz file holding 'data', the axis names under 'axes', the values of each axis under 'axis_<name>', and the sweep settings. Each point is also written to a .sweep file next to it as soon as it is acquired (see SweepWriter and load_sweep), one row of the axis values, X and Y for each point in the order measured.
+
+    :param run_id: If given, the sweep can be resumed, as in sweep_parameter. The axes the run was started with are used when it is resumed.
+
+    :param checkpoint_dir: The directory to keep checkpoints in, the current directory by default.
+
+    :param settle_accuracy: After each change the lock-in filter is given time to settle to within this fraction of the change (see the settling module).
+
+    :param converge: If True, rather than waiting the full settling time, wait only until successive readings agree to within settle_accuracy of full scale (see settling.wait_until_converged).
+
+    :param serpentine: If True, visit the grid in serpentine order, otherwise each axis always runs forwards.
+
+    :return: The data collected, an array with one dimension for each axis (of the length of its values) and a last dimension holding X and Y in volts, i.e. data[i, j, 0] is X at the i-th value of the first axis and the j-th value of the second. Points not measured are nan.
+    """
+    # The sweep settings, saved with the data
+    settings = dict(time_constant=time_constant, sensitivity=sensitivity, slope=slope, load_time=load_time, lock_in_time=lock_in_time, chopper_amplitude=chopper_amplitude, chopper_frequency=chopper_frequency, power=power, freq_synth_frequency=freq_synth_frequency, multiplier=multiplier, settle_accuracy=settle_accuracy, converge=converge, serpentine=serpentine)
+    names = [axis[0] for axis in axes]
+    set_funcs = [axis[1] for axis in axes]
+    values = [list(axis[2]) for axis in axes]
+    waits = [axis[3] if len(axis) > 3 else 0.0 for axis in axes]
+    columns = tuple(names) + ('x', 'y')
+
+    # Find out where to stream points to, and if this is a run being resumed, the points already measured
+    done = np.empty((0, len(columns)))
+    stream_path = None
+    if run_id is not None:
+        stream_path = os.path.join(checkpoint_dir, str(run_id) + '.sweep')
+        checkpoint = _load_checkpoint(stream_path, run_id, settings)
+        if checkpoint is not None:
+            done = np.array(checkpoint['data'])
+            # Carry on with the axis values the run was started with
+            values = checkpoint['axis_values']
+    elif save_path != '':
+        stream_path = _sweep_file_path(save_path)
+
+    shape = tuple(len(axis_values) for axis_values in values)
+    order = grid_order(shape, settings['serpentine'])
+    data = np.full(shape + (2,), np.nan)
+    for point, row in zip(order, done):
+        data[point] = row[-2:]
+    if run_id is not None and len(done) > 0:
+        print('Resuming run ' + str(run_id) + ' after ' + str(len(done)) + ' of ' + str(len(order)) + ' points')
+
+    _set_up_sweep(settings)
+
+    # Wait for the lock-in to settle after each change, either for as long as its filter needs or until its output stops
+    # changing
+    if settings['converge']:
+        settle = lambda: settling.wait_until_converged(accuracy=settings['settle_accuracy'], extra_time=settings['lock_in_time'])
+    else:
+        settle_time = settling.lock_in_settling_time(settings['settle_accuracy']) + settings['lock_in_time']
+        settle = lambda: time.sleep(settle_time)
+
+    # The seconds spent in each phase of each point, one row per point
+    timing = DataRecorder(SWEEP_PHASES, len(order))
+
+    # Write each point to disk as it is acquired
+    writer = None
+    if stream_path is not None:
+        metadata = dict(settings)
+        metadata.update(axes=names, axis_values=values)
+        if run_id is not None:
+            metadata.update(run_id=str(run_id))
+        writer = SweepWriter(stream_path, columns, metadata, flush_interval=0, append=run_id is not None)
+
+    # The index of the value each axis is set to, None until it is set
+    current = [None] * len(axes)
+    try:
+        for point in order[len(done):]:
+            lap = time.time()
+            point_timing = []
+            point_values = [values[axis][index] for axis, index in enumerate(point)]
+
+            print('At ' + ', '.join(name + ' ' + str(value) for name, value in zip(names, point_values)))
+            lap = _lap(point_timing, lap)
+
+            # Set the parameters that changed, slowest first
+            wait = 0.0
+            for axis, index in enumerate(point):
+                if current[axis] != index:
+                    set_funcs[axis](point_values[axis])
+                    current[axis] = index
+                    wait = max(wait, waits[axis])
+            lap = _lap(point_timing, lap)
+
+            # Wait to allow lock-in to lock to the new settings and for its filter to settle
+            time.sleep(wait)
+            settle()
+            lap = _lap(point_timing, lap)
+
+            # Get data from the lock-in amplifier
+            row = experiment_wrapper.snap_data()
+            lap = _lap(point_timing, lap)
+
+            # Add the data to the array and the file, a blank string read is stored as nan
+            data[point] = [np.nan if isinstance(value, str) or value is None else value for value in row]
+            if writer is not None:
+                writer.append(*(point_values + list(row)))
+            _lap(point_timing, lap)
+
+            timing.append(*point_timing)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # Close instruments
+    experiment_wrapper.close()
+
+    # Show where the time went
+    timing = timing.data
+    print_sweep_timing(timing)
+
+    if save_path != '':
+        axis_arrays = dict(('axis_' + name, np.array(axis_values)) for name, axis_values in zip(names, values))
+        axis_arrays.update(_npz_settings(settings))
+        np.savez(save_path, data=data, axes=np.array(names), timing=timing, timing_phases=np.array(SWEEP_PHASES), **axis_arrays)
+
+    # Return data
+    return data
+
 
-    :return: The data collected, where the first column is frequency, the second column is X, and the third column is Y. X and Y are in volts.
+def grid_order(shape, serpentine=True):
+    """
+    Returns the order sweep_grid visits the points of a grid in. The first axis changes the least and the last the
+    most. In serpentine order each axis runs alternately forwards and backwards, so consecutive points differ by one step
+    along one axis, i.e. for shape (2, 3) the order is (0, 0), (0, 1), (0, 2), (1, 2), (1, 1), (1, 0).
+
+    :param shape: The number of values of each axis
+
+    :param serpentine: If True, visit the points in serpentine order, otherwise in the order of nested for loops
+
+    :return: A list of tuples, the index along each axis of each point
+    """
+    order = [()]
+    # Build the order from the fastest axis outwards, each slower axis repeats the faster ones once for each of its values
+    for length in reversed(shape):
+        inner = order
+        order = []
+        for index in range(length):
+            if serpentine and index % 2 == 1:
+                order.extend((index,) + point for point in reversed(inner))
+            else:
+                order.extend((index,) + point for point in inner)
+    return order
+
+
+def _set_up_sweep(settings):
+    """
+    Initializes the instruments and sets them up for sweep_parameter.
+
+    :param settings: A dictionary of the sweep_parameter arguments
     """
     experiment_wrapper.initialize()
 
     # Set the frequency multiplier, as it is particular to the experiment
-    experiment_wrapper.set_freq_multiplier(multiplier)
+    experiment_wrapper.set_freq_multiplier(settings['multiplier'])
 
     # Setup the frequency synthesizer
-    experiment_wrapper.set_freq_synth_frequency(freq_synth_frequency)
-    experiment_wrapper.set_freq_synth_power(power)
+    experiment_wrapper.set_freq_synth_frequency(settings['freq_synth_frequency'])
+    experiment_wrapper.set_freq_synth_power(settings['power'])
     experiment_wrapper.set_freq_synth_enable(True)
 
-    # Setup chopper
-    experiment_wrapper.set_chopper_amplitude(chopper_amplitude)
-    experiment_wrapper.set_chopper_frequency(chopper_frequency)
-    experiment_wrapper.set_chopper_on(True)
+    # Setup chopper, sending the settings in one message
+    with experiment_wrapper.func_gen.batch():
+        experiment_wrapper.set_chopper_amplitude(settings['chopper_amplitude'])
+        experiment_wrapper.set_chopper_frequency(settings['chopper_frequency'])
+        experiment_wrapper.set_chopper_on(True)
 
-    # Setup lock-in
-    experiment_wrapper.set_time_constant(time_constant)
-    experiment_wrapper.set_sensitivity(sensitivity)
-    experiment_wrapper.set_low_pass_slope(slope)
+    # Setup lock-in, sending the settings in one message
+    with experiment_wrapper.lock_in.batch():
+        experiment_wrapper.set_time_constant(settings['time_constant'])
+        experiment_wrapper.set_sensitivity(settings['sensitivity'])
+        experiment_wrapper.set_low_pass_slope(settings['slope'])
 
     # Sleep to allow instruments to adjust settings
-    time.sleep(load_time)
+    time.sleep(settings['load_time'])
 
-    # Create a new array to save data to
-    data = np.array([0,0,0], float)  # This row will be deleted later
 
+def _sweep_points(parameter_set_func, values_to_sweep, settle, acquire, recorder, timing, writer):
+    """
+    Measures each point of a sweep for sweep_parameter, calling settle() to wait after setting each value and acquire()
+    to read the data, and adding the data to recorder (and writer, if it is not None) and the time spent in each phase
+    to timing.
+    """
     # Sweep the selected parameter and record data
     for value in values_to_sweep:
+        lap = time.time()
+        point_timing = []
+
         print('At sweep value ' + str(value))
+        lap = _lap(point_timing, lap)
 
         # Set selected parameter to the given value
         parameter_set_func(value)
+        lap = _lap(point_timing, lap)
 
-        # Sleep to allow lock-in to lock to new frequency and for time constant to average
-        time.sleep((time_constant * 5.0 / 1000.0) + lock_in_time)  # Sleep for five time constants plus the lock_in_time
+        # Wait to allow lock-in to lock to new frequency and for its filter to settle
+        settle()
+        lap = _lap(point_timing, lap)
 
         # Get data from the lock-in amplifier and and add it to the data array
-        (x, y) = experiment_wrapper.snap_data()
+        row = acquire()
+        lap = _lap(point_timing, lap)
 
-        # If a blank string was read, replace will None
-        if x == '':
-            x = None
-        if y == '':
-            y = None
+        # Add the data to the recorder and the file, a blank string read is stored as nan
+        recorder.append(value, *row)
+        if writer is not None:
+            writer.append(value, *row)
+        _lap(point_timing, lap)
 
-        data_row = np.array([value, x, y])
-        data = np.vstack((data, data_row))
+        timing.append(*point_timing)
 
-    # Delete the first row in the collected data, as it was created to give the array shape earlier but holds no useful data
-    data = np.delete(data, 0, 0)
 
-    # Close instruments
-    experiment_wrapper.close()
+def _read_triggered_points(count):
+    """
+    Reads the points stored by sweep_parameter_triggered out of the lock-in buffer.
 
-    if save_path != '':
-        np.savez(save_path, data = data, parameter_set_func=str(parameter_set_func), time_constant=time_constant, sensitivity=sensitivity, slope=slope, load_time=load_time, lock_in_time=lock_in_time, chopper_amplitude=chopper_amplitude, chopper_frequency=chopper_frequency, power=power, freq_synth_frequency=freq_synth_frequency, multiplier=multiplier)
+    :param count: The number of points triggered
 
-    # Return data
-    return data
+    :return: A numpy array with X in the first column and Y in the second, one row for each point
+    """
+    if count == 0:
+        return np.empty((0, 2))
+    data = experiment_wrapper.get_data()
+    if data.shape[1] != count:
+        raise IOError('Triggered ' + str(count) + ' points but the lock-in stored ' + str(data.shape[1]))
+    return data.T
+
+
+def _load_checkpoint(stream_path, run_id, settings):
+    """
+    Loads the checkpoint of a run being resumed, for sweep_parameter and sweep_grid. The settings the run was started
+    with replace any in settings that differ.
+
+    :param stream_path: The path of the checkpoint file
+
+    :param run_id: The run id
+
+    :param settings: A dictionary of the sweep settings, updated with those the run was started with
+
+    :return: The checkpoint as returned by load_sweep, or None if the run has no checkpoint
+    """
+    if not os.path.exists(stream_path):
+        return None
+    checkpoint = load_sweep(stream_path)
+    for key in settings:
+        if key != 'parameter_set_func' and settings[key] != checkpoint.get(key, settings[key]):
+            print('Run ' + str(run_id) + ' was started with ' + key + ' = ' + str(checkpoint[key]) + ', using that instead of ' + str(settings[key]))
+            settings[key] = checkpoint[key]
+    return checkpoint
+
+
+def _npz_settings(settings):
+    """
+    Returns the sweep settings to save with np.savez. Settings that are None (i.e. target_stderr when it is not given)
+    are left out, as numpy would save them as object arrays, which np.load cannot read without allow_pickle.
+
+    :param settings: A dictionary of the sweep settings
+
+    :return: A dictionary of the settings that are not None
+    """
+    return dict((key, value) for key, value in settings.items() if value is not None)
+
+
+def _acquire_adaptive_row(target_stderr, max_dwell):
+    """
+    Reads a point with acquire_adaptive for sweep_parameter.
+
+    :return: A tuple of the form (x, y, x_stderr, y_stderr, count)
+    """
+    stats = acquire_adaptive(target_stderr, max_dwell)
+    if stats.count == 0:
+        return None, None, None, None, 0
+    return tuple(stats.mean) + tuple(stats.stderr) + (stats.count,)
+
+
+def _sweep_file_path(save_path):
+    """
+    Returns the path of the file sweep_parameter streams points to, save_path with a .sweep extension.
+    """
+    if save_path.endswith('.npz'):
+        save_path = save_path[:-len('.npz')]
+    return save_path + '.sweep'
+
+
+def _lap(point_timing, lap):
+    """
+    Appends the time since the last lap to the timing of a sweep point.
+
+    :param point_timing: The list of phase times of the sweep point
+
+    :param lap: The time.time() of the last lap
+
+    :return: The time.time() of this lap
+    """
+    now = time.time()
+    point_timing.append(now - lap)
+    return now
 
 
 # Define the clean data function, which replaces empty strings in the sweeps with None
@@ -0,0 +1,204 @@
+"""
+The sweep_axis module turns the sweep voltage recorded during a continuous sweep into a frequency axis, and resamples
+data measured on that axis onto evenly spaced frequencies. Every function works on whole numpy arrays (including memory
+mapped ones, i.e. from numpy.load(path, mmap_mode='r')) at once, so captures of millions of samples take milliseconds
+to convert rather than the seconds a Python loop over the samples would.
+"""
+
+import numpy as np
+
+# The frequency per volt of the sweep voltage output of the sweep oscillator, 20.40 GHz at 10 V
+HZ_PER_VOLT = 20.40e9 / 10.0
+
+# The default fraction of the sweep at each end, where the sweep voltage is flat with noise on it, left out of the ramp
+DEFAULT_EDGE = 0.005
+
+
+def voltage_to_frequency(voltage, hz_per_volt=HZ_PER_VOLT, offset=0.0, out=None):
+    """
+    Converts sweep voltages to frequencies with a fixed scale, frequency = offset + hz_per_volt * voltage.
+
+    :param voltage: An array (or list) of sweep voltages in volts
+
+    :param hz_per_volt: The frequency per volt in Hz
+
+    :param offset: The frequency at 0 V in Hz
+
+    :param out: An array to write the frequencies into, i.e. a writable memory mapped array the size of voltage, or None
+    to make a new array
+
+    :return: An array of frequencies in Hz
+    """
+    frequency = np.multiply(np.asarray(voltage, dtype=float), hz_per_volt, out=out)
+    if offset != 0.0:
+        frequency += offset
+    return frequency
+
+
+def ramp_to_frequency(voltage, freq_start, freq_stop, low=None, high=None, out=None):
+    """
+    Converts sweep voltages to frequencies for a sweep whose voltage ramps linearly from low at freq_start to high at
+    freq_stop, such as the 0 to 10 V SWEEP OUT of the HP8350B. This needs no calibration of the voltage scale. A
+    ValueError is raised if low and high are equal, as they are for a flat voltage.
+
+    :param voltage: An array of sweep voltages in volts
+
+    :param freq_start: The frequency the sweep starts at, in any unit
+
+    :param freq_stop: The frequency the sweep stops at, in the same unit
+
+    :param low: The sweep voltage at freq_start, by default the lowest voltage
+
+    :param high: The sweep voltage at freq_stop, by default the highest voltage
+
+    :param out: An array to write the frequencies into, or None to make a new array
+
+    :return: An array of frequencies in the unit of freq_start and freq_stop
+    """
+    voltage = np.asarray(voltage, dtype=float)
+    if low is None:
+        low = voltage.min()
+    if high is None:
+        high = voltage.max()
+    if high == low:
+        raise ValueError('The sweep voltage does not ramp, it is ' + str(low) + ' V at both ends of the sweep')
+    frequency = np.subtract(voltage, low, out=out)
+    frequency *= (freq_stop - freq_start) / float(high - low)
+    frequency += freq_start
+    return frequency
+
+
+def delay(values, samples):
+    """
+    Delays evenly sampled values by a number of samples, which need not be whole, by linear interpolation. The first
+    values are repeated for the samples before the start.
+
+    :param values: A 1-D array of evenly sampled values
+
+    :param samples: The number of samples to delay by
+
+    :return: An array of the delayed values
+    """
+    values = np.asarray(values, dtype=float)
+    index = np.arange(len(values), dtype=float)
+    return np.interp(index - samples, index, values)
+
+
+def find_ramp(voltage, edge=DEFAULT_EDGE):
+    """
+    Finds the samples of a continuous sweep taken while the sweep voltage ramped from its lowest to its highest value,
+    from the last sample at the start to the first sample after it at the stop. Samples at the stop before the first
+    one at the start, left over from an earlier sweep, are skipped. A ValueError is raised if the voltage is flat (i.e.
+    if the sweep voltage was not connected or the sweep did not run).
+
+    :param voltage: An array of sweep voltages
+
+    :param edge: The fraction of the voltage range at each end within which the voltage counts as at the start or stop
+
+    :return: A tuple of the form (start, stop), the index of the first sample of the ramp and one past its last
+    """
+    voltage = np.asarray(voltage, dtype=float)
+    low = voltage.min()
+    span = voltage.max() - low
+    if span == 0:
+        raise ValueError('The sweep voltage is flat at ' + str(low) + ' V, so there is no ramp to find')
+    at_start = voltage <= low + edge * span
+    first = np.argmax(at_start)
+    stop = first + np.argmax(voltage[first:] >= low + (1 - edge) * span)
+    start = stop - np.argmax(at_start[stop::-1])
+    return start, stop + 1
+
+
+def uniform_grid(frequency, num=None, step=None, start=None, stop=None):
+    """
+    Returns evenly spaced frequencies covering a measured frequency axis.
+
+    :param frequency: The measured frequencies
+
+    :param num: The number of frequencies in the grid, by default the number measured. Ignored if step is given.
+
+    :param step: The spacing of the grid
+
+    :param start: The first frequency of the grid, by default the lowest measured
+
+    :param stop: The last frequency of the grid, by default the highest measured
+
+    :return: An array of the grid frequencies
+    """
+    frequency = np.asarray(frequency, dtype=float)
+    if start is None:
+        start = frequency.min()
+    if stop is None:
+        stop = frequency.max()
+    if step is not None:
+        return np.arange(start, stop + step / 2.0, step)
+    if num is None:
+        num = len(frequency)
+    return np.linspace(start, stop, num)
+
+
+def resample(frequency, values, num=None, step=None, start=None, stop=None, method='interpolate'):
+    """
+    Resamples values measured at unevenly spaced (and possibly unordered) frequencies onto evenly spaced frequencies
+    (see uniform_grid).
+
+    :param frequency: A 1-D array of the measured frequencies
+
+    :param values: An array of the measured values, either 1-D or with one row for each frequency and one column for
+    each quantity
+
+    :param num: The number of frequencies in the grid, by default the number measured
+
+    :param step: The spacing of the grid, used instead of num if given
+
+    :param start: The first frequency of the grid, by default the lowest measured
+
+    :param stop: The last frequency of the grid, by default the highest measured
+
+    :param method: Either 'interpolate' to interpolate linearly between the measured frequencies either side of each
+    grid frequency, or 'mean' to average the values measured within half a grid spacing of each grid frequency. 'mean'
+    averages down the noise when there are many samples for each grid frequency, and needs no sorting so is much faster
+    for long captures whose frequencies are out of order (i.e. from noise on the sweep voltage). Grid frequencies with no
+    samples near them are nan.
+
+    :return: A tuple of the form (grid, resampled) of the grid frequencies and the values at them, with the same number
+    of columns as values
+    """
+    frequency = np.asarray(frequency, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if method == 'mean':
+        grid = uniform_grid(frequency, num, step, start, stop)
+        return grid, _bin_mean(grid, frequency, values)
+    if method != 'interpolate':
+        raise ValueError("The method must be 'interpolate' or 'mean', not " + repr(method))
+    # Interpolation needs the frequencies in order, sort them only if they are not
+    if np.any(frequency[1:] < frequency[:-1]):
+        order = np.argsort(frequency, kind='mergesort')
+        frequency = frequency[order]
+        values = values[order]
+    grid = uniform_grid(frequency, num, step, start, stop)
+    if values.ndim == 1:
+        return grid, np.interp(grid, frequency, values)
+    resampled = np.empty((len(grid), values.shape[1]))
+    for column in range(values.shape[1]):
+        resampled[:, column] = np.interp(grid, frequency, values[:, column])
+    return grid, resampled
+
+
+def _bin_mean(grid, frequency, values):
+    """
+    Averages the values measured within half a grid spacing of each frequency of an evenly spaced grid, for resample().
+    """
+    spacing = (grid[-1] - grid[0]) / (len(grid) - 1) if len(grid) > 1 else 1.0
+    bins = np.rint((frequency - grid[0]) / spacing).astype(np.intp)
+    inside = (bins >= 0) & (bins < len(grid))
+    bins = bins[inside]
+    counts = np.bincount(bins, minlength=len(grid)).astype(float)
+    counts[counts == 0] = np.nan
+    if values.ndim == 1:
+        return np.bincount(bins, weights=values[inside], minlength=len(grid)) / counts
+    values = values[inside]
+    resampled = np.empty((len(grid), values.shape[1]))
+    for column in range(values.shape[1]):
+        resampled[:, column] = np.bincount(bins, weights=values[:, column], minlength=len(grid)) / counts
+    return resampled
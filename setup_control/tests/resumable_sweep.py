@@ -0,0 +1,37 @@
+"""
+Runs a checkpointed sweep on the simulated setup, for test_sweep_resume to kill and resume. Run as
+'python -m tests.resumable_sweep <parameter|grid> <checkpoint_dir> [target_stderr]', where target_stderr is passed
+to sweep_parameter.
+"""
+
+import sys
+
+import numpy as np
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, snippets
+
+# The values swept, and the X and Y each point should read
+FREQUENCIES = np.linspace(12.0, 13.9, 20)
+POWERS = [5.0, 10.0, 15.0]
+GRID_FREQUENCIES = np.linspace(12.0, 12.5, 6)
+SCALE = 1e-4
+
+
+def main(kind, checkpoint_dir, target_stderr=None):
+    setup = simulated.start()
+    # A signal that shows the frequency and power each point was measured at
+    setup.lock_in.signal = lambda t: SCALE * complex(setup.freq_synth.get_float('FREQ:SET'),
+                                                     setup.freq_synth.get_float('POWE:SET'))
+    options = dict(time_constant=1, sensitivity=5, load_time=0, lock_in_time=0.1, multiplier=1, run_id='resume',
+                   checkpoint_dir=checkpoint_dir)
+    if kind == 'parameter':
+        snippets.sweep_parameter(ew.set_freq_synth_frequency, FREQUENCIES, target_stderr=target_stderr, max_dwell=0.5,
+                                 **options)
+    else:
+        snippets.sweep_grid([('power', ew.set_freq_synth_power, POWERS),
+                             ('frequency', ew.set_freq_synth_frequency, GRID_FREQUENCIES)], **options)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], sys.argv[2], *[float(arg) for arg in sys.argv[3:]])
@@ -0,0 +1,20 @@
+"""
+Helpers for the tests that run against the simulated setup (see setup_control.simulator).
+"""
+
+import os
+
+# Make experiment_wrapper.initialize() connect to the simulated setup
+os.environ['SETUP_CONTROL_SIMULATOR'] = '1'
+
+from setup_control import simulator
+
+
+def start():
+    """
+    Starts the simulated setup if it is not already running, and returns it. The setup is shared by all the tests in a
+    run, so tests should not rely on settings other tests may have changed.
+
+    :return: The SimulatedSetup
+    """
+    return simulator.start(noise=1e-6, seed=0)
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+import unittest
+
+from setup_control import async_io
+
+
+def _blocking(seconds, value):
+    time.sleep(seconds)
+    return value, threading.current_thread().name
+
+
+def _sleep_then(seconds, value):
+    yield async_io.sleep(seconds)
+    raise async_io.Return(value)
+
+
+def _open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+
+class CallInThreadTest(unittest.TestCase):
+    """
+    Checks that call_in_thread runs blocking functions (such as a USB query) in the one worker thread, alongside other
+    coroutines.
+    """
+
+    def test_result_returned(self):
+        value, thread = async_io.run(async_io.call_in_thread(_blocking, 0.0, 'response'))
+        self.assertEqual(value, 'response')
+        self.assertNotEqual(thread, threading.current_thread().name)
+
+    def test_runs_concurrently(self):
+        def usb_and_gpib():
+            results = yield async_io.gather(async_io.call_in_thread(_blocking, 0.2, 'usb'), _sleep_then(0.2, 'gpib'))
+            raise async_io.Return(results)
+
+        start = time.time()
+        results = async_io.run(usb_and_gpib())
+        elapsed = time.time() - start
+        self.assertEqual([results[0][0], results[1]], ['usb', 'gpib'])
+        self.assertLess(elapsed, 0.35)
+
+    def test_one_worker_thread(self):
+        def two_usb():
+            results = yield async_io.gather(async_io.call_in_thread(_blocking, 0.1, 'first'),
+                                            async_io.call_in_thread(_blocking, 0.1, 'second'))
+            raise async_io.Return(results)
+
+        threads_before = threading.active_count()
+        fds_before = _open_fds()
+        start = time.time()
+        results = async_io.run(two_usb())
+        elapsed = time.time() - start
+        # The calls ran one after the other, in the order they were made, in the same long-lived thread
+        self.assertEqual([value for value, _ in results], ['first', 'second'])
+        self.assertEqual(results[0][1], results[1][1])
+        self.assertGreaterEqual(elapsed, 0.2)
+        _, thread = async_io.run(async_io.call_in_thread(_blocking, 0.0, None))
+        self.assertEqual(thread, results[0][1])
+        self.assertLessEqual(threading.active_count(), max(threads_before, 2))
+        # The wake pipe of each event loop is closed when it finishes
+        self.assertEqual(_open_fds(), fds_before)
+
+    def test_waits_without_polling(self):
+        # While waiting on the worker thread the event loop sleeps in select
+        cpu_start = sum(os.times()[:2])
+        async_io.run(async_io.call_in_thread(time.sleep, 0.5))
+        self.assertLess(sum(os.times()[:2]) - cpu_start, 0.05)
+
+    def test_exception_raised(self):
+        def fail():
+            raise IOError('Device not responding')
+
+        self.assertRaises(IOError, async_io.run, async_io.call_in_thread(fail))
+        # The worker thread carries on after an exception
+        self.assertEqual(async_io.run(async_io.call_in_thread(_blocking, 0.0, 'after'))[0], 'after')
+
+
+class AcquireTest(unittest.TestCase):
+    """
+    Checks that acquire waits for a lock held elsewhere without polling and without blocking other coroutines.
+    """
+
+    def test_waits_for_release(self):
+        lock = threading.Lock()
+        lock.acquire()
+        releaser = threading.Timer(0.3, lock.release)
+        releaser.start()
+
+        def locked():
+            yield async_io.acquire(lock)
+            lock.release()
+            raise async_io.Return(time.time())
+
+        def locked_and_sleeping():
+            results = yield async_io.gather(locked(), _sleep_then(0.1, 'slept'))
+            raise async_io.Return(results)
+
+        start = time.time()
+        cpu_start = sum(os.times()[:2])
+        acquired, slept = async_io.run(locked_and_sleeping())
+        self.assertGreaterEqual(acquired - start, 0.25)
+        self.assertEqual(slept, 'slept')
+        self.assertLess(sum(os.times()[:2]) - cpu_start, 0.05)
+        releaser.join()
+
+    def test_free_lock(self):
+        lock = threading.Lock()
+        async_io.run(async_io.acquire(lock))
+        self.assertFalse(lock.acquire(False))
+        lock.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
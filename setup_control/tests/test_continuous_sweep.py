@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew
+
+
+class ContinuousSweepTest(unittest.TestCase):
+    """
+    Runs continuous_sweep() against the simulated HP8350B, whose sweep voltage is connected to the simulated lock-in's
+    Aux 1 and Aux 3, and checks that each returned frequency lines up with the value the lock-in saw at it. The lock-in
+    signal is a steep function of the oscillator frequency, so samples shifted by a few along the sweep (i.e. by finding
+    the wrong ramp or delaying the sweep voltage by the wrong amount) are off by several times the noise.
+    """
+
+    # Volts per GHz of X and Y
+    SLOPE = 1e-3
+
+    def setUp(self):
+        self.setup = simulated.start()
+        ew.initialize()
+        ew.initialize_sweep_oscillator(self.setup.SWEEP_OSC_ADDRESS)
+        # A time constant short next to the 2 ms between samples, so the output follows the sweep
+        ew.set_time_constant(1)
+        ew.set_low_pass_slope(6)
+        self.setup.lock_in.signal = lambda t: self._expected(self.setup.sweep_osc.frequency(t) / 1e9)
+
+    def tearDown(self):
+        self.setup.lock_in.signal = self.setup.signal
+        ew.close()
+        ew.sweep_osc = None
+
+    def _expected(self, frequency):
+        """
+        Returns the complex signal at a frequency in GHz.
+        """
+        return self.SLOPE * ((frequency - 12.0) - 1j * (13.0 - frequency))
+
+    def test_frequency_axis(self):
+        sweep = ew.continuous_sweep(12.0, 13.0, 1.0, margin=0.25)
+        frequency, x, y = sweep.T
+        self.assertTrue(np.all(np.diff(frequency) >= 0))
+        # One sample every 2 MHz over the sweep, from start to stop
+        self.assertAlmostEqual(frequency[0], 12.0, delta=0.005)
+        self.assertAlmostEqual(frequency[-1], 13.0, delta=0.005)
+        self.assertAlmostEqual(len(frequency), 512, delta=8)
+        expected = self._expected(frequency)
+        np.testing.assert_allclose(x, expected.real, atol=6e-6)
+        np.testing.assert_allclose(y, expected.imag, atol=6e-6)
+
+    def test_resampled(self):
+        sweep = ew.continuous_sweep(12.0, 13.0, 1.0, margin=0.25, num=50)
+        np.testing.assert_allclose(sweep[:, 0], np.linspace(12.0, 13.0, 50))
+        expected = self._expected(sweep[:, 0])
+        np.testing.assert_allclose(sweep[:, 1], expected.real, atol=6e-6)
+        np.testing.assert_allclose(sweep[:, 2], expected.imag, atol=6e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
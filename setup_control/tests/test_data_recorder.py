@@ -0,0 +1,72 @@
+import time
+import unittest
+
+import numpy as np
+
+from setup_control.snippets import DataRecorder
+
+
+def _time_recorder(rows):
+    start = time.time()
+    recorder = DataRecorder(('frequency', 'x', 'y'))
+    for i in range(rows):
+        recorder.append(i, 2 * i, 3 * i)
+    return time.time() - start, recorder
+
+
+class DataRecorderTest(unittest.TestCase):
+    """
+    Checks that DataRecorder grows by doubling, returns only the rows recorded, and is linear in the number of rows.
+    """
+
+    def test_doubling(self):
+        recorder = DataRecorder(('frequency', 'x', 'y'), capacity=2)
+        capacities = []
+        for i in range(9):
+            recorder.append(i, 2 * i, 3 * i)
+            capacities.append(recorder._array.shape[0])
+        self.assertEqual(capacities, [2, 2, 4, 4, 8, 8, 8, 8, 16])
+        # The rows copied into each larger array are kept
+        np.testing.assert_array_equal(recorder.data, np.column_stack((np.arange(9), 2 * np.arange(9), 3 * np.arange(9))))
+
+    def test_known_size_never_copied(self):
+        recorder = DataRecorder(('x',), capacity=5)
+        array = recorder._array
+        for i in range(5):
+            recorder.append(i)
+        self.assertIs(recorder._array, array)
+
+    def test_trimmed_output(self):
+        recorder = DataRecorder(('frequency', 'x', 'y'), capacity=100)
+        self.assertEqual(recorder.data.shape, (0, 3))
+        recorder.append(1.0, None, '')
+        recorder.append(2.0, 0.5, -0.5)
+        self.assertEqual(len(recorder), 2)
+        self.assertEqual(recorder.data.shape, (2, 3))
+        np.testing.assert_array_equal(recorder.data, [[1.0, np.nan, np.nan], [2.0, 0.5, -0.5]])
+        np.testing.assert_array_equal(recorder.column('frequency'), [1.0, 2.0])
+
+    def test_wrong_number_of_values(self):
+        recorder = DataRecorder(('frequency', 'x', 'y'))
+        self.assertRaises(ValueError, recorder.append, 1.0, 2.0)
+        self.assertEqual(len(recorder), 0)
+
+    def test_benchmark_against_vstack(self):
+        # Per row, recording 1e5 rows is several times faster than stacking only 3e4 with np.vstack, which copies the
+        # whole array every row
+        recorder_time, recorder = _time_recorder(100000)
+        self.assertEqual(recorder.data.shape, (100000, 3))
+        self.assertEqual(recorder.data[-1].tolist(), [99999, 199998, 299997])
+        start = time.time()
+        stacked = np.empty((0, 3))
+        for i in range(30000):
+            stacked = np.vstack((stacked, [i, 2 * i, 3 * i]))
+        vstack_time = time.time() - start
+        self.assertLess(3 * recorder_time / 100000, vstack_time / 30000)
+        # Recording is linear, ten times the rows takes about ten times as long
+        small_time, _ = _time_recorder(10000)
+        self.assertLess(recorder_time, 30 * small_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
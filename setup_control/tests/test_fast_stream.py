@@ -0,0 +1,118 @@
+import time
+import unittest
+
+import numpy as np
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew
+from setup_control.instruments import SR830, SR830FastStream
+
+
+class FastStreamTest(unittest.TestCase):
+    """
+    Checks that SR830.stream() delivers every sample sent in fast data transfer mode once, in order, with X and Y
+    paired, whatever the size of the chunks they are read in. The simulated lock-in is made to store the index of each
+    sample (as X, and minus the index as Y) so that lost, repeated or unpaired samples can be found.
+    """
+
+    def setUp(self):
+        self.setup = simulated.start()
+        ew.initialize()
+        ew.set_sample_rate(512)
+        ew.lock_in.set_sensitivity(SR830.SENSITIVITY_1V_PER_uA)
+        lock_in = self.setup.lock_in
+        # With a full scale of 1 V a fast mode count of 1 is 1 / 30000 V
+        step = lock_in.full_scale() / 30000.0
+
+        def fill_buffer(now=None):
+            type(lock_in)._fill_buffer(lock_in, now)
+            index = np.arange(lock_in._stored - len(lock_in._buffer), lock_in._stored) * step
+            lock_in._buffer = np.column_stack((index, -index))
+
+        lock_in._fill_buffer = fill_buffer
+        self.step = step
+
+    def tearDown(self):
+        del self.setup.lock_in._fill_buffer
+        ew.close()
+
+    def _stream(self, duration, chunk_size):
+        stream = ew.lock_in.stream(chunk_size=chunk_size)
+        chunks = []
+        end = time.time() + duration
+        for chunk in stream:
+            chunks.append(chunk)
+            if time.time() > end:
+                stream.close()
+        return stream, chunks
+
+    def _check(self, stream, chunks, rate):
+        samples = np.concatenate(chunks)
+        index = np.rint(samples['x'] / self.step)
+        self.assertGreater(len(samples), 0.5 * rate)
+        self.assertEqual(stream.dropped, 0)
+        self.assertEqual(stream.received, len(samples))
+        np.testing.assert_array_equal(index, np.arange(len(samples)))
+        np.testing.assert_array_equal(np.rint(-samples['y'] / self.step), index)
+        np.testing.assert_allclose(np.diff(samples['time']), 1.0 / rate)
+
+    def test_default_chunks(self):
+        stream, chunks = self._stream(1.5, None)
+        self.assertGreater(len(chunks), 3)
+        self._check(stream, chunks, 512)
+
+    def test_chunks_not_matching_arrivals(self):
+        # Chunks of 7 samples rarely line up with the batches the lock-in sends
+        stream, chunks = self._stream(1.5, 7)
+        self._check(stream, chunks, 512)
+
+
+class _SplitReads(object):
+    """
+    Stands in for an SR830 whose controller returns fast mode bytes in given pieces, as reads that time out do.
+    """
+
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+
+    def read_binary(self, nbytes):
+        return self.read_next_binary(nbytes)
+
+    def read_next_binary(self, nbytes):
+        if not self.pieces:
+            time.sleep(0.01)
+            return bytearray()
+        return bytearray(self.pieces.pop(0))
+
+
+class SampleBoundaryTest(unittest.TestCase):
+    """
+    Checks that samples split across reads (i.e. after a read times out half way through a sample) are put back together.
+    """
+
+    def test_split_samples(self):
+        counts = np.zeros(100, dtype=SR830FastStream._SAMPLE_DTYPE)
+        counts['x'] = np.arange(100)
+        counts['y'] = -np.arange(100)
+        raw = counts.tobytes()
+        # Pieces of 1, 3, 5, ... bytes, so nearly every sample is split
+        pieces = []
+        size = 1
+        while raw:
+            pieces.append(raw[:size])
+            raw = raw[size:]
+            size += 2
+        lock_in = _SplitReads(pieces)
+        stream = SR830FastStream(lock_in, 30000.0, 512, 1000, 4)
+        deadline = time.time() + 5
+        while lock_in.pieces and time.time() < deadline:
+            time.sleep(0.01)
+        stream._closed = True
+        stream._thread.join()
+        samples = np.concatenate(list(stream))
+        np.testing.assert_array_equal(samples['x'], np.arange(100))
+        np.testing.assert_array_equal(samples['y'], -np.arange(100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import timeit
+import unittest
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, io_metrics, async_io
+
+
+class IOMetricsTest(unittest.TestCase):
+    """
+    Checks that the io_metrics counts match the commands sent to the simulated setup.
+    """
+
+    def setUp(self):
+        simulated.start()
+        ew.initialize()
+        io_metrics.reset()
+
+    def tearDown(self):
+        io_metrics.set_enabled(True)
+        ew.close()
+
+    def _counts(self, instrument='Lock-In'):
+        return io_metrics.snapshot()['instruments'].get(instrument, {})
+
+    def test_counts_match_commands(self):
+        sensitivities = [ew.lock_in.get_sensitivity() for _ in range(3)]
+        ew.lock_in.set_sensitivity(5)
+        ew.lock_in.set_sensitivity(6)
+        ew.lock_in.get_x()
+        ew.func_gen.set_output_state(ew.func_gen.STATE_ON)
+        counts = self._counts()
+        self.assertEqual(sorted(counts), ['OUTP?', 'SENS', 'SENS?'])
+        self.assertEqual(counts['SENS?']['count'], 3)
+        self.assertEqual(counts['SENS']['count'], 2)
+        self.assertEqual(counts['OUTP?']['count'], 1)
+        # Every byte of each command and its end of line is counted
+        self.assertEqual(counts['SENS?']['bytes_out'], 3 * len('SENS?\n'))
+        self.assertEqual(counts['SENS']['bytes_out'], len('SENS 5\n') + len('SENS 6\n'))
+        self.assertEqual(counts['SENS?']['bytes_in'], sum(len(str(value) + '\n') for value in sensitivities))
+        self.assertEqual(counts['SENS']['bytes_in'], 0)
+        self.assertEqual(sum(counts['SENS?']['histogram']), 3)
+        self.assertEqual(self._counts('Function Generator')['OUTP']['count'], 1)
+        bus = io_metrics.snapshot()['buses'][ew.gpib_manager.name]
+        self.assertGreater(bus['busy'], 0)
+
+    def test_batch_counted_once(self):
+        # Commands batched into one message are one transaction, counted under the first command
+        with ew.lock_in.batch():
+            ew.lock_in.set_sensitivity(5)
+            ew.lock_in.set_time_constant(8)
+        counts = self._counts()
+        self.assertEqual(list(counts), ['SENS'])
+        self.assertEqual(counts['SENS']['count'], 1)
+        self.assertEqual(counts['SENS']['bytes_out'], len('SENS 5;OFLT 8\n'))
+
+    def test_async_counted(self):
+        def queries():
+            yield async_io.gather(ew.lock_in.get_sensitivity_async(), ew.lock_in.get_time_constant_async())
+
+        async_io.run(queries())
+        counts = self._counts()
+        self.assertEqual(counts['SENS?']['count'], 1)
+        self.assertEqual(counts['OFLT?']['count'], 1)
+
+    def test_disabled(self):
+        io_metrics.set_enabled(False)
+        ew.lock_in.get_sensitivity()
+        self.assertEqual(self._counts(), {})
+
+    def test_overhead(self):
+        count = 100000
+        record = lambda: io_metrics.record('Lock-In', 'SENS?', 0.001, 6, 2)
+        enabled = min(timeit.repeat(record, number=count, repeat=3)) / count
+        io_metrics.set_enabled(False)
+        disabled = min(timeit.repeat(record, number=count, repeat=3)) / count
+        io_metrics.reset()
+        # About 4 us and 0.3 us here, against about 100 us for a query to the simulator
+        self.assertLess(enabled, 20e-6)
+        self.assertLess(disabled, 2e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
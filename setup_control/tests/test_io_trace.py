@@ -0,0 +1,61 @@
+import logging
+import timeit
+import unittest
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, io_trace
+
+
+class _Named(object):
+    def get_name(self):
+        return 'Lock-In'
+
+
+class IOTraceTest(unittest.TestCase):
+    """
+    Checks that io_trace keeps no history unless asked to, and that recording costs little when nothing is kept or shown.
+    """
+
+    def tearDown(self):
+        io_trace.set_history_size(0)
+        io_trace.disable_console()
+
+    def test_history_off_by_default(self):
+        io_trace.record(_Named(), io_trace.KIND_QUERY, 'SENS?', '5')
+        self.assertEqual(io_trace.get_history(), [])
+
+    def test_history_kept_when_asked(self):
+        io_trace.set_history_size(2)
+        for command in ('SENS 5', 'OFLT 8', 'OFSL 1'):
+            io_trace.record(_Named(), io_trace.KIND_WRITE, command)
+        self.assertEqual([transaction.command for transaction in io_trace.get_history()], ['OFLT 8', 'OFSL 1'])
+        io_trace.clear_history()
+        self.assertEqual(io_trace.get_history(), [])
+
+    def test_disabled_overhead(self):
+        instrument = _Named()
+        count = 100000
+        record = lambda: io_trace.record(instrument, io_trace.KIND_QUERY, 'SENS?', '5', 0.0)
+        # Nothing kept and nothing shown, so only a check of the logging level is made (about 1 us here)
+        self.assertFalse(logging.getLogger('setup_control.io').isEnabledFor(logging.DEBUG))
+        disabled = min(timeit.repeat(record, number=count, repeat=3)) / count
+        self.assertLess(disabled, 10e-6)
+
+    def test_overhead_small_next_to_query(self):
+        simulated.start()
+        ew.initialize()
+        try:
+            count = 200
+            query = min(timeit.repeat(ew.lock_in.get_sensitivity, number=count, repeat=3)) / count
+        finally:
+            ew.close()
+        io_trace.set_history_size()
+        instrument = _Named()
+        record = lambda: io_trace.record(instrument, io_trace.KIND_QUERY, 'SENS?', '5', 0.0)
+        kept = min(timeit.repeat(record, number=10000, repeat=3)) / 10000
+        # Even keeping history, recording is a small part of a query to the simulator, which has no bus to wait for
+        self.assertLess(kept * 10, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
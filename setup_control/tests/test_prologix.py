@@ -0,0 +1,138 @@
+import os
+import select
+import threading
+import time
+import unittest
+
+from setup_control.inst_io import Prologix
+
+
+class PrologixReadTest(unittest.TestCase):
+    """
+    Checks how the Prologix reads responses from its serial port, with a pseudo-terminal standing in for the Prologix.
+    Bytes written to self.device arrive at the serial port as if the Prologix had sent them.
+    """
+
+    def setUp(self):
+        self.device, port = os.openpty()
+        self.prologix = Prologix(port=os.ttyname(port))
+        os.close(port)
+        self._drain_commands()
+
+    def tearDown(self):
+        self.prologix.ser.close()
+        os.close(self.device)
+
+    def _drain_commands(self):
+        """
+        Throws away the commands the Prologix object has sent so far (i.e. '++mode 1').
+        """
+        while select.select([self.device], [], [], 0.05)[0]:
+            os.read(self.device, 4096)
+
+    def _send_later(self, data, delay):
+        """
+        Sends data from the device in another thread after delay seconds, in pieces small enough for the terminal.
+        """
+
+        def send():
+            time.sleep(delay)
+            for i in range(0, len(data), 1024):
+                os.write(self.device, data[i:i + 1024])
+
+        sender = threading.Thread(target=send)
+        sender.daemon = True
+        sender.start()
+        return sender
+
+    def test_leftover_bytes_kept(self):
+        os.write(self.device, b'ONE\nTWO\nTHR')
+        self.assertEqual(self.prologix.read_next(), b'ONE\n')
+        # Everything waiting was read at once, and the bytes past the first message were kept
+        self.assertEqual(self.prologix._read_buffer, b'TWO\nTHR')
+        self.assertEqual(self.prologix.read_next(), b'TWO\n')
+        self.assertEqual(self.prologix._read_buffer, b'THR')
+        self._send_later(b'EE\n', 0.05).join()
+        self.assertEqual(self.prologix.read_next(), b'THREE\n')
+        self.assertEqual(self.prologix._read_buffer, b'')
+        self.assertEqual(self.prologix.timeouts, 0)
+
+    def test_size_limit_keeps_rest(self):
+        os.write(self.device, b'ABCDEFGH\n')
+        self.assertEqual(self.prologix.read_next(size=3), b'ABC')
+        self.assertEqual(self.prologix.read_next(), b'DEFGH\n')
+
+    def test_read_binary_after_text(self):
+        # A text response followed straight away by a binary one holding end of line characters
+        binary = bytearray(range(256)) * 4
+        os.write(self.device, b'1024\n' + bytes(binary[:500]))
+        self.assertEqual(self.prologix.read_next(), b'1024\n')
+        self._send_later(bytes(binary[500:]), 0.05)
+        # Bytes already in the read buffer are handed to the binary read before more are read from the port
+        self.assertEqual(self.prologix.read_binary(len(binary)), binary)
+        self.assertEqual(self.prologix._read_buffer, b'')
+        self.assertEqual(self.prologix.timeouts, 0)
+
+    def test_read_binary_leaves_next_message(self):
+        os.write(self.device, b'\x01\n\x02\x03OK\n')
+        self.assertEqual(self.prologix.read_next_binary(4), b'\x01\n\x02\x03')
+        self.assertEqual(self.prologix.read_next(), b'OK\n')
+
+    def test_idle_wait_uses_no_cpu(self):
+        # Nothing arrives, so the read sleeps on the port until it times out
+        cpu_start = sum(os.times()[:2])
+        start = time.time()
+        self.assertEqual(self.prologix.read_next(timeout=0.5), b'')
+        wall = time.time() - start
+        cpu = sum(os.times()[:2]) - cpu_start
+        self.assertGreaterEqual(wall, 0.5)
+        self.assertLess(cpu, 0.05)
+        self.assertEqual(self.prologix.timeouts, 1)
+
+    def test_wakes_when_data_arrives(self):
+        self._send_later(b'READY\n', 0.2)
+        start = time.time()
+        self.assertEqual(self.prologix.read_next(timeout=2), b'READY\n')
+        self.assertLess(time.time() - start, 0.4)
+
+    def _time_reads(self, read, messages, count):
+        """
+        Sends count messages from the device and times reading them back one at a time with read().
+
+        :return: A tuple of the form (bytes read per second, CPU seconds used per megabyte read)
+        """
+        sender = self._send_later(messages, 0)
+        start = time.time()
+        cpu_start = sum(os.times()[:2])
+        received = [read() for _ in range(count)]
+        cpu = sum(os.times()[:2]) - cpu_start
+        elapsed = time.time() - start
+        sender.join()
+        self.assertEqual(b''.join(bytes(message) for message in received), messages)
+        return len(messages) / elapsed, cpu / (len(messages) / 1e6)
+
+    def test_throughput(self):
+        # Many short responses arriving together, as when reading back queries sent in one batch
+        count = 2000
+        messages = b''.join(b'%+.6e,%+.6e\n' % (i, -i) for i in range(count))
+        ser = self.prologix.ser
+
+        # The byte at a time loop read_next used to run
+        def read_byte_at_a_time():
+            msg = bytearray()
+            while True:
+                if ser.inWaiting() > 0:
+                    msg.extend(ser.read(1))
+                    if msg[-1:] == b'\n':
+                        return msg
+
+        before = self._time_reads(read_byte_at_a_time, messages, count)
+        after = self._time_reads(self.prologix.read_next, messages, count)
+        report = ('%.0f bytes/s and %.3f CPU s/MB before the buffered reader, %.0f bytes/s and %.3f CPU s/MB after' %
+                  (before + after))
+        # The buffered reader is both faster and cheaper, the old loop spent its time on a system call per byte
+        self.assertGreater(after[0], 5 * before[0], report)
+        self.assertLess(5 * after[1], before[1], report)
+
+if __name__ == '__main__':
+    unittest.main()
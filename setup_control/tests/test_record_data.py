@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew
+from setup_control.instruments import SR830
+
+# The value stored in the simulated buffer for each point, channel 1 is +SCALE and channel 2 -SCALE times its index
+SCALE = 1e-6
+
+
+class RecordDataTest(unittest.TestCase):
+    """
+    Checks that record_data() saves every point of a loop mode scan once, in order and with its two channels paired,
+    across many wraps of the buffer. The buffer is shrunk so that it wraps every few seconds at 512 Hz.
+    """
+
+    BUFFER_SIZE = 1024
+
+    def setUp(self):
+        self.setup = simulated.start()
+        self.directory = tempfile.mkdtemp()
+        ew.initialize()
+        ew.set_sample_rate(512)
+        self._buffer_sizes = (SR830.BUFFER_SIZE, self.setup.lock_in.BUFFER_SIZE)
+        SR830.BUFFER_SIZE = self.setup.lock_in.BUFFER_SIZE = self.BUFFER_SIZE
+        # Store the index of each point rather than a measurement, so lost, repeated or unpaired points can be found
+        lock_in = self.setup.lock_in
+        self._fill_buffer = lock_in._fill_buffer
+
+        def fill_buffer(now=None):
+            self._fill_buffer(now)
+            index = np.arange(lock_in._stored - len(lock_in._buffer), lock_in._stored) * SCALE
+            lock_in._buffer = np.column_stack((index, -index))
+
+        lock_in._fill_buffer = fill_buffer
+
+    def tearDown(self):
+        del self.setup.lock_in._fill_buffer
+        SR830.BUFFER_SIZE, self.setup.lock_in.BUFFER_SIZE = self._buffer_sizes
+        ew.close()
+        shutil.rmtree(self.directory)
+
+    def _record(self, duration, poll_interval):
+        """
+        Records for duration seconds, and returns the number of points recorded, the number of overruns, and the index
+        of each point saved in channel 1 and channel 2.
+        """
+        save_path = os.path.join(self.directory, 'record.dat')
+        points, overruns = ew.record_data(save_path, duration, poll_interval)
+        data = ew.load_recorded_data(save_path)
+        self.assertEqual(data.shape, (2, points))
+        return points, overruns, np.rint(data[0] / SCALE), np.rint(-data[1] / SCALE)
+
+    def test_no_points_lost(self):
+        points, overruns, channel1, channel2 = self._record(8.0, 0.25)
+        self.assertEqual(overruns, 0)
+        # About 4000 points, several times the buffer size, with none lost or repeated
+        self.assertGreater(points, 3 * self.BUFFER_SIZE)
+        np.testing.assert_array_equal(channel1, np.arange(points))
+        np.testing.assert_array_equal(channel2, channel1)
+
+    def test_overrun_keeps_channels_paired(self):
+        # Polling less often than the buffer fills loses points
+        points, overruns, channel1, channel2 = self._record(5.0, 1.5 * self.BUFFER_SIZE / 512.0)
+        self.assertGreater(overruns, 0)
+        self.assertGreater(points, 0)
+        np.testing.assert_array_equal(channel2, channel1)
+
+    def test_interrupt_stops_scan(self):
+        # Ctrl-C while polling leaves the lock-in stopped and back in one shot mode
+        get_length = ew.lock_in.get_scanned_data_length
+        polls = [0]
+
+        def interrupted_get_length():
+            polls[0] += 1
+            if polls[0] == 3:
+                raise KeyboardInterrupt
+            return get_length()
+
+        ew.lock_in.get_scanned_data_length = interrupted_get_length
+        try:
+            self.assertRaises(KeyboardInterrupt, ew.record_data, os.path.join(self.directory, 'record.dat'), 60.0, 0.1)
+        finally:
+            del ew.lock_in.get_scanned_data_length
+        # Querying the mode also makes sure the lock-in has handled every command written before
+        self.assertEqual(int(ew.lock_in.get_end_of_buffer_mode()), SR830.END_OF_BUFFER_SHOT)
+        self.assertIsNone(self.setup.lock_in._scan_start)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, snippets
+
+
+class SavedSweepTest(unittest.TestCase):
+    """
+    Checks that the .npz files the sweeps save with their default settings can be loaded back with np.load (without
+    allow_pickle) and printed with print_attributes.
+    """
+
+    def setUp(self):
+        self.setup = simulated.start()
+        self.directory = tempfile.mkdtemp()
+        self.options = dict(time_constant=1, sensitivity=5, load_time=0, multiplier=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _load(self, name):
+        sweep = np.load(os.path.join(self.directory, name + '.npz'), allow_pickle=False)
+        snippets.print_attributes(sweep)
+        return sweep
+
+    def test_sweep_parameter(self):
+        freqs = np.linspace(12.0, 12.3, 4)
+        data = snippets.sweep_parameter(ew.set_freq_synth_frequency, freqs,
+                                        save_path=os.path.join(self.directory, 'parameter'), **self.options)
+        sweep = self._load('parameter')
+        np.testing.assert_array_equal(sweep['data'], data)
+        self.assertEqual(sweep['timing'].shape, (len(freqs), len(snippets.SWEEP_PHASES)))
+        self.assertEqual(float(sweep['max_dwell']), 10.0)
+        self.assertFalse(bool(sweep['converge']))
+        # target_stderr was not given, so it is not saved
+        self.assertNotIn('target_stderr', sweep.files)
+
+    def test_sweep_parameter_adaptive(self):
+        freqs = np.linspace(12.0, 12.1, 2)
+        snippets.sweep_parameter(ew.set_freq_synth_frequency, freqs, target_stderr=1e-3, max_dwell=0.5,
+                                 save_path=os.path.join(self.directory, 'adaptive'), **self.options)
+        sweep = self._load('adaptive')
+        self.assertEqual(sweep['data'].shape, (len(freqs), 6))
+        self.assertEqual(float(sweep['target_stderr']), 1e-3)
+
+    def test_sweep_parameter_triggered(self):
+        freqs = np.linspace(12.0, 12.3, 4)
+        snippets.sweep_parameter_triggered(ew.set_freq_synth_frequency, freqs,
+                                           save_path=os.path.join(self.directory, 'triggered'), **self.options)
+        self.assertEqual(self._load('triggered')['data'].shape, (len(freqs), 3))
+
+    def test_sweep_grid(self):
+        snippets.sweep_grid([('power', ew.set_freq_synth_power, [5.0, 10.0]),
+                             ('frequency', ew.set_freq_synth_frequency, [12.0, 12.1, 12.2])],
+                            save_path=os.path.join(self.directory, 'grid'), **self.options)
+        sweep = self._load('grid')
+        self.assertEqual(sweep['data'].shape, (2, 3, 2))
+        np.testing.assert_array_equal(sweep['axis_power'], [5.0, 10.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
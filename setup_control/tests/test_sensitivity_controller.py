@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew
+
+
+class SensitivityControllerTest(unittest.TestCase):
+    """
+    Checks that SensitivityController steps the simulated lock-in out of overload and down to small signals, and that
+    the ranges it learns survive being saved and loaded into the controller of another sweep. The simulated lock-in
+    sets the output overload bit of LIAS? whenever |R| is above full scale.
+    """
+
+    def setUp(self):
+        self.setup = simulated.start()
+        self.directory = tempfile.mkdtemp()
+        ew.initialize()
+        # A short time constant, so the output follows each new signal at once
+        ew.set_time_constant(1)
+
+    def tearDown(self):
+        self.setup.lock_in.signal = self.setup.signal
+        ew.close()
+        shutil.rmtree(self.directory)
+
+    def _controller(self, **options):
+        """
+        Returns a controller that does not wait after range changes, and counts the snaps it takes.
+        """
+        controller = ew.SensitivityController(wait=0, **options)
+        snap = controller._snap
+        controller.snaps = 0
+
+        def counted_snap():
+            controller.snaps += 1
+            return snap()
+
+        controller._snap = counted_snap
+        return controller
+
+    def _set_signal(self, volts):
+        """
+        Sets the signal to volts, and waits for the lock-in output to settle on it.
+        """
+        self.setup.lock_in.signal = lambda t: complex(volts, 0.0)
+        time.sleep(0.05)
+
+    def test_overload_steps_up(self):
+        ew.set_sensitivity(1)
+        self._set_signal(5e-3)
+        controller = self._controller()
+        x, y, sensitivity = controller.snap(12.0)
+        # 5 mV overloads the 1 mV range, so it steps up a decade to 10 mV, where the reading sits inside the band
+        self.assertEqual(sensitivity, 10)
+        self.assertEqual(ew.get_sensitivity(), 10)
+        self.assertEqual(controller.snaps, 2)
+        self.assertAlmostEqual(x, 5e-3, delta=1e-5)
+        self.assertEqual(controller.get_learned(), [(12.0, 10)])
+
+    def test_small_signal_steps_down(self):
+        ew.set_sensitivity(1000)
+        self._set_signal(5e-5)
+        controller = self._controller()
+        x, y, sensitivity = controller.snap(12.0)
+        # The smallest range 50 uV fits in below 0.9 of full scale
+        self.assertEqual(sensitivity, 0.1)
+        self.assertEqual(ew.get_sensitivity(), 0.1)
+        self.assertEqual(controller.snaps, 2)
+        self.assertAlmostEqual(x, 5e-5, delta=1e-5)
+
+    def test_limits(self):
+        ew.set_sensitivity(1)
+        self._set_signal(5e-3)
+        controller = self._controller(max_sensitivity=2)
+        x, y, sensitivity = controller.snap(12.0)
+        # The range can not go above 2 mV, so the reading stays overloaded and nothing is learned
+        self.assertEqual(sensitivity, 2)
+        self.assertEqual(controller.get_learned(), [])
+
+    def test_learned_map_reloaded(self):
+        amplitudes = {12.0: 5e-3, 12.5: 5e-4, 13.0: 5e-5}
+        first = self._controller()
+        ew.set_sensitivity(1)
+        for frequency in sorted(amplitudes):
+            self._set_signal(amplitudes[frequency])
+            first.snap(frequency)
+        self.assertEqual(first.get_learned(), [(12.0, 10), (12.5, 1), (13.0, 0.1)])
+        path = os.path.join(self.directory, 'sensitivities.json')
+        first.save(path)
+
+        # The next sweep starts each point on the range learned by the first, so no point needs a range change
+        ew.set_sensitivity(1000)
+        second = self._controller()
+        self.assertEqual(second.load(path), 3)
+        self.assertEqual(second.get_learned(), first.get_learned())
+        for frequency in sorted(amplitudes, reverse=True):
+            self._set_signal(amplitudes[frequency])
+            self.assertEqual(second.snap(frequency)[2], dict(first.get_learned())[frequency])
+        self.assertEqual(second.snaps, len(amplitudes))
+
+    def test_get_range(self):
+        controller = self._controller(resolution=0.2)
+        self.assertIsNone(controller.get_range(12.0))
+        ew.set_sensitivity(1)
+        self._set_signal(5e-4)
+        controller.snap(12.0)
+        self._set_signal(5e-3)
+        controller.snap(13.0)
+        sensitivity = lambda frequency: ew._SENSITIVITY_DICT[controller.get_range(frequency)]
+        self.assertEqual(sensitivity(12.1), 1)
+        self.assertEqual(sensitivity(13.2), 10)
+        # Too far from anything learned, so the last good range is used
+        self.assertEqual(sensitivity(12.5), 10)
+
+    def test_load_missing_file(self):
+        self.assertEqual(self._controller().load(os.path.join(self.directory, 'missing.json')), 0)
+
+    def test_bad_band(self):
+        self.assertRaises(ValueError, ew.SensitivityController, upper=0.9, lower=0.5)
+        self.assertRaises(ValueError, ew.SensitivityController, upper=1.5, lower=0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import time
+import unittest
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, io_metrics
+from setup_control.instruments import SR830
+
+
+class SettingCacheTest(unittest.TestCase):
+    """
+    Checks that the setting cache (see Instrument.set_cache_enabled) only answers queries of settings, and that the
+    answers stay correct as the settings and measurements change.
+    """
+
+    def setUp(self):
+        self.setup = simulated.start()
+        ew.initialize()
+        ew.set_setting_cache_enabled(True, skip_redundant_writes=True)
+        # experiment_wrapper leaves the multimeter uncached, but it must be safe to cache it too
+        ew.multimeter.set_cache_enabled(True)
+
+    def tearDown(self):
+        ew.set_setting_cache_enabled(False)
+        ew.multimeter.set_cache_enabled(False)
+        ew.close()
+
+    def _sent(self, instrument, mnemonic):
+        counts = io_metrics.snapshot()['instruments'].get(instrument, {})
+        return counts.get(mnemonic, {}).get('count', 0)
+
+    def test_getter_follows_setter(self):
+        for sensitivity in (5.0, 0.2, 5.0):
+            ew.set_sensitivity(sensitivity)
+            self.assertEqual(ew.get_sensitivity(), sensitivity)
+        self.assertEqual(ew.verify_settings(), {})
+
+    def test_setting_answered_from_cache(self):
+        ew.set_time_constant(10)
+        io_metrics.reset()
+        for _ in range(3):
+            self.assertEqual(ew.get_time_constant(), 10)
+        self.assertEqual(self._sent('Lock-In', 'OFLT?'), 0)
+
+    def test_reset_clears_cache(self):
+        ew.set_sensitivity(5.0)
+        ew.lock_in.reset()
+        self.assertEqual(ew.get_sensitivity(), 1000.0)
+
+    def test_scan_length_not_cached(self):
+        ew.set_sample_rate(512)
+        ew.start_scan()
+        try:
+            time.sleep(0.05)
+            first = ew.lock_in.get_scanned_data_length()
+            time.sleep(0.1)
+            # The simulated lock-in keeps storing while the query is answered, so its count is read either side of it
+            before = min(self.setup.lock_in.points_stored(), SR830.BUFFER_SIZE)
+            second = ew.lock_in.get_scanned_data_length()
+            after = min(self.setup.lock_in.points_stored(), SR830.BUFFER_SIZE)
+        finally:
+            ew.stop_scan()
+        self.assertGreater(second, first)
+        self.assertTrue(before <= second <= after)
+
+    def test_measurement_not_cached(self):
+        self.setup.multimeter.dc_voltage = lambda t: 1.0
+        first = ew.get_multimeter_dc_measurement()
+        self.setup.multimeter.dc_voltage = lambda t: 2.0
+        second = ew.get_multimeter_dc_measurement()
+        self.setup.multimeter.dc_voltage = lambda t: 0.0
+        self.assertAlmostEqual(first, 1.0, places=3)
+        self.assertAlmostEqual(second, 2.0, places=3)
+
+    def test_synthesizer_frequency_follows_setter(self):
+        ew.set_freq_multiplier(1)
+        ew.set_freq_synth_frequency(12.0)
+        self.assertEqual(ew.get_freq_synth_freq(), 12.0)
+        ew.set_freq_synth_frequency(13.0)
+        self.assertEqual(ew.get_freq_synth_freq(), 13.0)
+
+    def test_status_not_cached(self):
+        ew.set_sensitivity(0.002)
+        self.setup.lock_in.signal = lambda t: 1e-3
+        try:
+            time.sleep(0.05)
+            overloaded = ew.lock_in.get_lia_status()
+            self.setup.lock_in.signal = lambda t: 0j
+            ew.set_sensitivity(1000.0)
+            time.sleep(0.05)
+            cleared = ew.lock_in.get_lia_status()
+        finally:
+            self.setup.lock_in.signal = self.setup.signal
+        self.assertTrue(overloaded & (1 << SR830.LIA_STATUS_OUTPUT_OVERLOAD))
+        self.assertFalse(cleared & (1 << SR830.LIA_STATUS_OUTPUT_OVERLOAD))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import math
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, settling
+
+# The time constants each slope takes to settle within 1%: ln(100) for one pole, and the published 6.6, 8.4 and 10 for
+# two to four
+SETTLING_TIME_CONSTANTS = {6: 4.605, 12: 6.638, 18: 8.406, 24: 10.045}
+
+
+class SettlingModelTest(unittest.TestCase):
+    """
+    Checks the settling model against the known step response of one to four RC stages.
+    """
+
+    def test_settling_time_constants(self):
+        for slope, expected in SETTLING_TIME_CONSTANTS.items():
+            self.assertAlmostEqual(settling.settling_time_constants(slope), expected, places=3)
+            self.assertAlmostEqual(settling.remaining_fraction(expected, slope), 0.01, places=4)
+        self.assertAlmostEqual(settling.settling_time_constants(6, 0.001), math.log(1000), places=3)
+
+    def test_remaining_fraction(self):
+        self.assertEqual(settling.remaining_fraction(0, 24), 1.0)
+        self.assertAlmostEqual(settling.remaining_fraction(1, 6), math.exp(-1))
+        self.assertAlmostEqual(settling.remaining_fraction(2, 12), 3 * math.exp(-2))
+
+    def test_settling_time(self):
+        self.assertAlmostEqual(settling.settling_time(300, 24), 0.3 * SETTLING_TIME_CONSTANTS[24], places=3)
+
+    def test_bad_accuracy(self):
+        self.assertRaises(ValueError, settling.settling_time_constants, 12, 0)
+        self.assertRaises(ValueError, settling.settling_time_constants, 12, 1)
+
+    def test_imported_alone(self):
+        # The module does not import experiment_wrapper until it is needed, so the two do not import each other. It is
+        # imported on its own, from outside the package (whose __init__ imports every module).
+        package = os.path.dirname(os.path.abspath(settling.__file__))
+        output = subprocess.check_output([sys.executable, '-c', 'import sys; import settling; '
+                                          'print("experiment_wrapper" in sys.modules)'], cwd=package)
+        self.assertEqual(output.strip(), b'False')
+
+
+class LockInSettlingTest(unittest.TestCase):
+    """
+    Checks the settling functions that read the lock-in against the simulated lock-in, whose output follows its signal
+    through a filter with the set time constant and slope.
+    """
+
+    def setUp(self):
+        self.setup = simulated.start()
+        ew.initialize()
+        ew.set_sensitivity(1)
+
+    def tearDown(self):
+        self.setup.lock_in.signal = self.setup.signal
+        ew.close()
+
+    def test_lock_in_settling_time(self):
+        ew.set_time_constant(100)
+        for slope, expected in SETTLING_TIME_CONSTANTS.items():
+            ew.set_low_pass_slope(slope)
+            self.assertAlmostEqual(settling.lock_in_settling_time(), 0.1 * expected, places=3)
+        ew.set_low_pass_slope(24)
+        self.assertAlmostEqual(settling.lock_in_settling_time(0.001), 0.1 * settling.settling_time_constants(24, 0.001),
+                               places=3)
+
+    def _step(self, value):
+        """
+        Makes the signal step from 0 to value now, once the filter has settled on 0.
+        """
+        self.setup.lock_in.signal = lambda t: 0j
+        time.sleep(0.1)
+        ew.snap_data()
+        step_time = time.time()
+        self.setup.lock_in.signal = lambda t: complex(value if t >= step_time else 0.0, 0.0)
+
+    def test_converges_early(self):
+        ew.set_time_constant(10)
+        ew.set_low_pass_slope(12)
+        full_wait = settling.lock_in_settling_time()
+        self.setup.lock_in.signal = lambda t: 4e-4 - 2e-4j
+        waited, (x, y) = settling.wait_until_converged()
+        # Two time constants for the filter to start responding and two more for two agreeing readings
+        self.assertLess(waited, 0.8 * full_wait)
+        self.assertAlmostEqual(x, 4e-4, delta=1e-5)
+        self.assertAlmostEqual(y, -2e-4, delta=1e-5)
+
+    def test_follows_step(self):
+        ew.set_time_constant(30)
+        ew.set_low_pass_slope(6)
+        full_wait = settling.lock_in_settling_time()
+        self._step(5e-4)
+        waited, (x, y) = settling.wait_until_converged()
+        self.assertGreater(waited, 0.03)
+        self.assertLessEqual(waited, full_wait + 0.05)
+        # Successive readings agree within 1% of full scale, so the output has come most of the way
+        self.assertAlmostEqual(x, 5e-4, delta=0.05 * 5e-4)
+        self.assertAlmostEqual(y, 0.0, delta=1e-5)
+
+    def test_never_agrees(self):
+        # A signal that keeps moving never gives agreeing readings, so the full settling time is waited
+        ew.set_time_constant(30)
+        ew.set_low_pass_slope(24)
+        full_wait = settling.lock_in_settling_time()
+        self.setup.lock_in.signal = lambda t: complex(5e-4 * math.sin(20 * t), 0.0)
+        waited, _ = settling.wait_until_converged()
+        self.assertGreaterEqual(waited, 0.95 * full_wait)
+        self.assertLess(waited, full_wait + 0.1)
+
+    def test_extra_time(self):
+        ew.set_time_constant(10)
+        ew.set_low_pass_slope(6)
+        self.setup.lock_in.signal = lambda t: 4e-4
+        waited, _ = settling.wait_until_converged(extra_time=0.2)
+        self.assertGreaterEqual(waited, 0.2)
+        self.assertLessEqual(waited, 0.2 + settling.lock_in_settling_time() + 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew
+
+
+class StreamDataTest(unittest.TestCase):
+    """
+    Checks that stream_data() never leaves the lock-in scanning once the caller stops reading.
+    """
+
+    def setUp(self):
+        self.setup = simulated.start()
+        ew.initialize()
+        ew.set_sample_rate(64)
+
+    def tearDown(self):
+        ew.close()
+
+    def _scanning(self):
+        # Query the lock-in first, so that it has handled every command written before
+        ew.lock_in.get_scanned_data_length()
+        return self.setup.lock_in._scan_start is not None
+
+    def test_break_stops_and_clears(self):
+        stream = ew.stream_data(poll_interval=0.1)
+        for chunk in stream:
+            self.assertTrue(self._scanning())
+            break
+        stream.close()
+        self.assertFalse(self._scanning())
+        self.assertEqual(ew.lock_in.get_scanned_data_length(), 0)
+
+    def test_error_stops_scan(self):
+        stream = ew.stream_data(poll_interval=0.1)
+        next(stream)
+        self.assertRaises(KeyboardInterrupt, stream.throw, KeyboardInterrupt)
+        self.assertFalse(self._scanning())
+
+    def test_finished_stream_stops_scan(self):
+        chunks = list(ew.stream_data(duration=0.3, poll_interval=0.1))
+        self.assertFalse(self._scanning())
+        self.assertEqual(sum(chunk.shape[1] for chunk in chunks), self.setup.lock_in.points_stored())
+
+
+if __name__ == '__main__':
+    unittest.main()
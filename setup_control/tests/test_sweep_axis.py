@@ -0,0 +1,29 @@
+import unittest
+
+import numpy as np
+
+from setup_control import sweep_axis
+
+
+class SweepAxisTest(unittest.TestCase):
+    """
+    Checks finding the ramp of a continuous sweep and turning its voltage into frequencies.
+    """
+
+    def test_ramp_found(self):
+        # Left over samples at the top of the previous sweep, the flat start, the ramp, and the flat stop
+        voltage = np.concatenate((np.full(5, 10.0), np.zeros(10), np.linspace(0, 10, 101), np.full(10, 10.0)))
+        start, stop = sweep_axis.find_ramp(voltage, edge=0.001)
+        self.assertEqual((start, stop), (15, 116))
+        frequency = sweep_axis.ramp_to_frequency(voltage[start:stop], 11.0, 13.0, 0.0, 10.0)
+        np.testing.assert_allclose(frequency, np.linspace(11.0, 13.0, 101))
+
+    def test_flat_trace(self):
+        flat = np.full(1000, 2.5)
+        self.assertRaises(ValueError, sweep_axis.find_ramp, flat)
+        self.assertRaises(ValueError, sweep_axis.ramp_to_frequency, flat, 11.0, 13.0)
+        self.assertRaises(ValueError, sweep_axis.ramp_to_frequency, [1.0, 2.0], 11.0, 13.0, 3.0, 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from tests import resumable_sweep
+from setup_control import snippets
+
+# The directory holding the tests package, which the sweep process is run from
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SweepResumeTest(unittest.TestCase):
+    """
+    Checks that a checkpointed sweep killed part way through (with SIGKILL, so nothing is cleaned up) carries on where
+    it stopped when run again, measuring every point exactly once.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.directory, 'resume.sweep')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _run(self, kind, kill_after=None, target_stderr=None):
+        """
+        Runs the sweep in a new process, killing it once kill_after points have been checkpointed if kill_after is
+        given. target_stderr is passed to sweep_parameter if it is given.
+
+        :return: The number of points checkpointed when the process was killed or finished
+        """
+        env = dict(os.environ, SETUP_CONTROL_SIMULATOR='1', PYTHONPATH=ROOT)
+        with open(os.devnull, 'w') as devnull:
+            args = [sys.executable, '-m', 'tests.resumable_sweep', kind, self.directory]
+            if target_stderr is not None:
+                args.append(str(target_stderr))
+            process = subprocess.Popen(args, cwd=ROOT, env=env, stdout=devnull, stderr=devnull)
+            deadline = time.time() + 60
+            while process.poll() is None and time.time() < deadline:
+                if kill_after is not None and self._rows() >= kill_after:
+                    process.send_signal(signal.SIGKILL)
+                    process.wait()
+                    return self._rows()
+                time.sleep(0.01)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        self.assertEqual(process.returncode, 0)
+        return self._rows()
+
+    def _rows(self):
+        if not os.path.exists(self.checkpoint):
+            return 0
+        return len(snippets.load_sweep(self.checkpoint)['data'])
+
+    def test_sweep_parameter(self):
+        frequencies = resumable_sweep.FREQUENCIES
+        killed_at = self._run('parameter', kill_after=5)
+        self.assertTrue(5 <= killed_at < len(frequencies))
+        # A row being written when the process was killed is left out and overwritten on resuming
+        with open(self.checkpoint, 'ab') as checkpoint:
+            checkpoint.write(b'\x00' * 12)
+        self.assertEqual(self._run('parameter'), len(frequencies))
+        data = np.array(snippets.load_sweep(self.checkpoint)['data'])
+        np.testing.assert_array_equal(data[:, 0], frequencies)
+        np.testing.assert_allclose(data[:, 1], resumable_sweep.SCALE * frequencies, atol=2e-5)
+        np.testing.assert_allclose(data[:, 2], resumable_sweep.SCALE * 15.0, atol=2e-5)
+
+    def test_changed_target_stderr(self):
+        # Started without target_stderr and resumed with it, the run keeps its three columns
+        frequencies = resumable_sweep.FREQUENCIES
+        self._run('parameter', kill_after=5)
+        self.assertEqual(self._run('parameter', target_stderr=1e-3), len(frequencies))
+        self.assertEqual(snippets.load_sweep(self.checkpoint)['columns'], ['value', 'x', 'y'])
+
+    def test_changed_target_stderr_adaptive(self):
+        # Started with target_stderr and resumed without it, the run keeps reading until the standard error is low enough
+        frequencies = resumable_sweep.FREQUENCIES
+        self._run('parameter', kill_after=5, target_stderr=1e-3)
+        self.assertEqual(self._run('parameter'), len(frequencies))
+        sweep = snippets.load_sweep(self.checkpoint)
+        self.assertEqual(sweep['columns'], ['value', 'x', 'y', 'x_stderr', 'y_stderr', 'count'])
+        self.assertEqual(sweep['target_stderr'], 1e-3)
+        data = np.array(sweep['data'])
+        np.testing.assert_array_equal(data[:, 0], frequencies)
+        np.testing.assert_allclose(data[:, 1], resumable_sweep.SCALE * frequencies, atol=2e-5)
+        self.assertTrue(np.all(data[:, 5] >= 3))
+
+    def test_sweep_grid(self):
+        shape = (len(resumable_sweep.POWERS), len(resumable_sweep.GRID_FREQUENCIES))
+        # Kill it after it has moved to the second power, so it resumes part way through a reversed row
+        killed_at = self._run('grid', kill_after=shape[1] + 2)
+        self.assertTrue(shape[1] + 2 <= killed_at < shape[0] * shape[1])
+        self.assertEqual(self._run('grid'), shape[0] * shape[1])
+        data = np.array(snippets.load_sweep(self.checkpoint)['data'])
+        # Every point was measured once, in the order of the grid
+        expected = [(resumable_sweep.POWERS[i], resumable_sweep.GRID_FREQUENCIES[j])
+                    for i, j in snippets.grid_order(shape, True)]
+        np.testing.assert_array_equal(data[:, :2], expected)
+        np.testing.assert_allclose(data[:, 2], resumable_sweep.SCALE * data[:, 1], atol=2e-5)
+        np.testing.assert_allclose(data[:, 3], resumable_sweep.SCALE * data[:, 0], atol=2e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
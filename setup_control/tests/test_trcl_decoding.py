@@ -0,0 +1,91 @@
+import timeit
+import unittest
+
+import numpy as np
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, io_metrics
+from setup_control.inst_io import Instrument
+from setup_control.instruments import SR830
+
+
+def _random_bins(random, count):
+    """
+    Returns count random TRCL? bins as a str, with every mantissa and exponent possible, including the extremes.
+    """
+    bins = np.zeros(count, dtype=SR830._TRCL_BIN_DTYPE)
+    bins['mantissa'] = random.randint(-32768, 32768, count)
+    bins['exponent'] = random.randint(0, 256, count)
+    bins['pad'] = random.randint(0, 256, count)
+    bins[:4]['mantissa'] = (-32768, 32767, -1, 0)
+    bins[:4]['exponent'] = (0, 255, 0, 255)
+    return bins.tobytes()
+
+
+class TRCLDecodingTest(unittest.TestCase):
+    """
+    Checks that the vectorized TRCL? decoder gives exactly the values of the original bit string decoder, and that it is
+    much faster.
+    """
+
+    def setUp(self):
+        self.lock_in = SR830(8, Instrument.CONNECTION_TYPE_PROLOGIX_GPIB)
+        self.random = np.random.RandomState(0)
+
+    def _scalar(self, raw):
+        return self.lock_in._bit_string_to_num_list(self.lock_in._raw_to_bit_string(raw))
+
+    def test_matches_bit_string_decoder(self):
+        raw = _random_bins(self.random, 5000)
+        decoded = self.lock_in._raw_to_num_array(raw)
+        self.assertEqual(decoded.dtype, np.float64)
+        np.testing.assert_array_equal(decoded, self._scalar(raw))
+
+    def test_negative_mantissas(self):
+        raw = _random_bins(self.random, 1000)
+        decoded = self.lock_in._raw_to_num_array(raw)
+        self.assertTrue(np.any(decoded < 0))
+        np.testing.assert_array_equal(decoded, self._scalar(raw))
+
+    def test_trailing_bytes_ignored(self):
+        raw = _random_bins(self.random, 10)
+        np.testing.assert_array_equal(self.lock_in._raw_to_num_array(raw + b'\x01\x02\x03'), self._scalar(raw))
+        self.assertEqual(len(self.lock_in._raw_to_num_array(b'')), 0)
+
+    def test_faster_than_bit_string_decoder(self):
+        # A full buffer of one channel
+        raw = _random_bins(self.random, SR830.BUFFER_SIZE)
+        vectorized = min(timeit.repeat(lambda: self.lock_in._raw_to_num_array(raw), number=1, repeat=5))
+        scalar = min(timeit.repeat(lambda: self._scalar(raw), number=1, repeat=1))
+        self.assertLess(vectorized * 50, scalar)
+
+
+class EmptyReadTest(unittest.TestCase):
+    """
+    Checks that reading no bins from the buffer does not send TRCL?, since the response the SR830 sends would be left
+    unread and taken as the response to the next query.
+    """
+
+    def setUp(self):
+        simulated.start()
+        ew.initialize()
+        ew.set_sample_rate(64)
+        io_metrics.reset()
+
+    def tearDown(self):
+        ew.close()
+
+    def test_no_bins(self):
+        self.assertEqual(len(ew.lock_in.get_channel1_scanned_data()), 0)
+        self.assertEqual(len(ew.lock_in.get_channel2_scanned_data(5, 0)), 0)
+        self.assertNotIn('TRCL?', io_metrics.snapshot()['instruments'].get('Lock-In', {}))
+        # Reading an empty buffer reads nothing either
+        ew.lock_in.reset_scan()
+        self.assertEqual(ew.get_data().shape, (2, 0))
+        self.assertEqual(sorted(io_metrics.snapshot()['instruments']['Lock-In']), ['REST', 'SPTS?'])
+
+    def test_negative_bins(self):
+        self.assertRaises(ValueError, ew.lock_in.get_channel1_scanned_data, 0, -1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from tests import simulated
+from setup_control import experiment_wrapper as ew, snippets
+
+
+class CachedBufferTest(unittest.TestCase):
+    """
+    Checks that reading the lock-in buffer with the setting cache on sees every point stored, since the number of
+    points stored (SPTS?) must never be answered from the cache.
+    """
+
+    def setUp(self):
+        self.setup = simulated.start()
+        self._initialize = ew.initialize
+
+        # The sweeps initialize the instruments themselves, so turn the cache on every time they do
+        def initialize():
+            self._initialize()
+            ew.set_setting_cache_enabled(True, skip_redundant_writes=True)
+
+        ew.initialize = initialize
+
+    def tearDown(self):
+        ew.initialize = self._initialize
+        ew.set_setting_cache_enabled(False)
+        ew.close()
+
+    def test_triggered_sweep(self):
+        # A signal that follows the synthesizer frequency, so each point shows which frequency it was measured at
+        self.setup.lock_in.signal = lambda t: complex(1e-4 * self.setup.freq_synth.get_float('FREQ:SET'), -5e-5)
+        freqs = np.linspace(12.0, 12.7, 8)
+        try:
+            data = snippets.sweep_parameter_triggered(ew.set_freq_synth_frequency, freqs, time_constant=1,
+                                                      sensitivity=5, load_time=0, multiplier=1)
+        finally:
+            self.setup.lock_in.signal = self.setup.signal
+        self.assertEqual(data.shape, (len(freqs), 3))
+        np.testing.assert_allclose(data[:, 0], freqs)
+        np.testing.assert_allclose(data[:, 1], 1e-4 * freqs, atol=2e-5)
+        np.testing.assert_allclose(data[:, 2], -5e-5, atol=2e-5)
+
+    def test_stream_data(self):
+        ew.initialize()
+        ew.set_sample_rate(64)
+        chunks = list(ew.stream_data(duration=1.0, poll_interval=0.1))
+        stored = self.setup.lock_in.points_stored()
+        # The scan was polled many times while it ran, and every point it stored was read exactly once
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(sum(chunk.shape[1] for chunk in chunks), stored)
+        self.assertTrue(55 <= stored <= 70)
+
+
+if __name__ == '__main__':
+    unittest.main()